@@ -31,7 +31,7 @@ def create_app(config_name='default'):
         'http://localhost:5173,http://localhost:8081' # React Admin & Expo Web default ports
     ).split(',')
     
-    cors.init_app(app, resources={r"/api/*": {"origins": allowed_origins}})
+    cors.init_app(app, resources={r"/api/*": {"origins": allowed_origins}}, expose_headers=["X-Next-Cursor"])
     
     # Bind the rate limiter to the app
     limiter.init_app(app)
@@ -55,6 +55,13 @@ def create_app(config_name='default'):
     
     from .routes.restaurant_routes import restaurant_bp
     app.register_blueprint(restaurant_bp, url_prefix='/api')
+
+    from .routes.notification_routes import notification_bp
+    app.register_blueprint(notification_bp, url_prefix='/api/notifications')
+    
+    # --- CLI COMMANDS ---
+    from .commands import register_commands
+    register_commands(app)
     
     # --- GLOBAL ERROR SANITIZATION ---
     @app.errorhandler(404)
@@ -72,6 +79,43 @@ def create_app(config_name='default'):
         return jsonify({"success": False, "error": "Too Many Requests", "message": "Rate limit exceeded. Please wait a minute and try again."}), 429
 
     with app.app_context():
+        # Forks the password hashing pool, so it must run before any service starts a thread
+        from .services.password_service import PasswordService
+        PasswordService.init_app(app)
+
+        # The spatial engine decides the geom column DDL, so it must be resolved first
+        from .services.spatial_service import SpatialService
+        SpatialService.init_app(app)
         db.create_all()
+
+        from .services.reservation_service import ReservationService
+        ReservationService.init_app(app)
+
+        from .services.claim_expiry_service import ClaimExpiryService
+        ClaimExpiryService.init_app(app)
+
+        from .services.job_queue_service import JobQueueService
+        JobQueueService.init_app(app)
+
+        from .services.notification_service import NotificationService
+        NotificationService.init_app(app)
+
+        from .services.principal_service import PrincipalService
+        PrincipalService.init_app(app)
+
+        from .services.audit_service import AuditService
+        AuditService.init_app(app)
+
+        from .services.google_cert_service import GoogleCertService
+        GoogleCertService.init_app(app)
+
+        from .services.ledger_service import LedgerService
+        LedgerService.init_app(app)
+
+        from .services.leaderboard_service import LeaderboardService
+        LeaderboardService.init_app(app)
+
+        from .services.student_rank_service import StudentRankService
+        StudentRankService.init_app(app)
         
     return app
\ No newline at end of file
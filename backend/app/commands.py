@@ -0,0 +1,143 @@
+import click
+from sqlalchemy import inspect, text
+from app.extensions import db
+
+"""
+Operational Flask CLI commands (run with `flask --app run <command>`).
+They are registered on the application inside the Application Factory.
+"""
+
+# Columns added to tables that already exist in deployed databases: {table: [(column, DDL)]}
+ADDED_COLUMNS = {
+    'background_jobs': [
+        ('progress', 'TEXT'),
+        ('plan', 'TEXT'),
+    ],
+    'notifications': [
+        ('kind', 'VARCHAR(20)'),
+        ('item_count', 'INTEGER DEFAULT 1'),
+        ('pushed_count', 'INTEGER DEFAULT 1'),
+        ('updated_at', 'TIMESTAMP'),
+    ],
+}
+
+
+@click.command('backfill-geom')
+def backfill_geom_command():
+    """One-shot backfill: derives RestaurantProfile.geom from lat/lng for every stale row."""
+    from app.models.user import RestaurantProfile
+    from app.services.spatial_service import SpatialService
+
+    if SpatialService.backend != 'postgis':
+        click.echo("⚠️ PostGIS is not in use; geom is kept as EWKT text and needs no backfill.")
+        return
+
+    result = db.session.execute(text("""
+        UPDATE restaurant_profiles
+        SET geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326)
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+          AND (geom IS NULL OR ST_X(geom) <> lng OR ST_Y(geom) <> lat)
+    """))
+    db.session.commit()
+    click.echo(f"✅ Backfilled geom for {result.rowcount} restaurant profile(s).")
+
+    # db.create_all() never adds indexes to existing tables, so make sure the KNN index exists too
+    for index in RestaurantProfile.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+    click.echo("✅ Spatial indexes verified.")
+
+
+@click.command('upgrade-schema')
+def upgrade_schema_command():
+    """
+    Brings an existing database up to the current models. db.create_all() only creates
+    missing tables, so this adds the ADDED_COLUMNS missing from existing tables, merges
+    duplicate leaderboard rows and then creates every missing index (including the unique
+    one the ledger compactor upserts on). Idempotent.
+    """
+    # ADD COLUMN IF NOT EXISTS is PostgreSQL-only, so check the live columns first
+    inspector = inspect(db.engine)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name not in existing:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                click.echo(f"✅ Added {table}.{name}.")
+    db.session.commit()
+
+    # Merge duplicate leaderboard rows into the oldest one per restaurant before the unique index
+    merged = db.session.execute(text("""
+        UPDATE leaderboard
+        SET points = totals.points, meals_shared = totals.meals_shared
+        FROM (
+            SELECT restaurant_id, MIN(id) AS keep_id,
+                   SUM(COALESCE(points, 0)) AS points, SUM(COALESCE(meals_shared, 0)) AS meals_shared
+            FROM leaderboard GROUP BY restaurant_id HAVING COUNT(*) > 1
+        ) AS totals
+        WHERE leaderboard.id = totals.keep_id
+    """)).rowcount
+    db.session.execute(text("""
+        DELETE FROM leaderboard
+        WHERE id NOT IN (SELECT MIN(id) FROM leaderboard GROUP BY restaurant_id)
+    """))
+    db.session.commit()
+    click.echo(f"✅ Merged duplicate leaderboard rows for {merged} restaurant(s).")
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    click.echo("✅ Indexes verified.")
+
+
+@click.command('prune-idempotency-keys')
+def prune_idempotency_keys_command():
+    """Deletes stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS."""
+    from app.services.idempotency_service import IdempotencyService
+
+    deleted = IdempotencyService.prune()
+    click.echo(f"✅ Pruned {deleted} expired idempotency record(s).")
+
+
+@click.command('expire-claims')
+def expire_claims_command():
+    """Runs one sweep of the stale pending-claim expirer and the abandoned-lease reclaimer (for cron or manual use)."""
+    from flask import current_app
+    from app.services.claim_expiry_service import ClaimExpiryService
+    from app.services.reservation_service import ReservationService
+
+    result = ClaimExpiryService.sweep(
+        default_minutes=current_app.config.get('CLAIM_HOLD_MINUTES', 120),
+        min_minutes=current_app.config.get('CLAIM_MIN_HOLD_MINUTES', 15)
+    )
+    click.echo(f"✅ Expired {result['expired_claims']} claim(s); restocked {result['restocked_offers']} offer(s).")
+    click.echo(f"✅ Reclaimed {ReservationService.reclaim_expired_leases()} meal(s) from abandoned reservation leases.")
+
+
+@click.command('compact-ledger')
+def compact_ledger_command():
+    """Folds every pending gamification ledger row into users.xp and the leaderboard."""
+    from flask import current_app
+    from app.services.ledger_service import LedgerService
+
+    folded = LedgerService.compact_all(current_app.config.get('LEDGER_COMPACT_BATCH_SIZE', 5000))
+    click.echo(f"✅ Folded {folded} ledger row(s) into the running totals.")
+
+
+@click.command('run-jobs')
+def run_jobs_command():
+    """Processes every due background job once, in the foreground."""
+    from app.services.job_queue_service import JobQueueService
+    import app.services.notification_service  # noqa: F401  (registers the job handlers)
+
+    JobQueueService.maintain()
+    ran = JobQueueService.run_pending()
+    click.echo(f"✅ Ran {ran} job(s). Queue: {JobQueueService.stats()['depth']}")
+
+
+def register_commands(app):
+    app.cli.add_command(backfill_geom_command)
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(prune_idempotency_keys_command)
+    app.cli.add_command(expire_claims_command)
+    app.cli.add_command(compact_ledger_command)
+    app.cli.add_command(run_jobs_command)
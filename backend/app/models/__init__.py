@@ -1,4 +1,6 @@
 # Import all models here so SQLAlchemy knows about them, but DO NOT redefine them!
-from .user import User, RestaurantProfile
-from .offer import Offer, Claim
-from .stats import Notification, Leaderboard
\ No newline at end of file
+from .user import User, RestaurantProfile, StudentLocation, PrincipalInvalidation
+from .offer import Offer, Claim, ReservationLease
+from .stats import Notification, NotificationCounter, Leaderboard, GamificationLedger
+from .idempotency import IdempotencyRecord
+from .job import BackgroundJob
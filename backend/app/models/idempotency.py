@@ -0,0 +1,22 @@
+from datetime import datetime
+from app.extensions import db
+
+class IdempotencyRecord(db.Model):
+    """Stored response of a mutating request, replayed when a client retries with the same Idempotency-Key."""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_scope_key'),
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(40), nullable=False)          # e.g. 'claim', 'verify'
+    key = db.Column(db.String(128), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)    # sha256 of the request body
+    status_code = db.Column(db.Integer, nullable=True)         # NULL while the first attempt is in flight
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)  # lease of the attempt in flight
+
+    def __repr__(self):
+        return f"<IdempotencyRecord {self.scope}:{self.key} ({self.status_code})>"
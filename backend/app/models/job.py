@@ -0,0 +1,31 @@
+from datetime import datetime
+from app.extensions import db
+
+class BackgroundJob(db.Model):
+    """A unit of deferred work (e.g. a new-offer fan-out) processed by the in-app job workers."""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    dedup_key = db.Column(db.String(128), unique=True, nullable=True)  # a second enqueue with the same key is a no-op
+    payload = db.Column(db.Text, nullable=False, default='{}')         # JSON
+
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Text, nullable=True)  # JSON checkpoint of a partly done job (JobQueueService.checkpoint)
+    plan = db.Column(db.Text, nullable=True)      # JSON work list, written once by the first checkpoint that passes one
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BackgroundJob {self.id} {self.kind} ({self.status}, attempt {self.attempts})>"
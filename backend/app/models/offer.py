@@ -60,4 +60,22 @@ class Claim(db.Model):
             'status': self.status,
             'date': self.created_at.strftime('%d-%m-%Y'),
             'time': self.created_at.strftime('%H:%M')
-        }
\ No newline at end of file
+        }
+class ReservationLease(db.Model):
+    """
+    Meals a worker process took off offers.quantity for its in-memory reservation lease
+    (ReservationService). `tokens` is what the lease still holds: each claim served from it
+    decrements the row in the claim's own transaction. Rows left behind by a worker that
+    died are past expires_at, and the claim sweeper returns their tokens to the offer.
+    """
+    __tablename__ = 'reservation_leases'
+    __table_args__ = (
+        db.Index('ix_reservation_leases_expires_at', 'expires_at'),
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    offer_id = db.Column(db.Integer, db.ForeignKey('offers.id'), nullable=False)
+    worker = db.Column(db.String(64), nullable=False)
+    tokens = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
@@ -14,15 +14,35 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Digest coalescing: 'new_offer' rows absorb further offers inside the coalescing window.
+    # item_count is how many offers the row covers, pushed_count how many were already pushed.
+    kind = db.Column(db.String(20))
+    item_count = db.Column(db.Integer, default=1)
+    pushed_count = db.Column(db.Integer, default=1)
+    updated_at = db.Column(db.DateTime)
+
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
             'message': self.message,
             'is_read': self.is_read,
+            'count': self.item_count or 1,
             'date': self.created_at.strftime('%d/%m %H:%M')
         }
 
+db.Index('ix_notifications_digest', Notification.kind, Notification.user_id, Notification.created_at)
+# Inbox pages are keyset scans: WHERE user_id = ? AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+db.Index('ix_notifications_inbox', Notification.user_id, Notification.created_at, Notification.id)
+
+class NotificationCounter(db.Model):
+    """Unread notifications per user, maintained alongside every insert / mark-read so the badge never runs COUNT(*)."""
+    __tablename__ = 'notification_counters'
+    __table_args__ = {'extend_existing': True}
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
 class Leaderboard(db.Model):
     __tablename__ = 'leaderboard'
     __table_args__ = {'extend_existing': True}
@@ -38,4 +58,32 @@ class Leaderboard(db.Model):
             'points': self.points,
             'meals_shared': self.meals_shared,
             'rank': 0
-        }
\ No newline at end of file
+        }
+
+# One row per restaurant: the ledger compactor upserts on it (ON CONFLICT). A unique index
+# rather than a constraint, so `flask upgrade-schema` can add it to existing tables.
+db.Index('uq_leaderboard_restaurant_id', Leaderboard.restaurant_id, unique=True)
+
+class GamificationLedger(db.Model):
+    """
+    Append-only record of every XP / points award. Verifications only insert here; the
+    ledger compactor folds pending rows (folded_at IS NULL) into users.xp/level and the
+    leaderboard table in batches, so the hot counter rows are never written per scan.
+    """
+    __tablename__ = 'gamification_ledger'
+    __table_args__ = (
+        db.Index('ix_gamification_ledger_pending_user', 'folded_at', 'user_id'),
+        {'extend_existing': True}
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    claim_id = db.Column(db.Integer, db.ForeignKey('claims.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant_profiles.id'), nullable=True)
+
+    xp_delta = db.Column(db.Integer, default=0, nullable=False)
+    points_delta = db.Column(db.Integer, default=0, nullable=False)
+    meals_delta = db.Column(db.Integer, default=0, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    folded_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,40 @@
+from sqlalchemy.types import TypeDecorator, Text
+from geoalchemy2 import Geometry
+from geoalchemy2.elements import WKTElement
+
+
+class PointGeometry(TypeDecorator):
+    """
+    SRID 4326 POINT column that stays portable across database engines.
+    On PostgreSQL with PostGIS it is a real geometry(POINT,4326) column. On plain
+    PostgreSQL or SQLite it degrades to an EWKT text column, and spatial queries are
+    answered by the in-process grid index instead (see SpatialService).
+    """
+    impl = Text
+    cache_ok = True
+
+    # Flipped by SpatialService.init_app() before any DDL runs
+    postgis_enabled = True
+
+    # Spatial indexes are declared explicitly on the table (GeoAlchemy2 reads this flag)
+    spatial_index = False
+
+    @staticmethod
+    def uses_postgis(dialect):
+        return dialect.name == 'postgresql' and PointGeometry.postgis_enabled
+
+    def load_dialect_impl(self, dialect):
+        if PointGeometry.uses_postgis(dialect):
+            return Geometry(geometry_type='POINT', srid=4326, spatial_index=False)
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        # PostGIS parses WKT elements itself; everywhere else store the EWKT string
+        if isinstance(value, WKTElement) and not PointGeometry.uses_postgis(dialect):
+            return f"SRID={value.srid};{value.data}"
+        return value
+
+
+def postgis_ddl(ddl, target, bind, **kw):
+    """ddl_if() predicate: only emit PostGIS-specific DDL (GiST indexes) when PostGIS is in use."""
+    return PointGeometry.uses_postgis(bind.dialect)
@@ -1,7 +1,10 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.extensions import db
-from geoalchemy2 import Geometry
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.models.types import PointGeometry, postgis_ddl
+from sqlalchemy import cast, event, insert, inspect
+from geoalchemy2 import Geography
+from geoalchemy2.elements import WKTElement
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -84,6 +87,30 @@ class User(db.Model):
     def __repr__(self):
         return f"<User {self.email} ({self.role})>"
 
+# --- PRINCIPAL INVALIDATIONS (cross-worker eviction of cached role_required principals) ---
+class PrincipalInvalidation(db.Model):
+    """
+    Append-only log of users whose (role, verification_status) changed or who were deleted.
+    Written in the same transaction as the change, so it becomes visible exactly when the
+    change does; every worker polls it by id and evicts the listed users.
+    """
+    __tablename__ = 'principal_invalidations'
+    __table_args__ = {'extend_existing': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # no FK: deleted users are logged too
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+@event.listens_for(User, 'after_update')
+def _log_principal_change(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.verification_status.history.has_changes():
+        connection.execute(insert(PrincipalInvalidation).values(user_id=target.id, created_at=datetime.utcnow()))
+
+@event.listens_for(User, 'after_delete')
+def _log_principal_delete(mapper, connection, target):
+    connection.execute(insert(PrincipalInvalidation).values(user_id=target.id, created_at=datetime.utcnow()))
+
 
 class RestaurantProfile(db.Model):
     __tablename__ = 'restaurant_profiles'
@@ -101,7 +128,7 @@ class RestaurantProfile(db.Model):
     
     lat = db.Column(db.Float, default=47.4979)
     lng = db.Column(db.Float, default=19.0402)
-    geom = db.Column(Geometry(geometry_type='POINT', srid=4326))
+    geom = db.Column(PointGeometry())
     
     # Explicit relationships with fully qualified paths
     offers = db.relationship('app.models.offer.Offer', backref='restaurant', lazy='dynamic')
@@ -119,6 +146,71 @@ class RestaurantProfile(db.Model):
             'lat': self.lat,
             'lng': self.lng
         }
+
+# --- GEOM SYNC (lat/lng are the source of truth, geom is derived) ---
+def point_from_lat_lng(lat, lng):
+    """Builds the SRID 4326 POINT stored in RestaurantProfile.geom (note: x=lng, y=lat)."""
+    if lat is None or lng is None:
+        return None
+    return WKTElement(f'POINT({float(lng)} {float(lat)})', srid=4326)
+
+@event.listens_for(RestaurantProfile, 'before_insert')
+def _set_geom_on_insert(mapper, connection, target):
+    # Column defaults are applied after this hook, so resolve them here to keep geom consistent
+    if target.lat is None:
+        target.lat = RestaurantProfile.__table__.c.lat.default.arg
+    if target.lng is None:
+        target.lng = RestaurantProfile.__table__.c.lng.default.arg
+    target.geom = point_from_lat_lng(target.lat, target.lng)
+
+@event.listens_for(RestaurantProfile, 'before_update')
+def _sync_geom_on_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.lat.history.has_changes() or state.attrs.lng.history.has_changes():
+        target.geom = point_from_lat_lng(target.lat, target.lng)
+
+# GiST indexes on geom and on its geography cast. The nearby offers feed filters with
+# ST_DWithin on the geography expression, so PostgreSQL can answer it with an index scan.
+# Both are skipped when PostGIS is unavailable (the grid index takes over there).
+db.Index(
+    'idx_restaurant_profiles_geom',
+    RestaurantProfile.__table__.c.geom,
+    postgresql_using='gist'
+).ddl_if(callable_=postgis_ddl)
+db.Index(
+    'ix_restaurant_profiles_geog',
+    cast(RestaurantProfile.__table__.c.geom, Geography(geometry_type='POINT', srid=4326)),
+    postgresql_using='gist'
+).ddl_if(callable_=postgis_ddl)
+
+# --- STUDENT LOCATIONS (NOTIFICATION TARGETING) ---
+class StudentLocation(db.Model):
+    """
+    One row per student: their last-known position (or home area), used to pick the
+    audience of a new-offer notification. `cell` is a coarse grid cell id so databases
+    without PostGIS can answer radius queries with a few index range scans.
+    """
+    __tablename__ = 'student_locations'
+    __table_args__ = {'extend_existing': True}
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    cell = db.Column(db.BigInteger, nullable=False, index=True)
+    geom = db.Column(PointGeometry())
+    source = db.Column(db.String(10), default='gps')  # 'gps' | 'home'
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+@event.listens_for(StudentLocation, 'before_insert')
+@event.listens_for(StudentLocation, 'before_update')
+def _sync_student_geom(mapper, connection, target):
+    target.geom = point_from_lat_lng(target.lat, target.lng)
+
+db.Index(
+    'ix_student_locations_geog',
+    cast(StudentLocation.__table__.c.geom, Geography(geometry_type='POINT', srid=4326)),
+    postgresql_using='gist'
+).ddl_if(callable_=postgis_ddl)
     
 # --- AUDIT LOG (ENTERPRISE SECURITY) ---
 class AuditLog(db.Model):
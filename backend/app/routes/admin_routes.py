@@ -3,6 +3,12 @@ from app.models import User, RestaurantProfile, Offer, Claim
 from app.extensions import db
 from app.models.user import AuditLog
 from sqlalchemy import func 
+from app.services.spatial_service import SpatialService
+from app.services.reservation_service import ReservationService
+from app.services.job_queue_service import JobQueueService
+from app.services.notification_service import NotificationService
+from app.services.audit_service import AuditService
+from app.services.google_cert_service import GoogleCertService
 from app.utils.decorators import admin_required # 🚀 THE FIX: Imported the Security Shield
 
 admin_bp = Blueprint('admin', __name__)
@@ -254,6 +260,8 @@ def cancel_offer():
     try:
         offer.status = 'cancelled'
         db.session.commit()
+        SpatialService.sync_offer(offer)
+        ReservationService.discard(offer.id)
         return jsonify({"success": True, "message": "Offer has been successfully cancelled."}), 200
     except Exception as e:
         db.session.rollback()
@@ -275,4 +283,23 @@ def get_audit_logs():
             "ip_address": log.ip_address,
             "timestamp": log.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         } for log in logs]
-    }), 200
\ No newline at end of file
+    }), 200
+
+# --- OFFERS FEED CACHE STATS ---
+@admin_bp.route('/cache-stats', methods=['GET'])
+@admin_required # 🛡️ Shield applied
+def get_cache_stats():
+    """Exposes this worker's offers-feed cache counters (hits, misses, evictions) and claim reservation lease counters."""
+    return jsonify({"success": True, "data": {
+        "offer_feed": SpatialService.feed_cache_stats(), "reservations": ReservationService.snapshot_stats()
+    }}), 200
+
+# --- BACKGROUND JOB QUEUE STATS ---
+@admin_bp.route('/queue-stats', methods=['GET'])
+@admin_required # 🛡️ Shield applied
+def get_queue_stats():
+    """Job queue depth, retry backlog and oldest due job, plus push, audit writer and Google cert cache counters."""
+    return jsonify({"success": True, "data": dict(
+        JobQueueService.stats(), push=NotificationService.push_stats(), audit=AuditService.stats(),
+        google_certs=GoogleCertService.stats()
+    )}), 200
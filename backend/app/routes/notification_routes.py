@@ -0,0 +1,65 @@
+from flask import Blueprint, jsonify, request, g
+from app.services.notification_service import NotificationService
+from app.utils.decorators import token_required
+
+notification_bp = Blueprint('notification', __name__)
+
+DEFAULT_INBOX_PAGE = 20
+MAX_INBOX_PAGE = 100
+MAX_MARK_READ_IDS = 500
+
+# --- INBOX (KEYSET PAGINATION) ---
+@notification_bp.route('', methods=['GET'])
+@token_required
+def get_inbox():
+    """
+    The caller's notifications, newest first. Query params: limit, cursor, unread_only.
+    The opaque cursor for the next page comes back as `next_cursor` (null on the last page).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_INBOX_PAGE)), 1), MAX_INBOX_PAGE)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be an integer.'}), 400
+    unread_only = request.args.get('unread_only', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        items, next_cursor = NotificationService.get_inbox(g.user.id, limit, request.args.get('cursor'), unread_only)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'notifications': items,
+        'next_cursor': next_cursor,
+        'unread': NotificationService.unread_count(g.user.id)
+    }), 200
+
+# --- BADGE (MAINTAINED COUNTER, NO COUNT(*)) ---
+@notification_bp.route('/unread-count', methods=['GET'])
+@token_required
+def get_unread_count():
+    return jsonify({'success': True, 'unread': NotificationService.unread_count(g.user.id)}), 200
+
+# --- BULK MARK-READ ---
+@notification_bp.route('/read', methods=['POST'])
+@token_required
+def mark_read():
+    """Body: {"ids": [1, 2, ...]} or {"all": true}."""
+    data = request.get_json() or {}
+    ids = None
+    if not data.get('all'):
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'success': False, 'message': "Provide a non-empty 'ids' list or 'all': true."}), 400
+        if len(ids) > MAX_MARK_READ_IDS:
+            return jsonify({'success': False, 'message': f'At most {MAX_MARK_READ_IDS} ids per request.'}), 400
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'ids must be integers.'}), 400
+
+    try:
+        marked, unread = NotificationService.mark_read(g.user.id, ids)
+    except Exception as e:
+        print(f"Mark Read Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({'success': True, 'marked': marked, 'unread': unread}), 200
@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+import base64
+import time
+from flask import Blueprint, request, jsonify, g
 from app.services.qr_service import QRService
-from app.services.notification_service import NotificationService
-from app.models.stats import Leaderboard
+from app.services.spatial_service import SpatialService
+from app.services.reservation_service import ReservationService
+from app.services.leaderboard_service import LeaderboardService, WINDOWS
+from app.utils.decorators import idempotent, role_required
 
 restaurant_bp = Blueprint('restaurant', __name__)
 
@@ -67,6 +71,8 @@ def delete_offer(offer_id):
         # Soft delete: mark as cancelled instead of permanently removing from the DB
         offer.status = 'cancelled'
         db.session.commit()
+        SpatialService.sync_offer(offer)
+        ReservationService.discard(offer.id)
 
         return jsonify({'success': True, 'message': 'Offer removed.'}), 200
 
@@ -79,28 +85,21 @@ def delete_offer(offer_id):
 
 @restaurant_bp.route('/offers/create', methods=['POST'])
 def create_offer():
-    """Creates a new offer and triggers push notifications to nearby students."""
+    """Creates a new offer and queues push notifications to students."""
     data = request.get_json()
 
     # Sanitize the 'type' field before it reaches the database
     if data and 'type' in data and data['type']:
         data['type'] = str(data['type']).lower().strip()
 
+    # Student notifications are queued with the offer and sent by the background job workers
     result = QRService.create_offer(data)
 
-    # If the offer was saved successfully, fire push notifications
-    if result.get('success'):
-        try:
-            print("Offer created! Triggering push notifications for students...")
-            NotificationService.notify_students_new_offer(data)
-        except Exception as e:
-            # Notifications failing must not block the restaurant's success response
-            print(f"Notification trigger failed (offer was saved): {str(e)}")
-
     return jsonify(result), result.get('status', 200)
 
 
 @restaurant_bp.route('/claims/verify', methods=['POST'])
+@idempotent('verify')
 def verify_claim():
     """Validates a student's QR code and awards points to both parties."""
     data = request.get_json()
@@ -111,25 +110,126 @@ def verify_claim():
     return jsonify(result), result.get('status', 200)
 
 
+def _current_restaurant():
+    """Restaurant profile of the JWT-authenticated owner (set by role_required)."""
+    from app.models.user import RestaurantProfile
+    return RestaurantProfile.query.filter_by(owner_user_id=g.user.id).first()
+
+
+@restaurant_bp.route('/restaurant/scanner-key', methods=['GET'])
+@role_required(['restaurant'])
+def get_scanner_key():
+    """Hands the restaurant's scanner app the HMAC key it needs to validate signed QR codes offline."""
+    restaurant = _current_restaurant()
+    if not restaurant:
+        return jsonify({'success': False, 'message': 'Restaurant profile not found.'}), 404
+
+    key = base64.urlsafe_b64encode(QRService.scanner_key(restaurant.id)).rstrip(b'=').decode('ascii')
+    return jsonify({'success': True, 'restaurant_id': restaurant.id, 'algorithm': 'HS256-128', 'key': key}), 200
+
+
+@restaurant_bp.route('/claims/verify-offline', methods=['POST'])
+def verify_claim_offline():
+    """
+    Lightweight signature/expiry check of a signed QR code. Does not touch the database and
+    does not redeem the claim; redemption happens on /claims/verify or /claims/reconcile.
+    """
+    data = request.get_json(silent=True) or {}
+    restaurant_id = data.get('restaurant_id')
+    try:
+        restaurant_id = int(restaurant_id) if restaurant_id is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'restaurant_id must be an integer.'}), 400
+
+    result = QRService.check_signed_code(data.get('qr_code'), restaurant_id=restaurant_id)
+    return jsonify(result), result.get('status', 200)
+
+
+MAX_VERIFY_BATCH = 500
+
+@restaurant_bp.route('/claims/verify-batch', methods=['POST'])
+@role_required(['restaurant'])
+@idempotent('verify-batch')
+def verify_claims_batch():
+    """
+    Verifies a queue of scanned QR codes in one round trip.
+    Body: {"qr_codes": ["...", ...]}. Returns one result per code, in the same order.
+    """
+    data = request.get_json(silent=True) or {}
+    qr_codes = data.get('qr_codes')
+    if not isinstance(qr_codes, list) or not qr_codes:
+        return jsonify({'success': False, 'message': 'qr_codes must be a non-empty list.'}), 400
+    if len(qr_codes) > MAX_VERIFY_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_VERIFY_BATCH} codes per batch.'}), 400
+
+    restaurant = _current_restaurant()
+    if not restaurant:
+        return jsonify({'success': False, 'message': 'Restaurant profile not found.'}), 404
+
+    result = QRService.verify_claims_batch([(code, None) for code in qr_codes], restaurant_id=restaurant.id)
+    return jsonify(result), result.get('status', 200)
+
+
+@restaurant_bp.route('/claims/reconcile', methods=['POST'])
+@role_required(['restaurant'])
+@idempotent('reconcile')
+def reconcile_claims():
+    """
+    Uploads redemptions that a scanner validated while offline.
+    Body: {"redemptions": [{"qr_code": "...", "scanned_at": <epoch seconds>}, ...]}
+    Each code is redeemed as of its scan time and gets its own result entry. Scan times
+    older than QR_OFFLINE_SYNC_WINDOW_MINUTES or before the claim was created are rejected.
+    """
+    data = request.get_json(silent=True) or {}
+    redemptions = data.get('redemptions')
+    if not isinstance(redemptions, list) or not redemptions:
+        return jsonify({'success': False, 'message': 'redemptions must be a non-empty list.'}), 400
+    if len(redemptions) > MAX_VERIFY_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_VERIFY_BATCH} redemptions per upload.'}), 400
+
+    restaurant = _current_restaurant()
+    if not restaurant:
+        return jsonify({'success': False, 'message': 'Restaurant profile not found.'}), 404
+
+    now = time.time()
+    items = []
+    for item in redemptions:
+        item = item if isinstance(item, dict) else {}
+        try:
+            # A scan can't have happened in the future; clock-skewed scanners are clamped
+            scanned_at = min(float(item.get('scanned_at', now)), now)
+        except (TypeError, ValueError):
+            scanned_at = now
+        items.append((item.get('qr_code'), scanned_at))
+
+    result = QRService.verify_claims_batch(items, restaurant_id=restaurant.id)
+    return jsonify(result), result.get('status', 200)
+
+
 @restaurant_bp.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
-    """Returns the top 10 restaurants ranked by points."""
+    """Returns the top 10 restaurants ranked by points. Optional ?window=daily|weekly|all."""
     try:
-        leaders = Leaderboard.query.order_by(Leaderboard.points.desc()).limit(10).all()
-
-        output = []
-        for index, leader in enumerate(leaders):
-            rest_name = leader.restaurant_lb.name if leader.restaurant_lb else 'Unnamed'
-            output.append({
-                'restaurant': rest_name,
-                'points': leader.points,
-                'meals': leader.meals_shared,
-                'rank': index + 1
-            })
+        window = request.args.get('window', 'all')
+        if window not in WINDOWS:
+            return jsonify({'success': False, 'message': f"window must be one of {', '.join(WINDOWS)}."}), 400
 
-        return jsonify(output), 200
+        return jsonify(LeaderboardService.top(window, 10)), 200
 
     except Exception as e:
         # Return empty array instead of 500 so the Home Screen does not crash
         print(f"Leaderboard error: {str(e)}")
-        return jsonify([]), 200
\ No newline at end of file
+        return jsonify([]), 200
+
+
+@restaurant_bp.route('/leaderboard/rank/<int:restaurant_id>', methods=['GET'])
+def get_restaurant_rank(restaurant_id):
+    """A single restaurant's rank in the chosen window, answered from the in-memory index."""
+    window = request.args.get('window', 'all')
+    if window not in WINDOWS:
+        return jsonify({'success': False, 'message': f"window must be one of {', '.join(WINDOWS)}."}), 400
+
+    entry = LeaderboardService.rank_of(restaurant_id, window)
+    if entry is None:
+        return jsonify({'success': False, 'message': 'No points in this window yet.'}), 404
+    return jsonify({'success': True, **entry}), 200
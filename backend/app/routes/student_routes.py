@@ -1,53 +1,53 @@
 from flask import Blueprint, jsonify, request
 from app.extensions import db
-from app.models import User, RestaurantProfile, Offer, Claim, Leaderboard
+from app.models import User, RestaurantProfile, Offer, Claim
 from app.services.qr_service import QRService 
 from app.services.recommendation_service import RecommendationService
-from sqlalchemy import desc, func
+from app.services.leaderboard_service import LeaderboardService, WINDOWS
+from app.services.student_rank_service import StudentRankService
+from app.services.spatial_service import SpatialService, DEFAULT_RADIUS_KM, MAX_RADIUS_KM, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.decorators import idempotent
+from sqlalchemy import desc
 import math
 
 student_bp = Blueprint('student', __name__)
 
-# --- GET OFFERS WITH POSTGIS ---
+# --- GET NEARBY OFFERS (POSTGIS OR GRID INDEX) ---
 @student_bp.route('/offers', methods=['GET'])
 def get_offers():
+    """
+    Returns the nearest active offers as a JSON array, one page at a time.
+    Query params: lat, lng, radius_km, limit, cursor. When more results exist, the
+    opaque cursor for the next page is returned in the X-Next-Cursor response header.
+    """
     try:
         user_lat = float(request.args.get('lat', 41.0082))
         user_lng = float(request.args.get('lng', 28.9784))
-        
-        # 1. Convert user's latitude and longitude into a PostGIS Geometry Point
-        user_location = func.ST_SetSRID(func.ST_MakePoint(user_lng, user_lat), 4326)
-        
-        # 2. Calculate distance in meters using ST_DistanceSphere, then convert to km
-        distance_calc = (func.ST_DistanceSphere(RestaurantProfile.geom, user_location) / 1000).label('distance')
-        
-        # 3. Query the database and order by exact spatial distance
-        results = db.session.query(Offer, RestaurantProfile, distance_calc)\
-            .join(RestaurantProfile, Offer.restaurant_id == RestaurantProfile.id)\
-            .filter(Offer.status == 'active', Offer.quantity > 0)\
-            .order_by(distance_calc)\
-            .all()
-            
-        output = []
-        for offer, rest, dist in results:
-            output.append({
-                'id': offer.id,
-                'restaurant': rest.name,
-                'type': offer.type,
-                'description': offer.description,
-                'quantity': offer.quantity,
-                'discount_rate': offer.discount_rate,
-                'lat': rest.lat, 
-                'lng': rest.lng,
-                'distance': round(dist, 2) if dist is not None else 0.0,
-                'image_url': offer.image_url 
-            })
-            
-        return jsonify(output)
+        radius_km = float(request.args.get('radius_km', DEFAULT_RADIUS_KM))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+    except (TypeError, ValueError):
+        return jsonify({"error": "lat, lng, radius_km and limit must be numeric."}), 400
+
+    # Clamp client input so a single request can never scan or return the whole country
+    radius_km = min(max(radius_km, 0.1), MAX_RADIUS_KM)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    try:
+        output, next_cursor = SpatialService.get_offer_feed(
+            user_lat, user_lng, radius_km=radius_km, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"PostGIS Spatial Query Error: {str(e)}")
+        print(f"Spatial Query Error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+    response = jsonify(output)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 # --- AI RECOMMENDATION MODULE ---
 @student_bp.route('/recommendations/<user_id>', methods=['GET'])
 def get_ai_recommendations(user_id):
@@ -90,6 +90,7 @@ def get_ai_recommendations(user_id):
 
 # --- CLAIM AN OFFER ---
 @student_bp.route('/offers/claim', methods=['POST'])
+@idempotent('claim')
 def claim_offer():
     data = request.get_json()
     result = QRService.claim_offer(data.get('user_id'), data.get('offer_id'))
@@ -133,16 +134,67 @@ def get_student_history(user_id):
 @student_bp.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
     try:
-        leaders = Leaderboard.query.order_by(desc(Leaderboard.points)).limit(5).all()
-        output = []
-        for l in leaders:
-            rest_name = l.restaurant_lb.name if l.restaurant_lb else "Unnamed"
-            output.append({
-                'restaurant': rest_name,
-                'points': l.points,
-                'meals': l.meals_shared
-            })
-        return jsonify(output)
+        window = request.args.get('window', 'all')
+        if window not in WINDOWS:
+            return jsonify({'error': f"window must be one of {', '.join(WINDOWS)}."}), 400
+        # Served from the in-memory leaderboard index (no DB hit on the hot path)
+        return jsonify(LeaderboardService.top(window, 5))
     except Exception as e:
         print(f"Leaderboard Route Error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+# --- STUDENT XP RANKINGS (IN-MEMORY ORDER-STATISTIC INDEX) ---
+@student_bp.route('/students/rank/<int:user_id>', methods=['GET'])
+def get_student_rank(user_id):
+    """A student's global and per-university rank by XP."""
+    if not StudentRankService.ready():
+        return jsonify({'success': False, 'message': 'Rankings are still loading, try again shortly.'}), 503
+    standing = StudentRankService.rank_of(user_id)
+    if standing is None:
+        return jsonify({'success': False, 'message': 'Student not found.'}), 404
+    return jsonify({'success': True, **standing}), 200
+
+
+@student_bp.route('/students/top', methods=['GET'])
+def get_top_students():
+    """Top students by XP. Query params: university (optional), limit (default 10, max 100)."""
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be an integer.'}), 400
+    if not StudentRankService.ready():
+        return jsonify({'success': False, 'message': 'Rankings are still loading, try again shortly.'}), 503
+
+    return jsonify(StudentRankService.top(limit, request.args.get('university'))), 200
+
+# --- LAST-KNOWN LOCATION (NEW-OFFER NOTIFICATION TARGETING) ---
+@student_bp.route('/students/location', methods=['POST'])
+def update_student_location():
+    """
+    Stores a student's last-known position or home area. Body: user_id, lat, lng,
+    source ('gps' or 'home'). New-offer pushes go to students near the restaurant.
+    """
+    data = request.get_json() or {}
+    try:
+        user_id = int(data.get('user_id'))
+        lat, lng = float(data.get('lat')), float(data.get('lng'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'user_id, lat and lng are required and must be numeric.'}), 400
+    source = data.get('source', 'gps')
+    if source not in ('gps', 'home'):
+        return jsonify({'success': False, 'message': "source must be 'gps' or 'home'."}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'success': False, 'message': 'Coordinates out of range.'}), 400
+
+    student = db.session.get(User, user_id)
+    if not student or student.role != 'student':
+        return jsonify({'success': False, 'message': 'Student not found.'}), 404
+
+    try:
+        updated = SpatialService.update_student_location(user_id, lat, lng, source)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Location Update Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({'success': True, 'updated': updated}), 200
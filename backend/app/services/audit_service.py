@@ -0,0 +1,166 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import insert
+from app.models.user import AuditLog
+from app.extensions import db
+
+
+class AuditService:
+    """
+    Asynchronous, batched audit-log writer.
+
+    record() only appends the event (timestamp and client IP captured on the spot) to a
+    bounded in-process queue, so request handlers never commit for auditing and never
+    commit someone else's pending work. A background writer drains the queue every
+    AUDIT_FLUSH_INTERVAL_MS or AUDIT_BATCH_SIZE events into one multi-row INSERT on its
+    own session. When the DB lags and the queue is full, record() waits at most
+    AUDIT_ENQUEUE_TIMEOUT_MS and then drops the event (counted), so login latency is
+    bounded by the queue, not by the audit table. A batch that fails to insert is retried
+    a few times, then written row by row so only the rows that still fail (e.g. an FK
+    violation) are dropped. Callers record events only after their own commit succeeded.
+    """
+
+    _queue = queue.Queue(maxsize=10000)
+    _writer = None
+    _app = None
+    _flush_interval = 0.2
+    _batch_size = 500
+    _enqueue_timeout = 0.005
+    _max_retries = 3
+    _flush_lock = threading.Lock()
+    counters = {'enqueued': 0, 'written': 0, 'dropped_full': 0, 'dropped_failed': 0, 'batches': 0, 'failed_batches': 0}
+
+    @staticmethod
+    def init_app(app):
+        AuditService._app = app
+        AuditService._batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        AuditService._enqueue_timeout = app.config.get('AUDIT_ENQUEUE_TIMEOUT_MS', 5) / 1000.0
+        size = app.config.get('AUDIT_QUEUE_SIZE', 10000)
+        if AuditService._queue.maxsize != size and AuditService._queue.empty():
+            AuditService._queue = queue.Queue(maxsize=size)
+
+        interval_ms = app.config.get('AUDIT_FLUSH_INTERVAL_MS', 200)
+        AuditService._flush_interval = interval_ms / 1000.0
+        if interval_ms > 0 and AuditService._writer is None:
+            AuditService._writer = threading.Thread(
+                target=AuditService._write_forever, args=(app,), daemon=True, name='audit-writer'
+            )
+            AuditService._writer.start()
+            atexit.register(AuditService._flush_at_exit)
+
+    # --- PRODUCER ---
+    @staticmethod
+    def record(user_id, action, details=""):
+        """Queues one audit event. Never touches the caller's DB session. Returns False if dropped."""
+        event = {
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': request.remote_addr if has_request_context() else 'Unknown IP',
+            'timestamp': datetime.utcnow()
+        }
+        try:
+            AuditService._queue.put(event, timeout=AuditService._enqueue_timeout)
+        except queue.Full:
+            AuditService.counters['dropped_full'] += 1
+            return False
+        AuditService.counters['enqueued'] += 1
+        return True
+
+    # --- WRITER ---
+    @staticmethod
+    def _insert(rows):
+        try:
+            db.session.execute(insert(AuditLog), rows)
+            db.session.commit()
+            return None
+        except Exception as e:
+            db.session.rollback()
+            return e
+
+    @staticmethod
+    def _write_batch(batch):
+        """Inserts `batch`, returns how many events were written."""
+        for attempt in range(1, AuditService._max_retries + 1):
+            error = AuditService._insert(batch)
+            if error is None:
+                AuditService.counters['written'] += len(batch)
+                AuditService.counters['batches'] += 1
+                return len(batch)
+            AuditService.counters['failed_batches'] += 1
+            print(f"⚠️ Audit batch of {len(batch)} failed (attempt {attempt}): {error}")
+            if len(batch) > 1:
+                break  # one bad row fails the whole INSERT: isolate it below instead of sleeping on it
+            time.sleep(min(0.1 * 2 ** attempt, 2))
+
+        # Row by row, so a poison event does not take the valid events of other requests with it
+        written = 0
+        if len(batch) > 1:
+            for event in batch:
+                error = AuditService._insert([event])
+                if error is None:
+                    written += 1
+                else:
+                    print(f"⚠️ Dropping audit event {event['action']} for user {event['user_id']}: {error}")
+            AuditService.counters['written'] += written
+        AuditService.counters['dropped_failed'] += len(batch) - written
+        return written
+
+    @staticmethod
+    def _next_batch(first, deadline):
+        """`first` plus whatever arrives before `deadline`, capped at AUDIT_BATCH_SIZE events."""
+        batch = [first]
+        while len(batch) < AuditService._batch_size:
+            remaining = deadline - time.monotonic() if deadline is not None else 0
+            try:
+                batch.append(AuditService._queue.get(timeout=remaining) if remaining > 0 else AuditService._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def flush():
+        """Writes everything queued so far (CLI, tests, shutdown). Returns how many events were written."""
+        written = 0
+        with AuditService._flush_lock:
+            while True:
+                try:
+                    first = AuditService._queue.get_nowait()
+                except queue.Empty:
+                    return written
+                written += AuditService._write_batch(AuditService._next_batch(first, None))
+
+    @staticmethod
+    def _write_forever(app):
+        while True:
+            # Sleep until an event arrives, then let the batch fill for one interval or until it is full
+            first = AuditService._queue.get()
+            batch = AuditService._next_batch(first, time.monotonic() + AuditService._flush_interval)
+            with app.app_context():
+                try:
+                    with AuditService._flush_lock:
+                        AuditService._write_batch(batch)
+                except Exception as e:
+                    print(f"⚠️ Audit writer error: {e}")
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def _flush_at_exit():
+        app = AuditService._app
+        if app is None or AuditService._queue.empty():
+            return
+        try:
+            with app.app_context():
+                AuditService.flush()
+                db.session.remove()
+        except Exception as e:
+            print(f"⚠️ Audit flush at exit failed: {e}")
+
+    @staticmethod
+    def stats():
+        return dict(AuditService.counters, queued=AuditService._queue.qsize(), capacity=AuditService._queue.maxsize)
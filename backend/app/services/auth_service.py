@@ -8,14 +8,14 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
-from flask import current_app, request
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from flask import current_app
 from sqlalchemy import text
 
 from app.models import User, RestaurantProfile
-from app.models.user import AuditLog 
 from app.extensions import db
+from app.services.audit_service import AuditService
+from app.services.password_service import PasswordService
+from app.services.google_cert_service import GoogleCertService
 
 # --- INITIALIZE ENVIRONMENT VARIABLES ---
 # This securely loads all variables from your .env file into the os.environ dictionary
@@ -26,15 +26,11 @@ class AuthService:
     # --- INTERNAL HELPER: AUDIT LOGGER ---
     @staticmethod
     def log_audit(user_id, action, details=""):
-        """Records critical security events to the database for monitoring."""
-        try:
-            ip = request.remote_addr if request else 'Unknown IP'
-            log = AuditLog(user_id=user_id, action=action, details=details, ip_address=ip)
-            db.session.add(log)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ AUDIT LOG FAILED: {str(e)}")
+        """
+        Records critical security events for monitoring. Queued for the batched background
+        writer (AuditService), so it neither blocks on nor commits the caller's session.
+        """
+        AuditService.record(user_id, action, details)
 
     # --- REGISTER USER ---
     @staticmethod
@@ -75,7 +71,7 @@ class AuthService:
                 major=major,
                 study_year=study_year
             )
-            new_user.password = password
+            new_user.password_hash = PasswordService.hash_password(password)
             
             db.session.add(new_user)
             db.session.flush() 
@@ -111,7 +107,7 @@ class AuthService:
 
         user = User.query.filter_by(email=email).first()
 
-        if not user or not user.check_password(password):
+        if not user or not PasswordService.verify_password(user.password_hash, password):
             AuthService.log_audit(user.id if user else None, 'LOGIN_FAILED', f"Failed attempt for email: {email}")
             return {'success': False, 'message': 'Invalid email or password.', 'status': 401}
 
@@ -137,6 +133,11 @@ class AuthService:
                 secret_key, algorithm="HS256"
             )
             
+            # Transparently upgrade hashes made with older PASSWORD_HASH_METHOD / salt settings
+            if PasswordService.needs_rehash(user.password_hash):
+                user.password_hash = PasswordService.hash_password(password)
+                db.session.commit()
+
             AuthService.log_audit(user.id, 'LOGIN_SUCCESS', 'Tokens generated.')
 
             return {
@@ -203,7 +204,7 @@ class AuthService:
             user.email = data['email']
             changes.append("Email")
         if data.get('password'):
-            user.password = data['password'] 
+            user.password_hash = PasswordService.hash_password(data['password'])
             changes.append("Password")
 
         try:
@@ -258,8 +259,8 @@ class AuthService:
         try:
             client_id = os.environ.get("GOOGLE_WEB_CLIENT_ID")
             
-            # 1. Verify the token with Google's servers securely
-            idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), client_id)
+            # 1. Verify the token locally against Google's cached signing certificates
+            idinfo = GoogleCertService.verify_id_token(token, client_id)
 
             # 2. Extract user data from the verified Google payload
             email = idinfo['email']
@@ -268,8 +269,9 @@ class AuthService:
 
             # 3. Check if user already exists in our database
             user = User.query.filter_by(email=email).first()
+            created = user is None
 
-            if not user:
+            if created:
                 # First time login! Create a new student account silently
                 user = User(
                     name=name, 
@@ -278,12 +280,10 @@ class AuthService:
                     verification_status='unverified',
                     avatar_url=avatar_url
                 )
-                user.password = secrets.token_urlsafe(16)
+                user.password_hash = PasswordService.hash_password(secrets.token_urlsafe(16))
                 
                 db.session.add(user)
                 db.session.flush() 
-                
-                AuthService.log_audit(user.id, 'REGISTER_GOOGLE_SUCCESS', f"Email: {email}")
 
             # 4. Generate native Dual-Tokens
             secret_key = current_app.config['JWT_SECRET_KEY']
@@ -299,6 +299,9 @@ class AuthService:
             )
             
             db.session.commit()
+            # Audit only after the commit: an event for a rolled-back user would fail its FK
+            if created:
+                AuthService.log_audit(user.id, 'REGISTER_GOOGLE_SUCCESS', f"Email: {email}")
             AuthService.log_audit(user.id, 'LOGIN_GOOGLE_SUCCESS', 'Native tokens generated.')
 
             user_data = user.to_dict()
@@ -0,0 +1,120 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, update
+from app.models import Offer, Claim
+from app.services.reservation_service import ReservationService
+from app.extensions import db
+
+
+class ClaimExpiryService:
+    """
+    Background sweeper for pending claims that were never picked up.
+
+    A pending claim holds a meal for as long as the offer's pickup window lasts
+    (pickup_end - pickup_start), or CLAIM_HOLD_MINUTES when the offer has no window.
+    Past that, the claim is marked 'expired' and its meal goes back on the shelf.
+    Everything is set-based: one grouped SELECT to find affected offers, then one claims
+    UPDATE and one offers UPDATE per offer. No Claim rows are ever loaded into the ORM.
+    Each pass also reclaims the meals of reservation leases whose worker died holding them.
+    """
+
+    _sweeper = None
+
+    @staticmethod
+    def init_app(app):
+        interval = app.config.get('CLAIM_SWEEP_INTERVAL_SECONDS', 300)
+        if interval > 0 and ClaimExpiryService._sweeper is None:
+            ClaimExpiryService._sweeper = threading.Thread(
+                target=ClaimExpiryService._sweep_forever, args=(app, interval), daemon=True, name='claim-sweeper'
+            )
+            ClaimExpiryService._sweeper.start()
+
+    @staticmethod
+    def hold_duration(pickup_start, pickup_end, default_minutes, min_minutes):
+        """How long a pending claim may hold a meal, derived from the 'HH:MM' pickup window."""
+        try:
+            start = datetime.strptime(pickup_start, '%H:%M')
+            end = datetime.strptime(pickup_end, '%H:%M')
+            window = end - start
+            if window <= timedelta(0):
+                window += timedelta(days=1)  # e.g. 22:00 - 01:00
+        except (TypeError, ValueError):
+            window = timedelta(minutes=default_minutes)
+        return max(window, timedelta(minutes=min_minutes))
+
+    @staticmethod
+    def sweep(now=None, default_minutes=120, min_minutes=15):
+        """
+        Expires stale pending claims and restocks their offers.
+        Returns {'expired_claims': n, 'restocked_offers': m}.
+        """
+        from app.services.spatial_service import SpatialService
+
+        now = now or datetime.utcnow()
+        min_hold = timedelta(minutes=min_minutes)
+
+        # 1. One grouped query: offers that have at least one pending claim old enough to expire
+        candidates = db.session.query(Offer.id, Offer.pickup_start, Offer.pickup_end)\
+            .join(Claim, Claim.offer_id == Offer.id)\
+            .filter(Claim.status == 'pending', Claim.created_at < now - min_hold)\
+            .group_by(Offer.id, Offer.pickup_start, Offer.pickup_end)\
+            .all()
+
+        expired_total = 0
+        restocked = []
+        for offer_id, pickup_start, pickup_end in candidates:
+            cutoff = now - ClaimExpiryService.hold_duration(pickup_start, pickup_end, default_minutes, min_minutes)
+
+            # 2. Expire this offer's stale claims in one statement. The status guard makes
+            #    concurrent sweepers (one per worker) count every claim exactly once.
+            expired = db.session.execute(
+                update(Claim)
+                .where(Claim.offer_id == offer_id, Claim.status == 'pending', Claim.created_at < cutoff)
+                .values(status='expired')
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not expired:
+                continue
+
+            # 3. Return all of them to stock with one grouped update, reopening sold-out offers
+            reopened = db.session.execute(
+                update(Offer)
+                .where(Offer.id == offer_id, Offer.status.in_(['active', 'sold_out']))
+                .values(
+                    quantity=func.coalesce(Offer.quantity, 0) + expired,
+                    status=case((Offer.status == 'sold_out', 'active'), else_=Offer.status)
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            expired_total += expired
+            if reopened:
+                restocked.append(offer_id)
+
+        db.session.commit()
+
+        for offer_id in restocked:
+            SpatialService.sync_offer(db.session.get(Offer, offer_id))
+
+        return {'expired_claims': expired_total, 'restocked_offers': len(restocked)}
+
+    @staticmethod
+    def _sweep_forever(app, interval):
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    result = ClaimExpiryService.sweep(
+                        default_minutes=app.config.get('CLAIM_HOLD_MINUTES', 120),
+                        min_minutes=app.config.get('CLAIM_MIN_HOLD_MINUTES', 15)
+                    )
+                    if result['expired_claims']:
+                        print(f"🧹 Expired {result['expired_claims']} stale claim(s) across {result['restocked_offers']} offer(s).")
+                    reclaimed = ReservationService.reclaim_expired_leases()
+                    if reclaimed:
+                        print(f"🧹 Reclaimed {reclaimed} meal(s) from abandoned reservation leases.")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Claim sweeper error: {e}")
+                finally:
+                    db.session.remove()
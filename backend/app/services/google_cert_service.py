@@ -0,0 +1,110 @@
+import base64
+import json
+import re
+import threading
+import time
+import requests
+from google.auth import jwt as google_jwt
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleCertService:
+    """
+    Verifies Google ID tokens locally against a process-wide cache of Google's signing
+    certificates (kid -> PEM).
+
+    The cert set is fetched through one pooled requests.Session and kept for the
+    Cache-Control max-age Google sends (a few hours), so a warm login does no network I/O
+    at all. A token signed with a kid the cache has never seen (key rotation) triggers
+    one early refresh, at most every GOOGLE_CERTS_MIN_REFRESH_SECONDS so forged kids
+    cannot turn into a fetch per request.
+    """
+
+    certs_url = GOOGLE_CERTS_URL
+    session = None
+    timeout_seconds = 5
+    default_max_age = 300
+    min_refresh_seconds = 30
+
+    _certs = {}
+    _expires_at = 0.0
+    _fetched_at = None
+    _lock = threading.Lock()
+    counters = {'fetches': 0, 'verified': 0}
+
+    @staticmethod
+    def init_app(app):
+        GoogleCertService.certs_url = app.config.get('GOOGLE_CERTS_URL', GOOGLE_CERTS_URL)
+        GoogleCertService.timeout_seconds = app.config.get('GOOGLE_CERTS_TIMEOUT_SECONDS', 5)
+        GoogleCertService.default_max_age = app.config.get('GOOGLE_CERTS_DEFAULT_MAX_AGE', 300)
+        GoogleCertService.min_refresh_seconds = app.config.get('GOOGLE_CERTS_MIN_REFRESH_SECONDS', 30)
+
+    # --- CERT CACHE ---
+    @staticmethod
+    def _session():
+        if GoogleCertService.session is None:
+            GoogleCertService.session = requests.Session()
+        return GoogleCertService.session
+
+    @staticmethod
+    def _refresh(now):
+        """Downloads the cert set and schedules the next refresh from Cache-Control max-age."""
+        response = GoogleCertService._session().get(GoogleCertService.certs_url, timeout=GoogleCertService.timeout_seconds)
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not fetch Google certificates (HTTP {response.status_code}).")
+        certs = response.json()
+
+        match = _MAX_AGE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else GoogleCertService.default_max_age
+        GoogleCertService._certs = certs
+        GoogleCertService._expires_at = now + max_age
+        GoogleCertService._fetched_at = now
+        GoogleCertService.counters['fetches'] += 1
+
+    @staticmethod
+    def certs(kid=None):
+        """The cached cert set; refreshed when expired, or early when `kid` is unknown."""
+        now = time.monotonic()
+        if now < GoogleCertService._expires_at and (kid is None or kid in GoogleCertService._certs):
+            return GoogleCertService._certs
+
+        with GoogleCertService._lock:
+            now = time.monotonic()
+            expired = now >= GoogleCertService._expires_at
+            fetched_at = GoogleCertService._fetched_at
+            unknown_kid = kid is not None and kid not in GoogleCertService._certs
+            may_refetch = fetched_at is None or now - fetched_at >= GoogleCertService.min_refresh_seconds
+            if expired or (unknown_kid and may_refetch):
+                GoogleCertService._refresh(now)
+            return GoogleCertService._certs
+
+    # --- VERIFICATION ---
+    @staticmethod
+    def _key_id(token):
+        try:
+            header = token.split('.', 1)[0]
+            return json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4))).get('kid')
+        except Exception:
+            raise ValueError('Malformed Google ID token.')
+
+    @staticmethod
+    def verify_id_token(token, audience):
+        """
+        Same checks as google.oauth2.id_token.verify_oauth2_token (signature, expiry,
+        audience, issuer) against the cached certs. Raises ValueError for an invalid token.
+        """
+        certs = GoogleCertService.certs(GoogleCertService._key_id(token))
+        claims = google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+        if claims.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        GoogleCertService.counters['verified'] += 1
+        return claims
+
+    @staticmethod
+    def stats():
+        ttl = GoogleCertService._expires_at - time.monotonic()
+        return dict(GoogleCertService.counters, keys=len(GoogleCertService._certs), ttl_seconds=max(int(ttl), 0))
@@ -0,0 +1,123 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models.idempotency import IdempotencyRecord
+from app.extensions import db
+
+
+class IdempotencyService:
+    """
+    Backs the Idempotency-Key header: the first request with a key runs normally and its
+    response is stored; retries with the same key get that response replayed instead of
+    claiming or verifying a second time. Records expire after IDEMPOTENCY_KEY_TTL_HOURS.
+
+    An attempt in flight holds a lease (started_at). If its process dies before complete()
+    or abandon(), a retry takes the key over once the lease is older than
+    IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS instead of getting 409 until the record expires.
+    """
+
+    _last_prune = None
+
+    @staticmethod
+    def _cutoff():
+        return datetime.utcnow() - timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+    @staticmethod
+    def fingerprint(body):
+        return hashlib.sha256(body or b'').hexdigest()
+
+    @staticmethod
+    def begin(scope, key, request_hash):
+        """
+        Reserves (scope, key) for this request.
+        Returns ('proceed', None) for a fresh key, ('replay', record) for a finished one,
+        ('in_progress', None) while another attempt is still running and
+        ('mismatch', None) when the key was already used with a different request body.
+        """
+        IdempotencyService.prune_if_due()
+
+        record = IdempotencyRecord.query.filter_by(scope=scope, key=key).first()
+        if record and record.created_at < IdempotencyService._cutoff():
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+
+        if record is None:
+            try:
+                db.session.add(IdempotencyRecord(scope=scope, key=key, request_hash=request_hash))
+                db.session.commit()
+                return 'proceed', None
+            except IntegrityError:
+                # Lost the race to a concurrent retry with the same key
+                db.session.rollback()
+                record = IdempotencyRecord.query.filter_by(scope=scope, key=key).first()
+                if record is None:
+                    return 'in_progress', None
+
+        if record.request_hash != request_hash:
+            return 'mismatch', None
+        if record.status_code is None:
+            return ('proceed', None) if IdempotencyService._take_over(record) else ('in_progress', None)
+        return 'replay', record
+
+    @staticmethod
+    def _take_over(record):
+        """Re-leases an in-flight record whose attempt outlived the in-flight timeout (crashed worker)."""
+        timeout = current_app.config.get('IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS', 30)
+        now = datetime.utcnow()
+        if record.started_at is not None and record.started_at > now - timedelta(seconds=timeout):
+            return False
+        # Compare-and-set on the old lease, so only one of several concurrent retries wins
+        taken = IdempotencyRecord.query\
+            .filter_by(id=record.id, status_code=None, started_at=record.started_at)\
+            .update({'started_at': now}, synchronize_session=False)
+        db.session.commit()
+        return taken == 1
+
+    @staticmethod
+    def complete(scope, key, status_code, body):
+        """Stores the final response so later retries can replay it."""
+        try:
+            IdempotencyRecord.query.filter_by(scope=scope, key=key)\
+                .update({'status_code': status_code, 'response_body': body}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Could not store idempotent response for {scope}:{key}: {e}")
+
+    @staticmethod
+    def abandon(scope, key):
+        """Releases the key after a server error so the client's retry runs for real."""
+        try:
+            IdempotencyRecord.query.filter_by(scope=scope, key=key, status_code=None)\
+                .delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Could not release idempotency key {scope}:{key}: {e}")
+
+    @staticmethod
+    def prune(older_than=None):
+        """Deletes expired records in one statement. Returns the number of rows removed."""
+        cutoff = older_than or IdempotencyService._cutoff()
+        deleted = IdempotencyRecord.query.filter(IdempotencyRecord.created_at < cutoff)\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    @staticmethod
+    def prune_if_due():
+        """Time-throttled pruning so the table stays compact without a cron job."""
+        interval = current_app.config.get('IDEMPOTENCY_PRUNE_INTERVAL_SECONDS', 600)
+        now = time.monotonic()
+        last = IdempotencyService._last_prune
+        if last is not None and now - last < interval:
+            return
+        IdempotencyService._last_prune = now
+        try:
+            IdempotencyService.prune()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Idempotency key pruning failed: {e}")
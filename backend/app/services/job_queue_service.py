@@ -0,0 +1,266 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from app.models.job import BackgroundJob
+from app.extensions import db
+
+
+class JobQueueService:
+    """
+    Durable job queue backed by the background_jobs table.
+
+    enqueue() adds a row inside the caller's transaction, so a job exists exactly when the
+    data it refers to was committed. Worker threads (JOB_WORKERS per process) claim due jobs
+    with a conditional UPDATE, which is safe across threads, processes and hosts.
+
+    A handler does its DB work in db.session without committing; the queue commits that
+    work together with the 'done' mark. When a handler raises, its work is rolled back and
+    the job is retried with exponential backoff until max_attempts, then marked 'failed'.
+    Jobs whose worker died mid-run are re-queued once their lease (JOB_LEASE_SECONDS) expires.
+
+    A handler with side effects outside the DB (FCM pushes) calls checkpoint(progress) after
+    each step: that commits its work so far together with the progress, and a retry reads
+    it back through progress() to resume instead of repeating the completed steps. A large
+    work list is passed once as checkpoint(progress, plan=...) and read back through plan(),
+    so the per-step checkpoints only rewrite the small progress counters.
+    """
+
+    _handlers = {}
+    _current = threading.local()
+    _workers = []
+    _retry_base_seconds = 10
+    _retry_max_seconds = 900
+    _lease_seconds = 600
+    _retention_days = 7
+    _maintained_at = None
+    counters = {'processed': 0, 'failed': 0, 'retried': 0, 'reclaimed': 0}
+
+    @staticmethod
+    def init_app(app):
+        JobQueueService._retry_base_seconds = app.config.get('JOB_RETRY_BASE_SECONDS', 10)
+        JobQueueService._retry_max_seconds = app.config.get('JOB_RETRY_MAX_SECONDS', 900)
+        JobQueueService._lease_seconds = app.config.get('JOB_LEASE_SECONDS', 600)
+        JobQueueService._retention_days = app.config.get('JOB_RETENTION_DAYS', 7)
+
+        count = app.config.get('JOB_WORKERS', 2)
+        poll = app.config.get('JOB_POLL_SECONDS', 1)
+        while len(JobQueueService._workers) < count:
+            worker = threading.Thread(
+                target=JobQueueService._work_forever, args=(app, poll), daemon=True,
+                name=f'job-worker-{len(JobQueueService._workers) + 1}'
+            )
+            JobQueueService._workers.append(worker)
+            worker.start()
+
+    @staticmethod
+    def register(kind, handler):
+        """Registers the callable that processes jobs of `kind`; it receives the decoded payload."""
+        JobQueueService._handlers[kind] = handler
+
+    # --- PRODUCER ---
+    @staticmethod
+    def enqueue(kind, payload, dedup_key=None, max_attempts=5, delay_seconds=0):
+        """
+        Adds a job to the caller's transaction (flushed, not committed).
+        Returns the job, or None when a job with the same dedup_key already exists.
+        """
+        if dedup_key and db.session.query(BackgroundJob.id).filter_by(dedup_key=dedup_key).first():
+            return None
+
+        job = BackgroundJob(
+            kind=kind,
+            dedup_key=dedup_key,
+            payload=json.dumps(payload),
+            max_attempts=max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay_seconds)
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(job)
+        except IntegrityError:
+            # A concurrent producer enqueued the same dedup_key first
+            return None
+        return job
+
+    # --- CONSUMER ---
+    @staticmethod
+    def _worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    @staticmethod
+    def _claim(now):
+        """Atomically moves the next due job to 'running'. Returns its id or None."""
+        for _ in range(5):
+            job_id = db.session.query(BackgroundJob.id)\
+                .filter(BackgroundJob.status == 'queued', BackgroundJob.run_at <= now)\
+                .order_by(BackgroundJob.run_at, BackgroundJob.id)\
+                .limit(1)\
+                .scalar()
+            if job_id is None:
+                db.session.rollback()
+                return None
+            claimed = db.session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.status == 'queued')
+                .values(status='running', attempts=BackgroundJob.attempts + 1,
+                        locked_at=now, locked_by=JobQueueService._worker_id())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None  # heavy contention; the next poll will try again
+
+    @staticmethod
+    def run_one(now=None):
+        """Claims and processes one due job. Returns False when nothing was due."""
+        now = now or datetime.utcnow()
+        job_id = JobQueueService._claim(now)
+        if job_id is None:
+            return False
+
+        job = db.session.get(BackgroundJob, job_id)
+        kind, payload, attempts, max_attempts = job.kind, job.payload, job.attempts, job.max_attempts
+        JobQueueService._current.job_id = job_id
+        JobQueueService._current.progress = json.loads(job.progress) if job.progress else None
+        JobQueueService._current.plan = json.loads(job.plan) if job.plan else None
+        try:
+            handler = JobQueueService._handlers.get(kind)
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'.")
+            handler(json.loads(payload))
+            job.status, job.finished_at, job.last_error = 'done', datetime.utcnow(), None
+            db.session.commit()
+            JobQueueService.counters['processed'] += 1
+        except Exception as e:
+            db.session.rollback()
+            JobQueueService._record_failure(job_id, attempts, max_attempts, e, now)
+        finally:
+            JobQueueService._current.job_id = JobQueueService._current.progress = JobQueueService._current.plan = None
+        return True
+
+    @staticmethod
+    def progress():
+        """The last checkpoint of the job running on this thread, or None (first attempt / no job)."""
+        return getattr(JobQueueService._current, 'progress', None)
+
+    @staticmethod
+    def plan():
+        """The work list stored by checkpoint(..., plan=...) for the job on this thread, or None."""
+        return getattr(JobQueueService._current, 'plan', None)
+
+    @staticmethod
+    def checkpoint(progress, plan=None):
+        """
+        Commits the running handler's work so far together with `progress` (JSON-serializable)
+        and renews the job's lease. A retry resumes from here. `plan` (also JSON) is written
+        only when given, so pass it once and keep later checkpoints small. Outside a job this
+        is a no-op, so handlers can also be called synchronously under the caller's transaction.
+        """
+        job_id = getattr(JobQueueService._current, 'job_id', None)
+        if job_id is None:
+            return
+        values = {'progress': json.dumps(progress), 'locked_at': datetime.utcnow()}
+        if plan is not None:
+            values['plan'] = json.dumps(plan)
+        db.session.execute(
+            update(BackgroundJob).where(BackgroundJob.id == job_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        JobQueueService._current.progress = progress
+        if plan is not None:
+            JobQueueService._current.plan = plan
+
+    @staticmethod
+    def _record_failure(job_id, attempts, max_attempts, error, now):
+        values = {'last_error': f"{type(error).__name__}: {error}"[:2000], 'locked_at': None, 'locked_by': None}
+        if attempts >= max_attempts:
+            values.update(status='failed', finished_at=datetime.utcnow())
+            JobQueueService.counters['failed'] += 1
+            print(f"❌ Job {job_id} failed permanently after {attempts} attempt(s): {error}")
+        else:
+            backoff = min(JobQueueService._retry_base_seconds * 2 ** (attempts - 1), JobQueueService._retry_max_seconds)
+            backoff *= random.uniform(0.8, 1.2)  # jitter, so a burst of failures doesn't retry in lockstep
+            values.update(status='queued', run_at=now + timedelta(seconds=backoff))
+            JobQueueService.counters['retried'] += 1
+            print(f"⚠️ Job {job_id} attempt {attempts} failed, retrying in {backoff:.0f}s: {error}")
+
+        db.session.execute(
+            update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    @staticmethod
+    def run_pending(now=None, limit=1000):
+        """Drains every due job synchronously (CLI / tests). Returns how many ran."""
+        ran = 0
+        while ran < limit and JobQueueService.run_one(now):
+            ran += 1
+        return ran
+
+    # --- MAINTENANCE & METRICS ---
+    @staticmethod
+    def maintain(now=None):
+        """Re-queues jobs whose worker died mid-run and prunes old finished jobs."""
+        now = now or datetime.utcnow()
+        reclaimed = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.status == 'running',
+                   BackgroundJob.locked_at < now - timedelta(seconds=JobQueueService._lease_seconds))
+            .values(status='queued', run_at=now, locked_at=None, locked_by=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        BackgroundJob.query.filter(
+            BackgroundJob.status.in_(['done', 'failed']),
+            BackgroundJob.finished_at < now - timedelta(days=JobQueueService._retention_days)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        JobQueueService.counters['reclaimed'] += reclaimed
+        return reclaimed
+
+    @staticmethod
+    def stats():
+        """Queue depth by status, how overdue the oldest due job is, and this process's counters."""
+        now = datetime.utcnow()
+        depth = dict(db.session.query(BackgroundJob.status, func.count(BackgroundJob.id))
+                     .group_by(BackgroundJob.status).all())
+        oldest_due = db.session.query(func.min(BackgroundJob.run_at))\
+            .filter(BackgroundJob.status == 'queued', BackgroundJob.run_at <= now).scalar()
+        retrying = db.session.query(func.count(BackgroundJob.id))\
+            .filter(BackgroundJob.status == 'queued', BackgroundJob.attempts > 0).scalar()
+        return {
+            'depth': {status: depth.get(status, 0) for status in ('queued', 'running', 'done', 'failed')},
+            'retrying': retrying,
+            'oldest_due_seconds': round((now - oldest_due).total_seconds(), 1) if oldest_due else 0,
+            'workers': len(JobQueueService._workers),
+            'counters': dict(JobQueueService.counters)
+        }
+
+    @staticmethod
+    def _work_forever(app, poll_seconds):
+        while True:
+            with app.app_context():
+                try:
+                    now = time.monotonic()
+                    last = JobQueueService._maintained_at
+                    if last is None or now - last >= 60:
+                        JobQueueService._maintained_at = now
+                        JobQueueService.maintain()
+                    busy = JobQueueService.run_one()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Job worker error: {e}")
+                    busy = False
+                finally:
+                    db.session.remove()
+            if not busy:
+                time.sleep(poll_seconds)
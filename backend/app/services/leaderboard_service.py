@@ -0,0 +1,190 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.models import RestaurantProfile, Leaderboard, GamificationLedger
+from app.extensions import db
+from app.utils.ranking import RankIndex
+
+WINDOWS = ('daily', 'weekly', 'all')
+
+
+def _window_start(window, now):
+    """UTC start of the calendar window containing `now` (None for all-time)."""
+    if window == 'daily':
+        return datetime(now.year, now.month, now.day)
+    if window == 'weekly':
+        return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+    return None
+
+
+class LeaderboardService:
+    """
+    In-memory restaurant leaderboard with daily, weekly and all-time windows.
+
+    Each window is a RankIndex (points) plus a meals counter. Verifications feed it
+    incrementally after their commit, so home-screen reads (top-k, rank of a restaurant)
+    never touch the DB. Daily/weekly windows reset when the UTC day/ISO week rolls over.
+    The whole thing is rebuilt from the DB on startup and by a background thread every
+    LEADERBOARD_REFRESH_SECONDS (off the lock, then swapped in), which also picks up awards
+    made by other worker processes. Reads never rebuild, except once if the startup build failed.
+    """
+
+    _indexes = {}
+    _meals = {}
+    _periods = {}
+    _names = {}
+    _built_at = None
+    _lock = threading.RLock()
+    _refresher = None
+
+    @staticmethod
+    def init_app(app):
+        try:
+            LeaderboardService.rebuild()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Leaderboard rebuild failed, will retry on first read: {e}")
+
+        interval = app.config.get('LEADERBOARD_REFRESH_SECONDS', 60)
+        if interval > 0 and LeaderboardService._refresher is None:
+            LeaderboardService._refresher = threading.Thread(
+                target=LeaderboardService._refresh_forever, args=(app, interval), daemon=True, name='leaderboard-refresher'
+            )
+            LeaderboardService._refresher.start()
+
+    # --- BUILD ---
+    @staticmethod
+    def _fresh_window(window, now):
+        LeaderboardService._indexes[window] = RankIndex(bucket_width=10)
+        LeaderboardService._meals[window] = {}
+        LeaderboardService._periods[window] = _window_start(window, now)
+
+    @staticmethod
+    def _refresh_forever(app, interval):
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    LeaderboardService.rebuild()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Leaderboard refresh error: {e}")
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def rebuild(now=None):
+        """
+        Reloads every window from the DB: all-time from the leaderboard table plus ledger rows
+        the compactor has not folded yet, daily/weekly from the gamification ledger.
+        """
+        now = now or datetime.utcnow()
+        ledger_totals = db.session.query(
+            GamificationLedger.restaurant_id,
+            func.sum(GamificationLedger.points_delta),
+            func.sum(GamificationLedger.meals_delta)
+        ).filter(GamificationLedger.restaurant_id.isnot(None)).group_by(GamificationLedger.restaurant_id)
+
+        all_time = db.session.query(Leaderboard.restaurant_id, Leaderboard.points, Leaderboard.meals_shared).all()
+        all_time += ledger_totals.filter(GamificationLedger.folded_at.is_(None)).all()
+        windowed = {}
+        for window in ('daily', 'weekly'):
+            windowed[window] = ledger_totals.filter(GamificationLedger.created_at >= _window_start(window, now)).all()
+        names = dict(db.session.query(RestaurantProfile.id, RestaurantProfile.name).all())
+
+        # Built off the lock, so reads keep being served from the old indexes meanwhile
+        indexes = {window: RankIndex(bucket_width=10) for window in WINDOWS}
+        meals_by_window = {window: {} for window in WINDOWS}
+        for restaurant_id, pts, meals in all_time:
+            indexes['all'].add(restaurant_id, pts or 0)
+            meals_by_window['all'][restaurant_id] = meals_by_window['all'].get(restaurant_id, 0) + (meals or 0)
+        for window, rows in windowed.items():
+            for restaurant_id, pts, meals in rows:
+                indexes[window].set(restaurant_id, pts or 0)
+                meals_by_window[window][restaurant_id] = meals
+
+        with LeaderboardService._lock:
+            LeaderboardService._indexes = indexes
+            LeaderboardService._meals = meals_by_window
+            LeaderboardService._periods = {window: _window_start(window, now) for window in WINDOWS}
+            LeaderboardService._names = names
+            LeaderboardService._built_at = time.monotonic()
+
+    @staticmethod
+    def _ensure_fresh():
+        """O(1) on the read path: only rolls daily/weekly windows over (periodic rebuilds run in the background)."""
+        if LeaderboardService._built_at is None:
+            LeaderboardService.rebuild()
+            return
+        now = datetime.utcnow()
+        with LeaderboardService._lock:
+            for window in ('daily', 'weekly'):
+                if LeaderboardService._periods[window] != _window_start(window, now):
+                    LeaderboardService._fresh_window(window, now)
+
+    # --- INCREMENTAL UPDATES ---
+    @staticmethod
+    def record(restaurant_id, points, meals=1, name=None):
+        """Applies a committed award to every window. Safe to call before the first build."""
+        if LeaderboardService._built_at is None:
+            return
+        now = datetime.utcnow()
+        with LeaderboardService._lock:
+            for window in WINDOWS:
+                if LeaderboardService._periods[window] != _window_start(window, now):
+                    LeaderboardService._fresh_window(window, now)
+                LeaderboardService._indexes[window].add(restaurant_id, points)
+                meals_seen = LeaderboardService._meals[window]
+                meals_seen[restaurant_id] = meals_seen.get(restaurant_id, 0) + meals
+            if name:
+                LeaderboardService._names[restaurant_id] = name
+
+    # --- READS ---
+    @staticmethod
+    def _entry(window, restaurant_id, points, rank):
+        return {
+            'restaurant_id': restaurant_id,
+            'restaurant': LeaderboardService._names.get(restaurant_id) or 'Unnamed',
+            'points': points,
+            'meals': LeaderboardService._meals[window].get(restaurant_id, 0),
+            'rank': rank
+        }
+
+    @staticmethod
+    def _resolve_names(restaurant_ids):
+        missing = [rid for rid in restaurant_ids if rid not in LeaderboardService._names]
+        if missing:
+            LeaderboardService._names.update(
+                db.session.query(RestaurantProfile.id, RestaurantProfile.name)
+                .filter(RestaurantProfile.id.in_(missing)).all()
+            )
+
+    @staticmethod
+    def top(window='all', k=10):
+        """Best k restaurants of the window, highest points first."""
+        LeaderboardService._ensure_fresh()
+        with LeaderboardService._lock:
+            index = LeaderboardService._indexes[window]
+            leaders = index.top(k)
+            LeaderboardService._resolve_names([rid for rid, _ in leaders])
+            out, rank, previous = [], 0, None
+            for position, (restaurant_id, points) in enumerate(leaders, start=1):
+                if points != previous:
+                    rank, previous = position, points
+                out.append(LeaderboardService._entry(window, restaurant_id, points, rank))
+            return out
+
+    @staticmethod
+    def rank_of(restaurant_id, window='all'):
+        """The restaurant's standing in the window, or None if it has no points there yet."""
+        LeaderboardService._ensure_fresh()
+        with LeaderboardService._lock:
+            index = LeaderboardService._indexes[window]
+            rank = index.rank(restaurant_id)
+            if rank is None:
+                return None
+            LeaderboardService._resolve_names([restaurant_id])
+            entry = LeaderboardService._entry(window, restaurant_id, index.score(restaurant_id), rank)
+            entry['out_of'] = len(index)
+            return entry
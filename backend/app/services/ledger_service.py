@@ -0,0 +1,194 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import Integer, bindparam, case, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import User, Leaderboard, GamificationLedger
+from app.extensions import db
+
+
+class LedgerService:
+    """
+    Append-only gamification ledger.
+
+    Claim verification calls record() inside its own transaction, which only INSERTs.
+    compact() later folds pending rows into users.xp/level and leaderboard.points/meals_shared
+    with one aggregated UPDATE per table per batch, then stamps the rows' folded_at.
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so compactors in several workers never
+    fold the same delta twice. The ledger itself is never rewritten: it is the history.
+    """
+
+    _compactor = None
+    _upsert_ready = False
+
+    @staticmethod
+    def init_app(app):
+        interval = app.config.get('LEDGER_COMPACT_INTERVAL_SECONDS', 5)
+        if interval > 0 and LedgerService._compactor is None:
+            LedgerService._compactor = threading.Thread(
+                target=LedgerService._compact_forever, args=(app, interval), daemon=True, name='ledger-compactor'
+            )
+            LedgerService._compactor.start()
+
+    # --- WRITE PATH ---
+    @staticmethod
+    def record(entries):
+        """
+        Appends award rows in the caller's transaction (no commit).
+        entries: dicts with claim_id, user_id, restaurant_id, xp_delta, points_delta, meals_delta.
+        """
+        if entries:
+            db.session.execute(insert(GamificationLedger), entries)
+
+    @staticmethod
+    def pending_xp(user_id_column):
+        """Correlated scalar: XP awarded to the user that the compactor has not folded yet."""
+        return select(func.coalesce(func.sum(GamificationLedger.xp_delta), 0))\
+            .where(GamificationLedger.user_id == user_id_column, GamificationLedger.folded_at.is_(None))\
+            .scalar_subquery()
+
+    # --- COMPACTION ---
+    @staticmethod
+    def compact(batch_size=5000):
+        """
+        Folds up to batch_size pending rows into the running totals in one transaction.
+        Returns the number of ledger rows folded.
+        """
+        pending = db.session.query(
+            GamificationLedger.id, GamificationLedger.user_id, GamificationLedger.restaurant_id,
+            GamificationLedger.xp_delta, GamificationLedger.points_delta, GamificationLedger.meals_delta
+        ).filter(GamificationLedger.folded_at.is_(None))\
+         .order_by(GamificationLedger.id)\
+         .limit(batch_size)\
+         .with_for_update(skip_locked=True)\
+         .all()
+
+        if not pending:
+            db.session.rollback()
+            return 0
+
+        xp, rewards = {}, {}
+        for row in pending:
+            if row.user_id is not None and row.xp_delta:
+                xp[row.user_id] = xp.get(row.user_id, 0) + row.xp_delta
+            if row.restaurant_id is not None and (row.points_delta or row.meals_delta):
+                points, meals = rewards.get(row.restaurant_id, (0, 0))
+                rewards[row.restaurant_id] = (points + row.points_delta, meals + row.meals_delta)
+
+        try:
+            if xp:
+                LedgerService._fold_student_xp(xp)
+            if rewards:
+                LedgerService._fold_leaderboard(rewards)
+            db.session.execute(
+                update(GamificationLedger)
+                .where(GamificationLedger.id.in_([row.id for row in pending]))
+                .values(folded_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(pending)
+
+    @staticmethod
+    def compact_all(batch_size=5000):
+        """Runs compact() until nothing is pending. Returns the total rows folded."""
+        total = 0
+        while True:
+            folded = LedgerService.compact(batch_size)
+            total += folded
+            if folded < batch_size:
+                return total
+
+    @staticmethod
+    def _fold_student_xp(gains):
+        """gains: {user_id: xp}. Levels follow the 1-level-per-100-XP rule and never go down."""
+        table = User.__table__
+        new_xp = func.coalesce(table.c.xp, 0) + bindparam('gain', type_=Integer)
+        new_level = new_xp // 100 + 1
+        current_level = func.coalesce(table.c.level, 1)
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('uid')).values(
+                xp=new_xp,
+                level=case((new_level > current_level, new_level), else_=current_level)
+            ),
+            [{'uid': uid, 'gain': gain} for uid, gain in gains.items()]
+        )
+
+    @staticmethod
+    def _has_leaderboard_unique_index():
+        """
+        ON CONFLICT needs the unique index on leaderboard.restaurant_id, which db.create_all()
+        never adds to an existing table (`flask upgrade-schema` does). Once seen, it stays.
+        """
+        if not LedgerService._upsert_ready:
+            indexes = inspect(db.engine).get_indexes(Leaderboard.__tablename__)
+            LedgerService._upsert_ready = any(
+                index['unique'] and index['column_names'] == ['restaurant_id'] for index in indexes
+            )
+        return LedgerService._upsert_ready
+
+    @staticmethod
+    def _fold_leaderboard(rewards):
+        """
+        rewards: {restaurant_id: (points, meals)}. One INSERT ... ON CONFLICT (restaurant_id)
+        DO UPDATE, so compactors in two workers folding a first-time restaurant at the same
+        time add to one row instead of each inserting their own.
+        """
+        table = Leaderboard.__table__
+        if not LedgerService._has_leaderboard_unique_index():
+            print("⚠️ leaderboard.restaurant_id has no unique index yet, run `flask upgrade-schema`.")
+            LedgerService._fold_leaderboard_unindexed(rewards)
+            return
+
+        dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(table)
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.restaurant_id],
+                set_={
+                    'points': func.coalesce(table.c.points, 0) + stmt.excluded.points,
+                    'meals_shared': func.coalesce(table.c.meals_shared, 0) + stmt.excluded.meals_shared
+                }
+            ),
+            [{'restaurant_id': rid, 'points': p, 'meals_shared': m} for rid, (p, m) in rewards.items()]
+        )
+
+    @staticmethod
+    def _fold_leaderboard_unindexed(rewards):
+        """
+        Select-then-insert fold for databases that have not been upgraded yet. Deltas go to
+        the oldest row of a restaurant, the one `flask upgrade-schema` keeps when merging.
+        """
+        existing = dict(db.session.query(Leaderboard.restaurant_id, func.min(Leaderboard.id))
+                        .filter(Leaderboard.restaurant_id.in_(list(rewards)))
+                        .group_by(Leaderboard.restaurant_id))
+        table = Leaderboard.__table__
+
+        updates = [{'row_id': existing[rid], 'pts': p, 'meals': m} for rid, (p, m) in rewards.items() if rid in existing]
+        if updates:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('row_id')).values(
+                    points=func.coalesce(table.c.points, 0) + bindparam('pts', type_=Integer),
+                    meals_shared=func.coalesce(table.c.meals_shared, 0) + bindparam('meals', type_=Integer)
+                ),
+                updates
+            )
+        inserts = [{'restaurant_id': rid, 'points': p, 'meals_shared': m} for rid, (p, m) in rewards.items() if rid not in existing]
+        if inserts:
+            db.session.execute(insert(table), inserts)
+
+    @staticmethod
+    def _compact_forever(app, interval):
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    LedgerService.compact_all(app.config.get('LEDGER_COMPACT_BATCH_SIZE', 5000))
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Ledger compactor error: {e}")
+                finally:
+                    db.session.remove()
@@ -1,98 +1,518 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
-import os
+from firebase_admin import messaging
+from firebase_admin import exceptions as firebase_errors
+import base64
+import json
+import math
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from app.extensions import db
-from sqlalchemy import text
-
-# Initialize Firebase Admin SDK only once
-if not firebase_admin._apps:
-    basedir = os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-    cred_path = os.path.join(basedir, 'firebase-service-account.json')
-    
-    try:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        print("✅ Firebase Admin SDK initialized successfully.")
-    except Exception as e:
-        print(f"⚠️ Firebase initialization error: {e}")
+from app.services.job_queue_service import JobQueueService
+from app.services.push_transport import FirebaseTransport, RecordingTransport
+from app.utils.rate_limit import TokenBucketLimiter
+from sqlalchemy import String, and_, bindparam, case, cast, exists, false, func, insert, literal, or_, select, tuple_, update
+
+# FCM accepts at most 500 tokens per multicast request
+FCM_MULTICAST_LIMIT = 500
 
 class NotificationService:
 
+    # The push transport, chosen by PUSH_TRANSPORT in init_app(). Anything exposing Message,
+    # MulticastMessage, Notification, send and send_each_for_multicast works (see push_transport.py).
+    # Firebase itself is only initialized on the first send of each process.
+    messaging = None
+
+    # New-offer digests: offers inside this window merge into one inbox row per student
+    coalesce_minutes = 0
+    # Per-student push token bucket (None = unlimited). In-memory, so the cap holds per
+    # process; see NOTIFY_PUSH_BURST in config.py for sizing it across workers.
+    push_limiter = None
+
+    # Per-process delivery counters (exposed on the admin queue stats)
+    counters = {'delivered': 0, 'dead_tokens': 0, 'pruned_tokens': 0, 'transient_failures': 0, 'failures': 0}
+
+    @staticmethod
+    def init_app(app):
+        if app.config.get('PUSH_TRANSPORT', 'firebase') == 'memory':
+            NotificationService.messaging = RecordingTransport()
+        else:
+            NotificationService.messaging = FirebaseTransport(
+                app.config['FIREBASE_CREDENTIALS_PATH'],
+                http_timeout=app.config.get('FCM_HTTP_TIMEOUT_SECONDS', 10)
+            )
+        NotificationService.coalesce_minutes = app.config.get('NOTIFY_COALESCE_MINUTES', 10)
+        burst = app.config.get('NOTIFY_PUSH_BURST', 3)
+        per_hour = app.config.get('NOTIFY_PUSHES_PER_HOUR', 6)
+        NotificationService.push_limiter = TokenBucketLimiter(burst, per_hour / 3600.0) if burst > 0 else None
+
+    # --- FCM ERROR HANDLING ---
+    @staticmethod
+    def classify_fcm_error(error):
+        """
+        'dead' when the token can never receive again (app uninstalled, token from another
+        Firebase project, malformed token), 'transient' for FCM-side overload or outages
+        worth retrying, 'failed' for anything else (bad payload, auth, ...).
+        """
+        if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return 'dead'
+        if isinstance(error, firebase_errors.InvalidArgumentError) and 'registration token' in str(error).lower():
+            return 'dead'
+        if isinstance(error, (messaging.QuotaExceededError, firebase_errors.UnavailableError,
+                              firebase_errors.InternalError, firebase_errors.DeadlineExceededError)):
+            return 'transient'
+        return 'failed'
+
+    @staticmethod
+    def _count_failure(kind):
+        key = {'dead': 'dead_tokens', 'transient': 'transient_failures'}.get(kind, 'failures')
+        NotificationService.counters[key] += 1
+
+    @staticmethod
+    def prune_dead_tokens(tokens):
+        """
+        Clears the given device tokens from every user holding them, 500 per UPDATE.
+        Does not commit. Returns how many users lost a token.
+        """
+        from app.models.user import User
+
+        tokens = list(dict.fromkeys(tokens))
+        pruned = 0
+        for start in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+            pruned += db.session.execute(
+                update(User)
+                .where(User.fcm_token.in_(tokens[start:start + FCM_MULTICAST_LIMIT]))
+                .values(fcm_token=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        NotificationService.counters['pruned_tokens'] += pruned
+        if pruned:
+            print(f"🧹 Pruned {pruned} dead FCM token(s).")
+        return pruned
+
     @staticmethod
     def send_push_notification(fcm_token, title, body, data_payload=None):
+        """
+        Single-device push. Callers send after their own commit, so a dead token is
+        pruned and committed right here.
+        """
         if not fcm_token:
             return False
 
+        fcm = NotificationService.messaging
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
+            message = fcm.Message(
+                notification=fcm.Notification(
                     title=title,
                     body=body,
                 ),
                 data=data_payload if data_payload else {},
                 token=fcm_token,
             )
-            response = messaging.send(message)
+            response = fcm.send(message)
+            NotificationService.counters['delivered'] += 1
             return True
         except Exception as e:
-            print(f"Error sending FCM message: {e}")
+            kind = NotificationService.classify_fcm_error(e)
+            NotificationService._count_failure(kind)
+            print(f"Error sending FCM message ({kind}): {e}")
+            if kind == 'dead':
+                try:
+                    NotificationService.prune_dead_tokens([fcm_token])
+                    db.session.commit()
+                except Exception as prune_e:
+                    db.session.rollback()
+                    print(f"⚠️ Could not prune dead FCM token: {prune_e}")
             return False
 
     @staticmethod
-    def notify_students_new_offer(offer_data):
-        # We must import User here to avoid circular imports
+    def send_multicast(tokens, title, body, data_payload=None, raise_errors=False, dead_tokens=None):
+        """
+        Pushes one notification to many devices, FCM_MULTICAST_LIMIT tokens per request.
+        Returns the number of devices FCM accepted the message for. With raise_errors, a
+        failed request (network, auth, quota) propagates so a queued job can be retried.
+        Tokens FCM reports as dead are appended to `dead_tokens` for prune_dead_tokens().
+        """
+        fcm = NotificationService.messaging
+        delivered = 0
+        for start in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+            chunk = tokens[start:start + FCM_MULTICAST_LIMIT]
+            try:
+                response = fcm.send_each_for_multicast(fcm.MulticastMessage(
+                    tokens=chunk,
+                    notification=fcm.Notification(title=title, body=body),
+                    data=data_payload if data_payload else {},
+                ))
+                delivered += response.success_count
+                NotificationService.counters['delivered'] += response.success_count
+                if response.failure_count:
+                    # Per-token results are in request order
+                    for token, result in zip(chunk, response.responses):
+                        if result.success:
+                            continue
+                        kind = NotificationService.classify_fcm_error(result.exception)
+                        NotificationService._count_failure(kind)
+                        if kind == 'dead' and dead_tokens is not None:
+                            dead_tokens.append(token)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"Error sending FCM multicast ({len(chunk)} tokens): {e}")
+        return delivered
+
+    @staticmethod
+    def enqueue_new_offer_fanout(offer_id, offer_title, restaurant_name):
+        """
+        Queues the student fan-out for a new offer in the caller's transaction, so it is
+        committed together with the offer. Deduplicated per offer.
+        """
+        return JobQueueService.enqueue(
+            'offer_fanout',
+            {'offer_id': offer_id, 'title': offer_title, 'restaurant_name': restaurant_name},
+            dedup_key=f'offer_fanout:{offer_id}'
+        )
+
+    @staticmethod
+    def fanout_new_offer(offer_data):
+        """
+        Tells the students near the restaurant about a new offer. Students who already have
+        an unread new-offer row from the last NOTIFY_COALESCE_MINUTES get that row updated
+        into a digest (one UPDATE) and are pushed later by the window's digest job; everyone
+        else gets a fresh row (one INSERT ... SELECT) and an immediate push, sent as FCM
+        multicasts of up to 500 tokens and capped per student by the push token bucket.
+        No student rows are loaded as ORM objects. As a job, the rows are committed with the
+        push plan before the first push and each sent chunk is checkpointed, so a retry after
+        an FCM transport error resumes at the failed chunk (see _send_planned).
+        """
+        # We must import the models here to avoid circular imports
+        from app.models.user import User
+        from app.models.stats import Notification
+
+        resumed = JobQueueService.progress()
+        if resumed is not None:
+            return NotificationService._resume_planned(resumed)
+
+        # 1. Extract data safely from the payload
+        offer_title = offer_data.get('title', 'Delicious Meal')
+        restaurant_name = offer_data.get('restaurant_name') or "A Local Restaurant"
+        now = datetime.utcnow()
+
+        title = f"📣 New Offer from {restaurant_name}!"
+        body = f"Check out the new {offer_title} available now."
+
+        # 2. AUDIENCE: students within OFFER_NOTIFY_RADIUS_KM of the restaurant, plus every
+        #    student who never reported a location (older app versions), so nobody goes silent
+        from app.models.user import StudentLocation
+        audience = [User.role == 'student']
+        nearby = NotificationService._audience_near_offer(offer_data.get('offer_id'))
+        if nearby is not None:
+            audience.append(or_(User.id.in_(nearby), ~exists().where(StudentLocation.user_id == User.id)))
+
+        # 3. COALESCING: fold this offer into open digests instead of adding rows
+        merged = 0
+        window = NotificationService.coalesce_minutes
+        if window > 0:
+            open_digest = and_(
+                Notification.kind == 'new_offer',
+                Notification.is_read == false(),
+                Notification.created_at >= now - timedelta(minutes=window)
+            )
+            item_count = Notification.item_count + 1
+            merged = db.session.execute(
+                update(Notification)
+                .where(open_digest, Notification.user_id.in_(select(User.id).where(*audience)))
+                .values(
+                    item_count=item_count,
+                    title=literal('📣 ') + cast(item_count, String) + literal(' New Offers Near You!'),
+                    message=f"Latest: {offer_title} from {restaurant_name}."[:255],
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            audience.append(~exists().where(open_digest, Notification.user_id == User.id))
+            if merged:
+                NotificationService._schedule_digest(now, window)
+
+        # 4. PUSH TARGETS: students getting a fresh row (read before the insert below makes them "open")
+        recipients = db.session.execute(
+            select(User.id, User.fcm_token)
+            .where(*audience, User.fcm_token.isnot(None), User.fcm_token != '')
+        ).all()
+        NotificationService._bump_unread(audience)
+
+        # 5. IN-APP NOTIFICATIONS: a single set-based insert for the rest of the audience
+        created = db.session.execute(
+            insert(Notification).from_select(
+                ['user_id', 'title', 'message', 'is_read', 'created_at', 'kind', 'item_count', 'pushed_count', 'updated_at'],
+                select(User.id, literal(title), literal(body), false(), literal(now),
+                       literal('new_offer'), literal(1), literal(1), literal(now))
+                .where(*audience)
+            )
+        ).rowcount
+
+        # 6. PUSH NOTIFICATIONS (FIREBASE MULTICAST)
+        tokens = NotificationService._rate_limited_tokens(recipients)
+        chunks = NotificationService._plan_pushes([(tokens, title, body, {'type': 'new_offer'})])
+        success_count = NotificationService._start_planned(chunks)
+
+        print(f"✅ Saved {created} in-app notifications ({merged} merged into digests) "
+              f"and pushed to {success_count}/{len(tokens)} devices.")
+        return success_count
+
+    @staticmethod
+    def _plan_pushes(messages):
+        """Splits (tokens, title, body, data) messages into one FCM request per chunk."""
+        return [
+            {'tokens': tokens[start:start + FCM_MULTICAST_LIMIT], 'title': title, 'body': body, 'data': data}
+            for tokens, title, body, data in messages
+            for start in range(0, len(tokens), FCM_MULTICAST_LIMIT)
+        ]
+
+    @staticmethod
+    def _start_planned(chunks):
+        """Commits the handler's rows with the chunk list stored once as the job's plan, then sends."""
+        progress = {'sent': 0, 'delivered': 0}
+        JobQueueService.checkpoint(progress, plan=chunks)
+        return NotificationService._send_planned(chunks, progress)
+
+    @staticmethod
+    def _resume_planned(progress):
+        """Continues a retried job from its stored plan (jobs checkpointed before plans were split carry their chunks inline)."""
+        return NotificationService._send_planned(JobQueueService.plan() or progress.get('chunks', []), progress)
+
+    @staticmethod
+    def _send_planned(chunks, progress):
+        """
+        Sends the chunks from progress['sent'] on, checkpointing only the counters after each
+        one. A transport error propagates (the job is retried) and only the chunks after the
+        last checkpoint are sent again. Returns the devices reached by the whole plan.
+        """
+        while progress['sent'] < len(chunks):
+            chunk = chunks[progress['sent']]
+            dead_tokens = []
+            progress['delivered'] += NotificationService.send_multicast(
+                chunk['tokens'], chunk['title'], chunk['body'], chunk['data'], raise_errors=True, dead_tokens=dead_tokens
+            )
+            NotificationService.prune_dead_tokens(dead_tokens)
+            progress['sent'] += 1
+            JobQueueService.checkpoint(progress)
+        return progress['delivered']
+
+    # --- INBOX & UNREAD COUNTERS ---
+    @staticmethod
+    def _bump_unread(audience):
+        """
+        +1 unread for every user matching the `audience` filters, set-based: missing counter
+        rows are created first (seeded from any older unread rows) so one relative UPDATE
+        covers everyone. Does not commit.
+        """
         from app.models.user import User
-        
+        from app.models.stats import Notification, NotificationCounter
+
+        existing_unread = select(func.count(Notification.id))\
+            .where(Notification.user_id == User.id, Notification.is_read == false())\
+            .scalar_subquery()
+        db.session.execute(
+            insert(NotificationCounter).from_select(
+                ['user_id', 'unread'],
+                select(User.id, existing_unread)
+                .where(*audience, ~exists().where(NotificationCounter.user_id == User.id))
+            )
+        )
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id.in_(select(User.id).where(*audience)))
+            .values(unread=NotificationCounter.unread + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def unread_count(user_id):
+        """The badge number: one primary-key read of the maintained counter."""
+        from app.models.stats import Notification, NotificationCounter
+
+        unread = db.session.query(NotificationCounter.unread).filter_by(user_id=user_id).scalar()
+        if unread is not None:
+            return max(unread, 0)
+
+        # First read for a user who never had a counter (e.g. rows from before counters existed)
+        unread = Notification.query.filter_by(user_id=user_id, is_read=False).count()
         try:
-            # 1. Extract data safely from the payload
-            restaurant_id = offer_data.get('restaurant_id')
-            offer_title = offer_data.get('title', 'Delicious Meal')
-            
-            # Fetch restaurant name
-            restaurant = User.query.get(restaurant_id)
-            restaurant_name = restaurant.name if restaurant else "A Local Restaurant"
-            
-            # 2. Get all active students from the database
-            students = User.query.filter_by(role='student').all()
-            success_count = 0
-            
-            print(f"🚀 Found {len(students)} students. Sending notifications...")
-
-            for student in students:
-                title = f"📣 New Offer from {restaurant_name}!"
-                body = f"Check out the new {offer_title} available now."
-                
-                # --- A. PUSH NOTIFICATION (FIREBASE) ---
-                token = getattr(student, 'fcm_token', None)
-                if token:
-                    sent = NotificationService.send_push_notification(
-                        fcm_token=token,
-                        title=title,
-                        body=body,
-                        data_payload={'type': 'new_offer'}
-                    )
-                    if sent:
-                        success_count += 1
-                        
-                # --- B. IN-APP NOTIFICATION (SAVE TO DATABASE FOR PROFILE SCREEN) ---
-                # Using Raw SQL to ensure it works regardless of ORM schema complexities
-                try:
-                    # NOTE: Assuming you have a table named 'notifications'. 
-                    # If not, this will catch the error and continue without crashing.
-                    query = text("""
-                        INSERT INTO notifications (user_id, title, message, is_read, created_at) 
-                        VALUES (:uid, :title, :msg, false, CURRENT_TIMESTAMP)
-                    """)
-                    db.session.execute(query, {'uid': student.id, 'title': title, 'msg': body})
-                except Exception as db_err:
-                    print(f"⚠️ Note: Could not save in-app notification to DB (Table might not exist yet): {db_err}")
-            
-            # Commit all database insertions
+            with db.session.begin_nested():
+                db.session.add(NotificationCounter(user_id=user_id, unread=unread))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # created concurrently by a fan-out; its value wins
+        return unread
+
+    @staticmethod
+    def _encode_cursor(created_at, notification_id):
+        raw = json.dumps([created_at.isoformat(), notification_id], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, notification_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created_at), int(notification_id)
+        except Exception:
+            raise ValueError('Invalid cursor.')
+
+    @staticmethod
+    def get_inbox(user_id, limit=20, cursor=None, unread_only=False):
+        """
+        One page of a user's notifications, newest first: (items, next_cursor).
+        Keyset pagination on (created_at, id) walks ix_notifications_inbox, so page N
+        costs the same as page 1.
+        """
+        from app.models.stats import Notification
+
+        query = Notification.query.filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read == false())
+        if cursor:
+            created_at, notification_id = NotificationService._decode_cursor(cursor)
+            query = query.filter(tuple_(Notification.created_at, Notification.id) < tuple_(created_at, notification_id))
+
+        # Fetch one extra row to know whether another page exists
+        rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = NotificationService._encode_cursor(rows[-1].created_at, rows[-1].id)
+        return [n.to_dict() for n in rows], next_cursor
+
+    @staticmethod
+    def mark_read(user_id, notification_ids=None):
+        """
+        Marks the given notifications (or all of them) read in one UPDATE and moves the
+        counter by exactly the number of rows that flipped. Returns (marked, unread).
+        """
+        from app.models.stats import Notification, NotificationCounter
+
+        query = update(Notification).where(Notification.user_id == user_id, Notification.is_read == false())
+        if notification_ids is not None:
+            query = query.where(Notification.id.in_(notification_ids))
+        try:
+            marked = db.session.execute(
+                query.values(is_read=True).execution_options(synchronize_session=False)
+            ).rowcount
+            if marked:
+                db.session.execute(
+                    update(NotificationCounter)
+                    .where(NotificationCounter.user_id == user_id)
+                    .values(unread=case((NotificationCounter.unread > marked, NotificationCounter.unread - marked), else_=0))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return marked, NotificationService.unread_count(user_id)
+
+    @staticmethod
+    def push_stats():
+        limiter = NotificationService.push_limiter
+        return dict(NotificationService.counters, rate_limiter=limiter.stats() if limiter else None)
+
+    @staticmethod
+    def _rate_limited_tokens(recipients):
+        """De-duplicated device tokens of the (user_id, token) pairs the push token bucket lets through."""
+        limiter = NotificationService.push_limiter
+        if limiter is not None:
+            allowed = set(limiter.allow_many([user_id for user_id, _ in recipients]))
+            recipients = [(user_id, token) for user_id, token in recipients if user_id in allowed]
+        return list(dict.fromkeys(token for _, token in recipients))
+
+    @staticmethod
+    def _schedule_digest(now, window_minutes):
+        """One digest job per coalescing window, due when the window closes."""
+        window_seconds = window_minutes * 60
+        window_index = math.floor(now.timestamp() / window_seconds)
+        delay = (window_index + 1) * window_seconds - now.timestamp()
+        JobQueueService.enqueue('offer_digest', {}, dedup_key=f'offer_digest:{window_index}', delay_seconds=delay)
+
+    @staticmethod
+    def send_offer_digests(payload=None):
+        """
+        Job handler: pushes one summary per student whose new-offer row absorbed offers since
+        its last push ("3 more offers near you"). Students with the same count share a multicast.
+        Rows are marked as pushed and checkpointed with the push plan before sending, so a
+        retry only resumes the pushes (see _send_planned).
+        """
+        from app.models.user import User
+        from app.models.stats import Notification
+
+        resumed = JobQueueService.progress()
+        if resumed is not None:
+            return NotificationService._resume_planned(resumed)
+
+        pending = db.session.execute(
+            select(Notification.id, Notification.item_count, Notification.pushed_count, User.id, User.fcm_token)
+            .join(User, User.id == Notification.user_id)
+            .where(Notification.kind == 'new_offer',
+                   Notification.created_at >= datetime.utcnow() - timedelta(days=1),
+                   Notification.item_count > Notification.pushed_count,
+                   Notification.is_read == false())
+        ).all()
+        if not pending:
+            return 0
+
+        by_count = {}
+        for _, item_count, pushed_count, user_id, token in pending:
+            if token:
+                by_count.setdefault(item_count - pushed_count, []).append((user_id, token))
+
+        messages = []
+        for extra, recipients in sorted(by_count.items()):
+            noun = 'offer' if extra == 1 else 'offers'
+            messages.append((
+                NotificationService._rate_limited_tokens(recipients),
+                f"📣 {extra} more {noun} near you!", "Open the app to see what's still available.",
+                {'type': 'new_offer_digest', 'count': str(extra)}
+            ))
+
+        # Mark exactly what was summarized; offers merged meanwhile stay pending for the next digest
+        db.session.execute(
+            update(Notification.__table__)
+            .where(Notification.__table__.c.id == bindparam('nid'))
+            .values(pushed_count=bindparam('seen')),
+            [{'nid': nid, 'seen': item_count} for nid, item_count, _, _, _ in pending]
+        )
+        delivered = NotificationService._start_planned(NotificationService._plan_pushes(messages))
+        print(f"✅ Digest pushed to {delivered} devices for {len(pending)} coalesced notifications.")
+        return delivered
+
+    @staticmethod
+    def _audience_near_offer(offer_id):
+        """
+        SELECT of student ids within OFFER_NOTIFY_RADIUS_KM of the offer's restaurant, or
+        None to notify everyone (radius disabled, or the offer/location is unknown).
+        Students without a stored location are added back by the caller.
+        """
+        from app.models import Offer, RestaurantProfile
+        from app.services.spatial_service import SpatialService
+
+        radius_km = current_app.config.get('OFFER_NOTIFY_RADIUS_KM', 5)
+        if not radius_km or offer_id is None:
+            return None
+        origin = db.session.query(RestaurantProfile.lat, RestaurantProfile.lng)\
+            .join(Offer, Offer.restaurant_id == RestaurantProfile.id)\
+            .filter(Offer.id == offer_id).first()
+        if origin is None or origin.lat is None or origin.lng is None:
+            return None
+        return SpatialService.student_audience(origin.lat, origin.lng, radius_km)
+
+    @staticmethod
+    def notify_students_new_offer(offer_data):
+        """Synchronous fan-out (scripts and tooling). The API enqueues a job instead."""
+        try:
+            success_count = NotificationService.fanout_new_offer(offer_data)
             db.session.commit()
-            print(f"✅ Successfully sent push notifications to {success_count} students and updated DB.")
             return success_count
-            
         except Exception as e:
+            db.session.rollback()
             print(f"❌ Error in notify_students_new_offer: {str(e)}")
             return 0
 
@@ -108,4 +528,25 @@ class NotificationService:
                     body=f"Student {student_name} has successfully claimed an offer.",
                     data_payload={'type': 'claim_verified'}
                 )
-        return False
\ No newline at end of file
+        return False
+
+    @staticmethod
+    def notify_restaurant_claims_verified(restaurant_owner, count):
+        """Single summary push for a batch of verified scans."""
+        if count == 1:
+            return NotificationService.notify_restaurant_claim_verified(restaurant_owner, "A student")
+        if restaurant_owner:
+            token = getattr(restaurant_owner, 'fcm_token', None)
+
+            if token:
+                return NotificationService.send_push_notification(
+                    fcm_token=token,
+                    title="✅ Offers Claimed!",
+                    body=f"{count} students have successfully claimed their offers.",
+                    data_payload={'type': 'claim_verified', 'count': str(count)}
+                )
+        return False
+
+
+JobQueueService.register('offer_fanout', NotificationService.fanout_new_offer)
+JobQueueService.register('offer_digest', NotificationService.send_offer_digests)
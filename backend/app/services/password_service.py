@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordService:
+    """
+    Password hashing and verification, optionally in a process pool.
+
+    The caller still waits for the hash, so the pool frees nothing under sync gunicorn
+    workers (the Procfile default): each worker is busy until the hash is done either
+    way, and the pool only adds IPC. It pays off under threaded or gevent workers,
+    where scrypt on the request thread holds the GIL and stalls every other request in
+    that process. Hence PASSWORD_HASH_WORKERS defaults to 0 (inline), and is capped at
+    the core count because every server worker process forks its own pool.
+
+    The pool is forked from init_app(), before the app starts its background threads, so
+    workers never inherit a lock held by another thread; 'spawn' is not an option because
+    its children re-import the entry module, and run.py builds the whole app at import.
+    A process that did not run init_app() itself (e.g. a forked server worker) gets its
+    own pool on first use. A hash still queued after PASSWORD_HASH_TIMEOUT_SECONDS is
+    cancelled and computed inline; one a worker already started is waited for, so it is
+    never computed twice. A broken pool also falls back to hashing inline.
+
+    PASSWORD_HASH_METHOD / PASSWORD_SALT_LENGTH set the werkzeug hash parameters for new
+    hashes; needs_rehash() tells login to upgrade hashes created with older parameters.
+    """
+
+    method = 'scrypt'
+    salt_length = 16
+    timeout_seconds = 10
+    _workers = 0
+    _pool = None
+    _pool_pid = None
+    _prefix = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def init_app(app):
+        PasswordService.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        PasswordService.salt_length = app.config.get('PASSWORD_SALT_LENGTH', 16)
+        PasswordService.timeout_seconds = app.config.get('PASSWORD_HASH_TIMEOUT_SECONDS', 10)
+        PasswordService._workers = min(app.config.get('PASSWORD_HASH_WORKERS', 0), os.cpu_count() or 1)
+        PasswordService._prefix = None
+
+        pool = PasswordService._executor()
+        if pool is not None:
+            # The fork start method launches every worker on the first submit: do it now
+            pool.submit(int).result()
+
+    # --- POOL ---
+    @staticmethod
+    def _executor():
+        if PasswordService._workers <= 0:
+            return None
+        pid = os.getpid()
+        if PasswordService._pool is None or PasswordService._pool_pid != pid:
+            with PasswordService._lock:
+                if PasswordService._pool is None or PasswordService._pool_pid != pid:
+                    PasswordService._pool = ProcessPoolExecutor(
+                        max_workers=PasswordService._workers, mp_context=multiprocessing.get_context('fork')
+                    )
+                    PasswordService._pool_pid = pid
+        return PasswordService._pool
+
+    @staticmethod
+    def _run(fn, *args):
+        pool = PasswordService._executor()
+        if pool is None:
+            return fn(*args)
+        try:
+            future = pool.submit(fn, *args)
+            try:
+                return future.result(timeout=PasswordService.timeout_seconds)
+            except FutureTimeoutError:
+                if future.cancel():
+                    # Still queued behind a saturated pool: answer this call inline instead
+                    print(f"⚠️ Password hashing pool busy for {PasswordService.timeout_seconds}s, hashing inline.")
+                    return fn(*args)
+                # Already running in a worker: hashing inline as well would do the work twice
+                return future.result()
+        except BrokenProcessPool:
+            # A worker died (OOM killer, ...): start a fresh pool next time, answer this call inline
+            print("⚠️ Password hashing pool broke, recreating it.")
+            with PasswordService._lock:
+                PasswordService._pool = None
+            return fn(*args)
+
+    @staticmethod
+    def shutdown():
+        with PasswordService._lock:
+            if PasswordService._pool is not None:
+                PasswordService._pool.shutdown(wait=False, cancel_futures=True)
+            PasswordService._pool = None
+
+    # --- HASHING ---
+    @staticmethod
+    def hash_password(password):
+        return PasswordService._run(generate_password_hash, password, PasswordService.method, PasswordService.salt_length)
+
+    @staticmethod
+    def verify_password(password_hash, password):
+        if not password_hash or password is None:
+            return False
+        return PasswordService._run(check_password_hash, password_hash, password)
+
+    @staticmethod
+    def needs_rehash(password_hash):
+        """True when the hash was made with a different method/cost or salt length than configured."""
+        if not password_hash or '$' not in password_hash:
+            return True
+        if PasswordService._prefix is None:
+            # Resolve defaults ('scrypt' -> 'scrypt:32768:8:1') the same way werkzeug does
+            sample = generate_password_hash('', PasswordService.method, PasswordService.salt_length)
+            PasswordService._prefix = sample.split('$', 1)[0]
+        method, _, rest = password_hash.partition('$')
+        salt = rest.split('$', 1)[0]
+        return method != PasswordService._prefix or len(salt) != PasswordService.salt_length
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event, func, inspect
+from app.models import User, PrincipalInvalidation
+from app.extensions import db
+from app.utils.cache import LRUTTLCache
+
+# What role_required needs to authorize a request (attached to flask.g.user)
+Principal = namedtuple('Principal', 'id role verification_status')
+
+
+class PrincipalService:
+    """
+    Per-process LRU/TTL cache of authenticated principals, so a protected request costs a
+    JWT check instead of a users row load.
+
+    Changes made by other workers arrive through principal_invalidations: changing a user's
+    role or verification status (or deleting them) appends a row in the same transaction.
+    Every PRINCIPAL_INVALIDATION_POLL_SECONDS each process reads the rows past the last id
+    it has seen (one index range scan) and evicts those users. Ids are handed out at insert
+    but become visible at commit, so a lower id can show up after a higher one: ids skipped
+    by a poll are remembered as gaps and re-read until they appear, or until they are older
+    than the cache TTL (a rolled-back insert never appears, and by then any entry it could
+    have made stale has expired anyway). Changes made by this process are evicted
+    immediately on flush.
+    """
+
+    cache = None
+    _seen_id = None
+    _gaps = {}
+    _checked_at = None
+    _poll_seconds = 2
+    _gap_timeout = 60
+    _lock = threading.Lock()
+
+    @staticmethod
+    def init_app(app):
+        ttl = app.config.get('PRINCIPAL_CACHE_TTL_SECONDS', 60)
+        PrincipalService.cache = LRUTTLCache(
+            max_entries=app.config.get('PRINCIPAL_CACHE_MAX_ENTRIES', 50000), ttl_seconds=ttl
+        ) if ttl > 0 else None
+        PrincipalService._poll_seconds = app.config.get('PRINCIPAL_INVALIDATION_POLL_SECONDS', 2)
+        PrincipalService._gap_timeout = ttl
+        PrincipalService._seen_id = None
+        PrincipalService._gaps = {}
+        PrincipalService._checked_at = None
+
+    @staticmethod
+    def _load(user_id):
+        row = db.session.query(User.id, User.role, User.verification_status).filter(User.id == user_id).first()
+        return Principal(*row) if row else None
+
+    @staticmethod
+    def _poll_invalidations():
+        now = time.monotonic()
+        checked_at = PrincipalService._checked_at
+        if checked_at is not None and now - checked_at < PrincipalService._poll_seconds:
+            return
+        with PrincipalService._lock:
+            if PrincipalService._checked_at is not None and now - PrincipalService._checked_at < PrincipalService._poll_seconds:
+                return
+            PrincipalService._checked_at = now
+            seen, gaps = PrincipalService._seen_id, PrincipalService._gaps
+            if seen is None:
+                # Fresh process: nothing is cached yet, so only the current position matters
+                PrincipalService._seen_id = db.session.query(func.coalesce(func.max(PrincipalInvalidation.id), 0)).scalar()
+                return
+
+            floor = min(min(gaps), seen + 1) if gaps else seen + 1
+            rows = db.session.query(PrincipalInvalidation.id, PrincipalInvalidation.user_id) \
+                .filter(PrincipalInvalidation.id >= floor).order_by(PrincipalInvalidation.id).all()
+            for row_id, user_id in rows:
+                if row_id > seen or gaps.pop(row_id, None) is not None:
+                    PrincipalService.cache.delete(user_id)
+
+            if rows and rows[-1][0] > seen:
+                returned = {row_id for row_id, _ in rows}
+                for missing in range(seen + 1, rows[-1][0]):
+                    if missing not in returned:
+                        gaps[missing] = now
+                PrincipalService._seen_id = rows[-1][0]
+            for missing, noticed in list(gaps.items()):
+                if now - noticed > PrincipalService._gap_timeout:
+                    del gaps[missing]
+
+    @staticmethod
+    def get(user_id):
+        """The principal for a verified token's user id, or None if the user does not exist."""
+        cache = PrincipalService.cache
+        if cache is None or user_id is None:
+            return PrincipalService._load(user_id)
+
+        PrincipalService._poll_invalidations()
+        principal = cache.get(user_id)
+        if principal is None:
+            principal = PrincipalService._load(user_id)
+            if principal is not None:
+                cache.set(user_id, principal)
+        return principal
+
+    @staticmethod
+    def evict(user_id):
+        if PrincipalService.cache is not None:
+            PrincipalService.cache.delete(user_id)
+
+    @staticmethod
+    def stats():
+        cache = PrincipalService.cache
+        if cache is None:
+            return {'enabled': False}
+        return dict(cache.stats(), enabled=True, seen_invalidation=PrincipalService._seen_id, gaps=len(PrincipalService._gaps))
+
+
+@event.listens_for(User, 'after_update')
+def _evict_changed_principal(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.verification_status.history.has_changes():
+        PrincipalService.evict(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _evict_deleted_principal(mapper, connection, target):
+    PrincipalService.evict(target.id)
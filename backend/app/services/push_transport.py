@@ -0,0 +1,106 @@
+import itertools
+import os
+import threading
+import time
+from types import SimpleNamespace
+import firebase_admin
+from firebase_admin import credentials, messaging
+
+
+class FirebaseTransport:
+    """
+    Sends through firebase_admin.messaging, initializing the SDK on the first send of each
+    process instead of at import time.
+
+    The Firebase app is named after the PID, so a forked gunicorn worker never reuses an
+    app (and the HTTP session behind it) created in its parent. Within a process every
+    send reuses that one app, whose messaging client keeps a pooled keep-alive session
+    to fcm.googleapis.com.
+    """
+
+    Message = messaging.Message
+    MulticastMessage = messaging.MulticastMessage
+    Notification = messaging.Notification
+
+    def __init__(self, credentials_path, http_timeout=10):
+        self.credentials_path = credentials_path
+        self.http_timeout = http_timeout
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _firebase_app(self):
+        pid = os.getpid()
+        if self._app is not None and self._pid == pid:
+            return self._app
+        with self._lock:
+            if self._app is None or self._pid != pid:
+                name = f'foodshare-{pid}'
+                try:
+                    app = firebase_admin.get_app(name)
+                except ValueError:
+                    app = firebase_admin.initialize_app(
+                        credentials.Certificate(self.credentials_path), {'httpTimeout': self.http_timeout}, name=name
+                    )
+                    print(f"✅ Firebase Admin SDK initialized (pid {pid}).")
+                self._app, self._pid = app, pid
+        return self._app
+
+    def send(self, message):
+        return messaging.send(message, app=self._firebase_app())
+
+    def send_each_for_multicast(self, message):
+        return messaging.send_each_for_multicast(message, app=self._firebase_app())
+
+
+class RecordingTransport:
+    """
+    In-memory FCM stand-in for tests and offline load tests. Every request is recorded;
+    `latency_seconds` simulates the HTTP round trip and `failures` maps device tokens to
+    the exception FCM would report for them.
+    """
+
+    Message = messaging.Message
+    MulticastMessage = messaging.MulticastMessage
+    Notification = messaging.Notification
+
+    def __init__(self, latency_seconds=0.0, failures=None):
+        self.latency_seconds = latency_seconds
+        self.failures = dict(failures or {})
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sent = []
+            self.multicasts = []
+            self.requests = 0
+
+    def _round_trip(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def send(self, message):
+        self._round_trip()
+        if message.token in self.failures:
+            raise self.failures[message.token]
+        with self._lock:
+            self.sent.append(message)
+        return f'projects/memory/messages/{next(self._ids)}'
+
+    def send_each_for_multicast(self, message):
+        self._round_trip()
+        responses = []
+        for token in message.tokens:
+            error = self.failures.get(token)
+            responses.append(SimpleNamespace(
+                success=error is None, exception=error,
+                message_id=None if error else f'projects/memory/messages/{next(self._ids)}'
+            ))
+        with self._lock:
+            self.multicasts.append(message)
+        delivered = sum(r.success for r in responses)
+        return SimpleNamespace(success_count=delivered, failure_count=len(responses) - delivered, responses=responses)
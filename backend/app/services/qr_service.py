@@ -1,9 +1,22 @@
+import time
 import uuid
 from datetime import datetime
-from app.models import User, RestaurantProfile, Offer, Claim, Leaderboard
+from flask import current_app
+from sqlalchemy import case, insert, literal, or_, select, update
+from sqlalchemy.orm import aliased
+from app.models import User, RestaurantProfile, Offer, Claim
 from app.extensions import db
 # IMPORT NEW SERVICE
 from app.services.notification_service import NotificationService
+from app.services.spatial_service import SpatialService
+from app.services.reservation_service import ReservationService
+from app.services.claim_expiry_service import ClaimExpiryService
+from app.services.leaderboard_service import LeaderboardService
+from app.services.student_rank_service import StudentRankService
+from app.services.ledger_service import LedgerService
+from app.utils.signed_qr import (
+    ExpiredQRCode, InvalidQRCode, is_signed_code, read_claim_code, restaurant_key, sign_claim_code
+)
 
 class QRService:
 
@@ -37,14 +50,13 @@ class QRService:
             )
             
             db.session.add(new_offer)
+            db.session.flush()
+
+            # FAN-OUT: queued in the same transaction as the offer, delivered by the job workers
+            NotificationService.enqueue_new_offer_fanout(new_offer.id, new_offer.title, restaurant.name)
+
             db.session.commit()
-            
-            # FIXED: Passed only the required 'data' dictionary to the notification service
-            # Ensure the restaurant name is included in the data dictionary
-            data['restaurant_name'] = restaurant.name 
-            
-            # TRIGGER FCM: Notify all students about the new offer
-            NotificationService.notify_students_new_offer(data)
+            SpatialService.sync_offer(new_offer)
             
             return {
                 'success': True,
@@ -59,33 +71,107 @@ class QRService:
     @staticmethod
     def claim_offer(user_id, offer_id):
         """Handles the reservation of an offer by a student and generates a tracking QR code."""
-        offer = Offer.query.get(offer_id)
-        
-        if not offer:
-            return {'success': False, 'message': 'Offer not found.', 'status': 404}
-            
-        # CRITICAL INVENTORY CHECK
-        if offer.quantity < 1 or offer.status != 'active':
-            return {'success': False, 'message': 'Sorry, this item is sold out.', 'status': 400}
+        if ReservationService.enabled:
+            return QRService._claim_from_reservation(user_id, offer_id)
 
         try:
-            offer.quantity -= 1
-            
-            if offer.quantity == 0:
-                offer.status = 'sold_out'
+            # CRITICAL INVENTORY CHECK (ATOMIC)
+            # The stock check lives in the WHERE clause of a single conditional UPDATE, so two
+            # workers can never both take the last meal and no row lock is held across Python code.
+            # The sold-out transition is folded into the same statement (SET sees pre-update values).
+            reserve = update(Offer)\
+                .where(Offer.id == offer_id, Offer.quantity > 0, Offer.status == 'active')\
+                .values(
+                    quantity=Offer.quantity - 1,
+                    status=case((Offer.quantity == 1, 'sold_out'), else_=Offer.status)
+                )\
+                .returning(Offer.quantity, Offer.description, Offer.restaurant_id, Offer.pickup_start, Offer.pickup_end)\
+                .execution_options(synchronize_session=False)
+            reserved = db.session.execute(reserve).first()
 
-            unique_code = f"OFF-{offer.id}-USR-{user_id}-{uuid.uuid4().hex[:6].upper()}"
+            if reserved is None:
+                db.session.rollback()
+                if not db.session.get(Offer, offer_id):
+                    return {'success': False, 'message': 'Offer not found.', 'status': 404}
+                return {'success': False, 'message': 'Sorry, this item is sold out.', 'status': 400}
+
+            unique_code = f"OFF-{offer_id}-USR-{user_id}-{uuid.uuid4().hex[:6].upper()}"
             
             claim = Claim(
                 user_id=user_id,
-                offer_id=offer.id,
+                offer_id=offer_id,
                 qr_code=unique_code,
                 status='pending'
             )
             
             db.session.add(claim)
+            if current_app.config.get('SIGNED_QR_CODES'):
+                # The signed payload embeds the claim id, so the row is flushed first
+                db.session.flush()
+                claim.qr_code = unique_code = QRService._signed_code(claim.id, user_id, offer_id, reserved, claim.created_at)
             db.session.commit()
+            SpatialService.sync_offer(db.session.get(Offer, offer_id))
             
+            return {
+                'success': True,
+                'message': 'Meal reserved! Your QR Code has been generated.',
+                'qr_code': unique_code,
+                'offer_desc': reserved.description,
+                'status': 201
+            }
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'message': f'Processing error: {str(e)}', 'status': 500}
+
+    @staticmethod
+    def _claim_from_reservation(user_id, offer_id):
+        """
+        Flash-drop claim path: the meal comes from this worker's in-memory lease, so the hot
+        offers row is only written once per leased batch instead of once per claim. The claim
+        commits together with the decrement of the lease's durable row (ReservationService.consume).
+        """
+        taken, offer, lease_id = ReservationService.acquire(offer_id)
+
+        if not taken:
+            if not db.session.get(Offer, offer_id):
+                return {'success': False, 'message': 'Offer not found.', 'status': 404}
+            return {'success': False, 'message': 'Sorry, this item is sold out.', 'status': 400}
+
+        unique_code = f"OFF-{offer_id}-USR-{user_id}-{uuid.uuid4().hex[:6].upper()}"
+        created_at = datetime.utcnow()
+
+        try:
+            # Guarded insert: only reads the offer row, so a lease held for an offer that was
+            # cancelled in another worker cannot produce a claim.
+            source = select(
+                literal(user_id), Offer.id, literal(unique_code), literal('pending'), literal(created_at)
+            ).where(Offer.id == offer_id, Offer.status.in_(['active', 'sold_out']))
+            inserted = db.session.execute(
+                insert(Claim)
+                .from_select(['user_id', 'offer_id', 'qr_code', 'status', 'created_at'], source)
+                .returning(Claim.id)
+            ).first()
+
+            if inserted is None:
+                db.session.rollback()
+                ReservationService.discard(offer_id)
+                return {'success': False, 'message': 'Sorry, this offer is no longer available.', 'status': 400}
+
+            if not ReservationService.consume(lease_id):
+                # The lease was returned to the offer meanwhile: drop it and lease afresh
+                db.session.rollback()
+                ReservationService.discard(offer_id)
+                return QRService._claim_from_reservation(user_id, offer_id)
+
+            if current_app.config.get('SIGNED_QR_CODES'):
+                unique_code = QRService._signed_code(inserted.id, user_id, offer_id, offer, created_at)
+                db.session.execute(
+                    update(Claim).where(Claim.id == inserted.id).values(qr_code=unique_code)
+                    .execution_options(synchronize_session=False)
+                )
+
+            db.session.commit()
+
             return {
                 'success': True,
                 'message': 'Meal reserved! Your QR Code has been generated.',
@@ -95,80 +181,171 @@ class QRService:
             }
         except Exception as e:
             db.session.rollback()
+            ReservationService.release(offer_id, lease_id)
             return {'success': False, 'message': f'Processing error: {str(e)}', 'status': 500}
 
+    # --- SIGNED QR CODES ---
     @staticmethod
-    def verify_claim_qr(qr_code):
-        """Validates a scanned QR code, awards Restaurant Points, and triggers Student XP/Level logic."""
-        claim = Claim.query.filter_by(qr_code=qr_code).first()
-        
-        if not claim:
-            return {'success': False, 'message': 'Invalid QR Code. Claim not found.', 'status': 404}
-            
-        if claim.status == 'validated':
-            return {'success': False, 'message': 'This code has already been used!', 'status': 400}
-            
-        if claim.status in ['expired', 'rejected']:
-            return {'success': False, 'message': f'This code is {claim.status}.', 'status': 400}
+    def _signed_code(claim_id, user_id, offer_id, offer, created_at):
+        """
+        Signs a claim code for the offer's restaurant. The code expires when the stale claim
+        sweeper would expire the claim, so offline scanners and the server agree.
+        """
+        hold = ClaimExpiryService.hold_duration(
+            offer.pickup_start, offer.pickup_end,
+            current_app.config.get('CLAIM_HOLD_MINUTES', 120),
+            current_app.config.get('CLAIM_MIN_HOLD_MINUTES', 15)
+        )
+        expires_at = (created_at - datetime(1970, 1, 1) + hold).total_seconds()
+        return sign_claim_code(
+            current_app.config['QR_SIGNING_SECRET'], claim_id, offer_id, user_id, offer.restaurant_id, expires_at
+        )
+
+    @staticmethod
+    def scanner_key(restaurant_id):
+        """The per-restaurant HMAC key a scanner app needs to validate codes offline."""
+        return restaurant_key(current_app.config['QR_SIGNING_SECRET'], restaurant_id)
+
+    @staticmethod
+    def check_signed_code(qr_code, restaurant_id=None, now=None):
+        """
+        Stateless validation of a signed code: signature, expiry and (optionally) that it was
+        issued for restaurant_id. Touches no table. Returns the usual result dict.
+        """
+        try:
+            signed = read_claim_code(qr_code, secret=current_app.config['QR_SIGNING_SECRET'], now=now)
+        except ExpiredQRCode as e:
+            return {'success': False, 'message': str(e), 'status': 400}
+        except InvalidQRCode:
+            return {'success': False, 'message': 'Invalid QR Code. Signature check failed.', 'status': 400}
+
+        if restaurant_id is not None and signed.restaurant_id != restaurant_id:
+            return {'success': False, 'message': 'This code belongs to another restaurant.', 'status': 403}
+
+        return {'success': True, 'claim': signed._asdict(), 'status': 200}
+
+    @staticmethod
+    def _scan_time_rejection(scanned_at, created_at=None):
+        """
+        Bounds a client-supplied scan time (epoch seconds): not older than the offline sync
+        window and not before the claim was created (give or take scanner clock skew).
+        Returns a rejection dict, or None when the scan time is plausible.
+        """
+        if scanned_at is None:
+            return None
+        window = current_app.config.get('QR_OFFLINE_SYNC_WINDOW_MINUTES', 360) * 60
+        if scanned_at < time.time() - window:
+            return {'success': False, 'message': 'This offline scan is too old to be reconciled.', 'status': 400}
+        skew = current_app.config.get('QR_SCAN_CLOCK_SKEW_SECONDS', 300)
+        if created_at is not None and scanned_at < (created_at - datetime(1970, 1, 1)).total_seconds() - skew:
+            return {'success': False, 'message': 'Scan time is earlier than the claim.', 'status': 400}
+        return None
+
+    @staticmethod
+    def verify_claim_qr(qr_code, restaurant_id=None, scanned_at=None):
+        """
+        Validates a scanned QR code, awards Restaurant Points, and triggers Student XP/Level logic.
+        Signed codes are checked before any DB access; scanned_at (epoch seconds) is used when a
+        redemption validated offline is reconciled later.
+
+        The claim, offer, restaurant, owner, student and the student's not-yet-compacted XP are
+        loaded in a single joined statement. Only the claim row is locked (FOR UPDATE) so two
+        scanners can't redeem the same code: the awards are appended to the gamification
+        ledger, so users.xp and the leaderboard row are never written on this path.
+        """
+        rejection = QRService._scan_time_rejection(scanned_at)
+        if rejection:
+            return rejection
+        if is_signed_code(qr_code):
+            checked = QRService.check_signed_code(qr_code, restaurant_id=restaurant_id, now=scanned_at)
+            if not checked['success']:
+                return checked
+            match = (Claim.id == checked['claim']['claim_id'], Claim.qr_code == qr_code)
+        else:
+            match = (Claim.qr_code == qr_code,)
+
+        owner = aliased(User)
+        student = aliased(User)
+        row = db.session.query(Claim, Offer, RestaurantProfile, owner, student, LedgerService.pending_xp(student.id))\
+            .join(Offer, Offer.id == Claim.offer_id)\
+            .join(RestaurantProfile, RestaurantProfile.id == Offer.restaurant_id)\
+            .join(owner, owner.id == RestaurantProfile.owner_user_id)\
+            .join(student, student.id == Claim.user_id)\
+            .filter(*match)\
+            .with_for_update(of=Claim)\
+            .first()
+
+        rejection = None
+        if not row:
+            rejection = {'success': False, 'message': 'Invalid QR Code. Claim not found.', 'status': 404}
+        elif restaurant_id is not None and row.Offer.restaurant_id != restaurant_id:
+            rejection = {'success': False, 'message': 'This code belongs to another restaurant.', 'status': 403}
+        elif row.Claim.status == 'validated':
+            rejection = {'success': False, 'message': 'This code has already been used!', 'status': 400}
+        elif row.Claim.status in ['expired', 'rejected']:
+            rejection = {'success': False, 'message': f'This code is {row.Claim.status}.', 'status': 400}
+        else:
+            rejection = QRService._scan_time_rejection(scanned_at, row.Claim.created_at)
+        if rejection:
+            db.session.rollback()  # releases the row locks
+            return rejection
+
+        claim, offer, restaurant, owner, student, pending_xp = row
 
         try:
             claim.status = 'validated'
             
             if hasattr(claim, 'validated_at'):
                 claim.validated_at = datetime.utcnow()
-            
-            offer = Offer.query.get(claim.offer_id)
-            student = User.query.get(claim.user_id)
-            restaurant = None
-            
-            rest_points_added = 0
-            student_xp_added = 0
+
             level_up_occurred = False
             new_level = 1
-            lb = None
-            
-            if offer:
-                # --- 1. RESTAURANT GAMIFICATION (LEADERBOARD) ---
-                restaurant = RestaurantProfile.query.filter_by(owner_user_id=offer.restaurant.owner_user_id).first()
-                lb = Leaderboard.query.filter_by(restaurant_id=offer.restaurant_id).first()
-                
-                if not lb:
-                    lb = Leaderboard(restaurant_id=offer.restaurant_id, points=0, meals_shared=0)
-                    db.session.add(lb)
-                
-                rest_points_added = 20 if offer.type == 'free' else 10
-                lb.points = (lb.points or 0) + rest_points_added
-                lb.meals_shared = (lb.meals_shared or 0) + 1
-                
-                # --- 2. STUDENT GAMIFICATION (XP & LEVELING) ---
-                if student:
-                    # Dynamic XP calculation for both free and discount
-                    student_xp_added = 50 if offer.type == 'free' else 25
-                    
-                    # Failsafe math
-                    current_xp = student.xp if student.xp is not None else 0
-                    current_level = student.level if student.level is not None else 1
-                    
-                    student.xp = current_xp + student_xp_added
-                    
-                    # Leveling Logic: 1 Level for every 100 XP
-                    calculated_level = (student.xp // 100) + 1
-                    
-                    if calculated_level > current_level:
-                        student.level = calculated_level
-                        level_up_occurred = True
-                        new_level = calculated_level
+            
+            # --- 1. RESTAURANT GAMIFICATION (LEADERBOARD) ---
+            rest_points_added = 20 if offer.type == 'free' else 10
+            
+            # --- 2. STUDENT GAMIFICATION (XP & LEVELING) ---
+            # Dynamic XP calculation for both free and discount
+            student_xp_added = 50 if offer.type == 'free' else 25
+            
+            # Failsafe math. Deltas still waiting in the ledger count towards the current XP.
+            current_xp = (student.xp if student.xp is not None else 0) + pending_xp
+            current_level = max(student.level if student.level is not None else 1, current_xp // 100 + 1)
+            
+            new_xp = current_xp + student_xp_added
+            
+            # Leveling Logic: 1 Level for every 100 XP
+            calculated_level = (new_xp // 100) + 1
+            
+            if calculated_level > current_level:
+                level_up_occurred = True
+                new_level = calculated_level
 
+            # Both awards go to the append-only ledger; the compactor folds them into the totals
+            LedgerService.record([{
+                'claim_id': claim.id,
+                'user_id': student.id,
+                'restaurant_id': offer.restaurant_id,
+                'xp_delta': student_xp_added,
+                'points_delta': rest_points_added,
+                'meals_delta': 1
+            }])
+
+            # The owner is only read; detaching it keeps its fcm_token usable after the
+            # commit expires the session, so the notification needs no extra lookup.
+            student_name = student.name or "A student"
+            award = (offer.restaurant_id, rest_points_added, 1, restaurant.name)
+            xp_award = (student.id, new_xp, student.name, student.university, student.role)
+            db.session.expunge(owner)
             db.session.commit()
+            LeaderboardService.record(*award)
+            StudentRankService.set_xp(*xp_award)
             
             # --- 3. FCM NOTIFICATIONS ---
-            if restaurant:
-                owner = User.query.get(restaurant.owner_user_id)
-                student_name = student.name if student else "A student"
-                try:
-                    NotificationService.notify_restaurant_claim_verified(owner, student_name)
-                except Exception as notif_e:
-                    print(f"⚠️ Notification error, but verification succeeded: {notif_e}")
+            try:
+                NotificationService.notify_restaurant_claim_verified(owner, student_name)
+            except Exception as notif_e:
+                print(f"⚠️ Notification error, but verification succeeded: {notif_e}")
             
             msg = f'Success! Student earned +{student_xp_added} XP. Restaurant earned +{rest_points_added} Points.'
             if level_up_occurred:
@@ -182,4 +359,148 @@ class QRService:
             
         except Exception as e:
             db.session.rollback()
-            return {'success': False, 'message': f'Gamification error: {str(e)}', 'status': 500}
\ No newline at end of file
+            return {'success': False, 'message': f'Gamification error: {str(e)}', 'status': 500}
+
+    # --- BATCH VERIFICATION ---
+    @staticmethod
+    def verify_claims_batch(items, restaurant_id=None):
+        """
+        Redeems many scanned codes at once. items is a list of (qr_code, scanned_at) pairs;
+        scanned_at (epoch seconds or None) only matters for signed codes validated offline,
+        and must fall inside the offline sync window and after the claim's creation.
+
+        All codes are resolved with one joined query, redeemed with one conditional UPDATE
+        (so a code raced by another scanner is redeemed exactly once), and leaderboard points
+        and student XP are appended to the gamification ledger in one multi-row INSERT. One
+        commit, and one push per restaurant instead of one per scan. Returns per-code results
+        in input order.
+        """
+        results = [None] * len(items)
+        claim_ids, legacy_codes = {}, {}
+
+        # 1. Signed codes are checked without the DB; everything else is resolved by qr_code
+        for i, (qr_code, scanned_at) in enumerate(items):
+            rejection = QRService._scan_time_rejection(scanned_at)
+            if rejection:
+                results[i] = rejection
+            elif is_signed_code(qr_code):
+                checked = QRService.check_signed_code(qr_code, restaurant_id=restaurant_id, now=scanned_at)
+                if not checked['success']:
+                    results[i] = checked
+                    continue
+                claim_ids[i] = checked['claim']['claim_id']
+            elif isinstance(qr_code, str) and qr_code:
+                legacy_codes[i] = qr_code
+            else:
+                results[i] = {'success': False, 'message': 'Invalid QR Code. Claim not found.', 'status': 404}
+
+        rows = []
+        if claim_ids or legacy_codes:
+            rows = db.session.query(
+                Claim.id, Claim.qr_code, Claim.status, Claim.user_id, Claim.created_at,
+                Offer.type, Offer.restaurant_id, User.id.label('student_id'), User.xp, User.level,
+                LedgerService.pending_xp(User.id).label('pending_xp')
+            ).join(Offer, Offer.id == Claim.offer_id)\
+             .outerjoin(User, User.id == Claim.user_id)\
+             .filter(or_(Claim.id.in_(set(claim_ids.values())), Claim.qr_code.in_(set(legacy_codes.values()))))\
+             .all()
+        by_code = {row.qr_code: row for row in rows}
+
+        # 2. Per-code checks, in scan order so a duplicate inside the batch counts as reused
+        candidates = {}
+        for i, (qr_code, scanned_at) in enumerate(items):
+            if results[i] is not None:
+                continue
+            row = by_code.get(qr_code)
+            if row is None:
+                results[i] = {'success': False, 'message': 'Invalid QR Code. Claim not found.', 'status': 404}
+            elif restaurant_id is not None and row.restaurant_id != restaurant_id:
+                results[i] = {'success': False, 'message': 'This code belongs to another restaurant.', 'status': 403}
+            elif row.status == 'validated' or row.id in candidates.values():
+                results[i] = {'success': False, 'message': 'This code has already been used!', 'status': 400}
+            elif row.status in ['expired', 'rejected']:
+                results[i] = {'success': False, 'message': f'This code is {row.status}.', 'status': 400}
+            else:
+                results[i] = QRService._scan_time_rejection(scanned_at, row.created_at)
+                if results[i] is None:
+                    candidates[i] = row.id
+
+        try:
+            redeemed = set()
+            if candidates:
+                redeemed = set(db.session.execute(
+                    update(Claim)
+                    .where(Claim.id.in_(list(candidates.values())), Claim.status.notin_(['validated', 'expired', 'rejected']))
+                    .values(status='validated')
+                    .returning(Claim.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars())
+
+            # 3. Aggregate the rewards, and build the same messages the single-scan path returns
+            rest_rewards, xp_rewards, running, entries = {}, {}, {}, []
+            rows_by_id = {row.id: row for row in rows}
+            for i, claim_id in candidates.items():
+                if claim_id not in redeemed:
+                    results[i] = {'success': False, 'message': 'This code has already been used!', 'status': 400}
+                    continue
+                row = rows_by_id[claim_id]
+                rest_points_added = 20 if row.type == 'free' else 10
+                points, meals = rest_rewards.get(row.restaurant_id, (0, 0))
+                rest_rewards[row.restaurant_id] = (points + rest_points_added, meals + 1)
+
+                student_xp_added = 0
+                msg = f'Success! Student earned +0 XP. Restaurant earned +{rest_points_added} Points.'
+                if row.student_id is not None:
+                    student_xp_added = 50 if row.type == 'free' else 25
+                    xp_rewards[row.user_id] = xp_rewards.get(row.user_id, 0) + student_xp_added
+                    current_xp = (row.xp or 0) + (row.pending_xp or 0)
+                    xp, level = running.get(row.user_id, (current_xp, max(row.level or 1, current_xp // 100 + 1)))
+                    xp += student_xp_added
+                    msg = f'Success! Student earned +{student_xp_added} XP. Restaurant earned +{rest_points_added} Points.'
+                    if xp // 100 + 1 > level:
+                        level = xp // 100 + 1
+                        msg = f'Success! Student Leveled Up to {level}!'
+                    running[row.user_id] = (xp, level)
+                results[i] = {'success': True, 'message': msg, 'status': 200}
+                entries.append({
+                    'claim_id': claim_id,
+                    'user_id': row.student_id,
+                    'restaurant_id': row.restaurant_id,
+                    'xp_delta': student_xp_added,
+                    'points_delta': rest_points_added,
+                    'meals_delta': 1
+                })
+
+            LedgerService.record(entries)
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'message': f'Gamification error: {str(e)}', 'status': 500}
+
+        for rid, (points, meals) in rest_rewards.items():
+            LeaderboardService.record(rid, points, meals)
+        if xp_rewards:
+            StudentRankService.add_xp(xp_rewards)
+
+        # 4. One summary push per restaurant owner
+        if rest_rewards:
+            try:
+                owners = db.session.query(User, RestaurantProfile.id)\
+                    .join(RestaurantProfile, RestaurantProfile.owner_user_id == User.id)\
+                    .filter(RestaurantProfile.id.in_(list(rest_rewards))).all()
+                for owner, rid in owners:
+                    NotificationService.notify_restaurant_claims_verified(owner, rest_rewards[rid][1])
+            except Exception as notif_e:
+                print(f"⚠️ Notification error, but verification succeeded: {notif_e}")
+
+        for i, (qr_code, _) in enumerate(items):
+            results[i] = {'qr_code': qr_code, **results[i]}
+        verified = sum(1 for r in results if r['success'])
+        return {
+            'success': True,
+            'verified': verified,
+            'rejected': len(results) - verified,
+            'results': results,
+            'status': 200
+        }
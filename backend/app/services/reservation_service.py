@@ -0,0 +1,261 @@
+import atexit
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, insert, update
+from app.models import Offer, ReservationLease
+from app.extensions import db
+
+
+class _Lease:
+    """Meals this process has already taken off offers.quantity and may hand out locally."""
+
+    __slots__ = ('tokens', 'offer', 'row_id', 'lock', 'last_used')
+
+    def __init__(self):
+        self.tokens = 0
+        self.offer = None
+        self.row_id = None  # the reservation_leases row recording these tokens
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class ReservationService:
+    """
+    Flash-drop reservation engine (optional claim path, CLAIM_RESERVATION_MODE=True).
+
+    Instead of decrementing the hot offers row once per claim, each worker process leases
+    a small batch of meals with one conditional UPDATE and then hands them out from memory.
+    Leases are exclusive, so several gunicorn workers can never oversell between them.
+    Tokens a worker stops needing are returned to the row in one UPDATE by the idle
+    reconciler (and on shutdown), which also reactivates an offer that had gone sold out.
+
+    Every lease is also recorded in reservation_leases, written in the same transaction as
+    the quantity decrement and decremented by each claim it serves. A worker killed before
+    it could return its tokens (SIGKILL, OOM) leaves rows that stop being renewed; once past
+    CLAIM_RESERVATION_LEASE_TTL_SECONDS the claim sweeper puts their tokens back on the offer.
+    """
+
+    enabled = False
+    lease_size = 5
+    idle_seconds = 10
+    lease_ttl_seconds = 120
+
+    _leases = {}
+    _leases_lock = threading.Lock()
+    _reconciler = None
+    stats = {'local_claims': 0, 'leases': 0, 'leased_tokens': 0, 'returned_tokens': 0}  # guarded by _leases_lock
+
+    @staticmethod
+    def init_app(app):
+        ReservationService.enabled = bool(app.config.get('CLAIM_RESERVATION_MODE', False))
+        ReservationService.lease_size = max(1, int(app.config.get('CLAIM_RESERVATION_LEASE_SIZE', 5)))
+        ReservationService.idle_seconds = app.config.get('CLAIM_RESERVATION_IDLE_SECONDS', 10)
+        ReservationService.lease_ttl_seconds = app.config.get('CLAIM_RESERVATION_LEASE_TTL_SECONDS', 120)
+
+        if ReservationService.enabled and ReservationService._reconciler is None:
+            ReservationService._reconciler = threading.Thread(
+                target=ReservationService._reconcile_forever, args=(app,), daemon=True, name='reservation-reconciler'
+            )
+            ReservationService._reconciler.start()
+            atexit.register(ReservationService._return_all_on_exit, app)
+
+    @staticmethod
+    def _count(**deltas):
+        # Request threads of different offers update these concurrently; += on a dict item is not atomic
+        with ReservationService._leases_lock:
+            for name, delta in deltas.items():
+                ReservationService.stats[name] += delta
+
+    @staticmethod
+    def snapshot_stats():
+        """A consistent copy of this worker's reservation counters."""
+        with ReservationService._leases_lock:
+            return dict(ReservationService.stats, open_leases=len(ReservationService._leases))
+
+    # --- TOKEN HAND-OUT ---
+    @staticmethod
+    def _lease_for(offer_id):
+        with ReservationService._leases_lock:
+            lease = ReservationService._leases.get(offer_id)
+            if lease is None:
+                lease = ReservationService._leases[offer_id] = _Lease()
+            return lease
+
+    @staticmethod
+    def acquire(offer_id):
+        """
+        Takes one meal for offer_id. Served from the local lease when possible; otherwise
+        leases a new batch from the DB. Returns (taken, offer, lease_id) where offer carries
+        the description, restaurant_id and pickup window read when the batch was leased, and
+        lease_id is the reservation_leases row the caller passes to consume().
+        """
+        lease = ReservationService._lease_for(offer_id)
+        with lease.lock:
+            lease.last_used = time.monotonic()
+            if lease.tokens == 0:
+                lease.tokens, offer, lease.row_id = ReservationService._lease_from_db(offer_id)
+                if lease.tokens == 0:
+                    return False, None, None
+                lease.offer = offer
+            lease.tokens -= 1
+            ReservationService._count(local_claims=1)
+            return True, lease.offer, lease.row_id
+
+    @staticmethod
+    def consume(lease_id):
+        """
+        Records one served meal on the durable lease, in the caller's transaction (no commit),
+        and renews its expiry. False when the row is gone: the lease was returned or reclaimed
+        meanwhile, so the meal is back on the offer and the caller must not use it.
+        """
+        return db.session.execute(
+            update(ReservationLease)
+            .where(ReservationLease.id == lease_id, ReservationLease.tokens > 0)
+            .values(tokens=ReservationLease.tokens - 1,
+                    expires_at=datetime.utcnow() + timedelta(seconds=ReservationService.lease_ttl_seconds))
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+
+    @staticmethod
+    def release(offer_id, lease_id, count=1):
+        """
+        Puts tokens back into the local lease (e.g. the claim insert failed after acquire).
+        Tokens of an older lease stay with its row, which gives them back to the offer.
+        """
+        lease = ReservationService._lease_for(offer_id)
+        with lease.lock:
+            if lease.row_id == lease_id:
+                lease.tokens += count
+            ReservationService._count(local_claims=-count)
+
+    @staticmethod
+    def discard(offer_id):
+        """Forgets the local lease of a cancelled offer (or one whose row was returned); its tokens are void anyway."""
+        with ReservationService._leases_lock:
+            ReservationService._leases.pop(offer_id, None)
+
+    @staticmethod
+    def _lease_from_db(offer_id):
+        """
+        Atomically moves up to lease_size meals from offers.quantity into this process and
+        records them in reservation_leases in the same transaction. A full batch is tried
+        first; near the end of stock it falls back to single meals. The sold-out flip happens
+        in the same statement, exactly like the direct claim path. Returns (size, offer, row id).
+        """
+        from app.services.spatial_service import SpatialService
+
+        for size in sorted({ReservationService.lease_size, 1}, reverse=True):
+            stmt = update(Offer)\
+                .where(Offer.id == offer_id, Offer.status == 'active', Offer.quantity >= size)\
+                .values(
+                    quantity=Offer.quantity - size,
+                    status=case((Offer.quantity == size, 'sold_out'), else_=Offer.status)
+                )\
+                .returning(Offer.quantity, Offer.description, Offer.restaurant_id, Offer.pickup_start, Offer.pickup_end)\
+                .execution_options(synchronize_session=False)
+            leased = db.session.execute(stmt).first()
+            if leased is not None:
+                row_id = db.session.execute(
+                    insert(ReservationLease).values(
+                        offer_id=offer_id, worker=f"{socket.gethostname()}:{os.getpid()}", tokens=size,
+                        expires_at=datetime.utcnow() + timedelta(seconds=ReservationService.lease_ttl_seconds)
+                    ).returning(ReservationLease.id)
+                ).scalar()
+                db.session.commit()
+                ReservationService._count(leases=1, leased_tokens=size)
+                SpatialService.sync_offer(db.session.get(Offer, offer_id))
+                return size, leased, row_id
+
+        db.session.rollback()
+        return 0, None, None
+
+    # --- RECONCILIATION ---
+    @staticmethod
+    def return_idle_leases(max_idle_seconds=None):
+        """
+        Returns the unused tokens of leases idle for max_idle_seconds, one UPDATE per offer.
+        The count comes from the deleted lease row, so a claim still in flight on that lease
+        (its consume() now finds no row) cannot take a meal that went back to the offer.
+        """
+        max_idle = ReservationService.idle_seconds if max_idle_seconds is None else max_idle_seconds
+        now = time.monotonic()
+
+        with ReservationService._leases_lock:
+            idle = [(offer_id, lease) for offer_id, lease in ReservationService._leases.items()
+                    if now - lease.last_used >= max_idle]
+
+        returned = {}
+        for offer_id, lease in idle:
+            with lease.lock:
+                row_id, lease.row_id, lease.tokens = lease.row_id, None, 0
+            if row_id is None:
+                continue
+            tokens = db.session.execute(
+                delete(ReservationLease).where(ReservationLease.id == row_id).returning(ReservationLease.tokens)
+            ).scalar()
+            if tokens:
+                returned[offer_id] = returned.get(offer_id, 0) + tokens
+
+        total = ReservationService._restock(returned)
+        ReservationService._count(returned_tokens=total)
+        return total
+
+    @staticmethod
+    def reclaim_expired_leases(now=None):
+        """
+        Puts the tokens of expired reservation_leases rows (their worker died without
+        returning them) back on their offers. Run by the claim sweeper; returns the meals restocked.
+        """
+        now = now or datetime.utcnow()
+        expired = db.session.execute(
+            delete(ReservationLease).where(ReservationLease.expires_at < now)
+            .returning(ReservationLease.offer_id, ReservationLease.tokens)
+        ).all()
+
+        returned = {}
+        for offer_id, tokens in expired:
+            if tokens:
+                returned[offer_id] = returned.get(offer_id, 0) + tokens
+        return ReservationService._restock(returned)
+
+    @staticmethod
+    def _restock(returned):
+        """returned: {offer_id: tokens}. Adds them back to the offers, reopening sold-out ones, and commits."""
+        from app.services.spatial_service import SpatialService
+
+        for offer_id, tokens in returned.items():
+            db.session.execute(
+                update(Offer)
+                .where(Offer.id == offer_id, Offer.status.in_(['active', 'sold_out']))
+                .values(quantity=Offer.quantity + tokens, status='active')
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+        for offer_id in returned:
+            SpatialService.sync_offer(db.session.get(Offer, offer_id))
+        return sum(returned.values())
+
+    @staticmethod
+    def _reconcile_forever(app):
+        while True:
+            time.sleep(ReservationService.idle_seconds)
+            with app.app_context():
+                try:
+                    ReservationService.return_idle_leases()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Reservation reconciler error: {e}")
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def _return_all_on_exit(app):
+        with app.app_context():
+            try:
+                ReservationService.return_idle_leases(max_idle_seconds=0)
+            except Exception as e:
+                print(f"⚠️ Could not return reservation leases on shutdown: {e}")
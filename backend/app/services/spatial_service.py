@@ -0,0 +1,338 @@
+import base64
+import json
+import math
+import time
+from sqlalchemy import Float, cast, func, or_, select, text, tuple_
+from geoalchemy2 import Geography
+from app.models import Offer, RestaurantProfile, StudentLocation
+from app.models.types import PointGeometry
+from app.extensions import db
+from app.utils.geo import GridIndex, cell_id, cell_id_ranges, haversine_km, KM_PER_DEGREE_LAT
+from app.utils.cache import LRUTTLCache
+
+# Radius and page-size guards for the nearby offers feed
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 50.0
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class SpatialService:
+
+    # Resolved once per process by init_app(): 'postgis' or 'grid'
+    backend = 'postgis'
+    grid = GridIndex()
+    _grid_built_at = None
+    _grid_refresh_seconds = 30
+
+    # Per-geocell response cache for the offers feed (disabled when TTL is 0)
+    feed_cache = None
+    feed_cell_deg = 0.005
+
+    # Student location grid (notification audiences) and write throttling
+    student_cell_deg = 0.05
+    student_location_min_move_km = 0.2
+
+    # --- BACKEND SELECTION ---
+    @staticmethod
+    def init_app(app):
+        """
+        Picks the spatial engine for this process. SPATIAL_BACKEND may be 'postgis', 'grid'
+        or 'auto' (PostGIS when the extension is installed, otherwise the in-process grid).
+        Must run inside an app context before db.create_all() so the geom DDL matches.
+        """
+        choice = app.config.get('SPATIAL_BACKEND', 'auto')
+
+        if choice == 'auto':
+            choice = 'grid'
+            if db.engine.dialect.name == 'postgresql':
+                try:
+                    with db.engine.connect() as conn:
+                        if conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first():
+                            choice = 'postgis'
+                except Exception as e:
+                    print(f"⚠️ PostGIS detection failed, falling back to grid index: {e}")
+
+        SpatialService.backend = choice
+        PointGeometry.postgis_enabled = (choice == 'postgis')
+        SpatialService.grid = GridIndex(cell_deg=app.config.get('SPATIAL_GRID_CELL_DEG', 0.01))
+        SpatialService._grid_built_at = None
+        SpatialService._grid_refresh_seconds = app.config.get('SPATIAL_GRID_REFRESH_SECONDS', 30)
+
+        ttl = app.config.get('OFFER_FEED_CACHE_TTL_SECONDS', 30)
+        SpatialService.feed_cell_deg = app.config.get('OFFER_FEED_CACHE_CELL_DEG', 0.005)
+        SpatialService.feed_cache = LRUTTLCache(
+            max_entries=app.config.get('OFFER_FEED_CACHE_MAX_ENTRIES', 2048), ttl_seconds=ttl
+        ) if ttl > 0 else None
+
+        SpatialService.student_cell_deg = app.config.get('STUDENT_LOCATION_CELL_DEG', 0.05)
+        SpatialService.student_location_min_move_km = app.config.get('STUDENT_LOCATION_MIN_MOVE_KM', 0.2)
+        print(f"🗺️ Spatial backend: {choice}")
+
+    # --- CURSOR HELPERS ---
+    @staticmethod
+    def encode_cursor(distance_m, offer_id):
+        """Packs the last (distance, offer id) pair of a page into an opaque URL-safe token."""
+        raw = json.dumps([distance_m, offer_id], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Unpacks a cursor token. Raises ValueError if the token was tampered with or is malformed."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            distance_m, offer_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return float(distance_m), int(offer_id)
+        except Exception:
+            raise ValueError('Invalid cursor.')
+
+    # --- CACHED FEED ---
+    @staticmethod
+    def get_offer_feed(lat, lng, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        Serialized nearby-offers page for GET /api/offers: (items, next_cursor).
+        Requests are snapped to the centre of a OFFER_FEED_CACHE_CELL_DEG cell so that
+        students in the same neighbourhood share one cached page; distances are therefore
+        measured from the cell centre (about ±300 m at the default cell size).
+        """
+        cache = SpatialService.feed_cache
+        if cache is None:
+            rows, next_cursor = SpatialService.find_nearby_offers(lat, lng, radius_km, limit, cursor)
+            return [SpatialService._serialize_feed_row(*row) for row in rows], next_cursor
+
+        cell_deg = SpatialService.feed_cell_deg
+        row_idx, col_idx = round(lat / cell_deg), round(lng / cell_deg)
+        key = (row_idx, col_idx, round(radius_km, 1), limit, cursor or '')
+
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        rows, next_cursor = SpatialService.find_nearby_offers(
+            row_idx * cell_deg, col_idx * cell_deg, key[2], limit, cursor
+        )
+        page = ([SpatialService._serialize_feed_row(*row) for row in rows], next_cursor)
+        cache.set(key, page)
+        return page
+
+    @staticmethod
+    def _serialize_feed_row(offer, rest, dist):
+        return {
+            'id': offer.id,
+            'restaurant': rest.name,
+            'type': offer.type,
+            'description': offer.description,
+            'quantity': offer.quantity,
+            'discount_rate': offer.discount_rate,
+            'lat': rest.lat, 
+            'lng': rest.lng,
+            'distance': round(dist, 2) if dist is not None else 0.0,
+            'image_url': offer.image_url 
+        }
+
+    @staticmethod
+    def invalidate_feed_around(lat, lng):
+        """
+        Drops only the cached pages whose search circle could contain (lat, lng):
+        cell centre distance <= cached radius + half the cell diagonal.
+        """
+        cache = SpatialService.feed_cache
+        if cache is None or lat is None or lng is None:
+            return 0
+
+        cell_deg = SpatialService.feed_cell_deg
+        half_diagonal_km = cell_deg * KM_PER_DEGREE_LAT * math.sqrt(2) / 2
+
+        def affected(key):
+            row_idx, col_idx, radius_km = key[0], key[1], key[2]
+            distance = haversine_km(row_idx * cell_deg, col_idx * cell_deg, lat, lng)
+            return distance <= radius_km + half_diagonal_km
+
+        return cache.delete_where(affected)
+
+    @staticmethod
+    def feed_cache_stats():
+        cache = SpatialService.feed_cache
+        if cache is None:
+            return {'enabled': False}
+        return dict(cache.stats(), enabled=True, cell_deg=SpatialService.feed_cell_deg)
+
+    # --- NEARBY QUERY (DISPATCH) ---
+    @staticmethod
+    def find_nearby_offers(lat, lng, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        Returns one page of active offers within radius_km of (lat, lng), nearest first.
+        Result: (rows, next_cursor) where rows are (Offer, RestaurantProfile, distance_km).
+        """
+        if SpatialService.backend == 'grid':
+            return SpatialService._grid_nearby_offers(lat, lng, radius_km, limit, cursor)
+        return SpatialService._postgis_nearby_offers(lat, lng, radius_km, limit, cursor)
+
+    # --- POSTGIS BACKEND ---
+    @staticmethod
+    def _postgis_nearby_offers(lat, lng, radius_km, limit, cursor):
+        """
+        ST_DWithin on the geography cast of RestaurantProfile.geom is served by the
+        ix_restaurant_profiles_geog GiST index, and the `<->` KNN operator lets the same
+        index return rows already in distance order, so nothing is sorted in full.
+        """
+        geog = cast(RestaurantProfile.geom, Geography(geometry_type='POINT', srid=4326))
+        user_point = cast(
+            func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326),
+            Geography(geometry_type='POINT', srid=4326)
+        )
+        # `<->` on geography yields the sphere distance in meters and is index-assisted (KNN)
+        distance_m = geog.op('<->', return_type=Float)(user_point).label('distance_m')
+
+        query = db.session.query(Offer, RestaurantProfile, distance_m)\
+            .join(RestaurantProfile, Offer.restaurant_id == RestaurantProfile.id)\
+            .filter(Offer.status == 'active', Offer.quantity > 0)\
+            .filter(func.ST_DWithin(geog, user_point, radius_km * 1000.0))
+
+        # Keyset pagination: resume strictly after the last (distance, id) pair of the previous page
+        if cursor:
+            last_distance, last_id = SpatialService.decode_cursor(cursor)
+            query = query.filter(tuple_(distance_m, Offer.id) > tuple_(last_distance, last_id))
+
+        # Fetch one extra row to know whether another page exists
+        results = query.order_by(distance_m, Offer.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last_offer, _, last_distance = results[-1]
+            next_cursor = SpatialService.encode_cursor(last_distance, last_offer.id)
+
+        rows = [(offer, rest, dist / 1000.0) for offer, rest, dist in results]
+        return rows, next_cursor
+
+    # --- GRID BACKEND (NON-POSTGIS DEPLOYMENTS) ---
+    @staticmethod
+    def _ensure_grid():
+        """
+        Loads the grid from the DB on first use, then refreshes it periodically so offers
+        created by other worker processes show up within SPATIAL_GRID_REFRESH_SECONDS.
+        """
+        built_at = SpatialService._grid_built_at
+        if built_at is not None and time.monotonic() - built_at < SpatialService._grid_refresh_seconds:
+            return
+
+        rows = db.session.query(Offer.id, RestaurantProfile.lat, RestaurantProfile.lng)\
+            .join(RestaurantProfile, Offer.restaurant_id == RestaurantProfile.id)\
+            .filter(Offer.status == 'active', Offer.quantity > 0)\
+            .filter(RestaurantProfile.lat.isnot(None), RestaurantProfile.lng.isnot(None))\
+            .all()
+        SpatialService.grid.rebuild(rows)
+        SpatialService._grid_built_at = time.monotonic()
+
+    @staticmethod
+    def _grid_nearby_offers(lat, lng, radius_km, limit, cursor):
+        """
+        Answers the nearby feed from the in-process grid index. Distances come from the
+        index; the page's rows are then loaded by primary key, and any offer that sold out
+        or was cancelled since it was indexed is dropped from both the page and the grid.
+        """
+        SpatialService._ensure_grid()
+        candidates = [(dist_km * 1000.0, offer_id) for dist_km, offer_id in SpatialService.grid.within(lat, lng, radius_km)]
+
+        if cursor:
+            last = SpatialService.decode_cursor(cursor)
+            candidates = [c for c in candidates if c > last]
+
+        page = []
+        position = 0
+        while len(page) <= limit and position < len(candidates):
+            chunk = candidates[position:position + limit + 1]
+            position += len(chunk)
+
+            loaded = db.session.query(Offer, RestaurantProfile)\
+                .join(RestaurantProfile, Offer.restaurant_id == RestaurantProfile.id)\
+                .filter(Offer.id.in_([offer_id for _, offer_id in chunk]))\
+                .all()
+            by_id = {offer.id: (offer, rest) for offer, rest in loaded}
+
+            for distance_m, offer_id in chunk:
+                match = by_id.get(offer_id)
+                if not match or match[0].status != 'active' or (match[0].quantity or 0) < 1:
+                    SpatialService.grid.remove(offer_id)
+                    continue
+                page.append((distance_m, match[0], match[1]))
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_distance, last_offer, _ = page[-1]
+            next_cursor = SpatialService.encode_cursor(last_distance, last_offer.id)
+
+        return [(offer, rest, distance_m / 1000.0) for distance_m, offer, rest in page], next_cursor
+
+    # --- INCREMENTAL UPDATES ---
+    @staticmethod
+    def sync_offer(offer):
+        """
+        Called after an offer is created, claimed, sold out or cancelled (post-commit).
+        Invalidates the feed cache cells around the restaurant and keeps the grid index
+        in step without a rebuild (the grid part is a no-op on the PostGIS backend).
+        """
+        if offer is None:
+            return
+        try:
+            rest = offer.restaurant
+            if rest:
+                SpatialService.invalidate_feed_around(rest.lat, rest.lng)
+
+            if SpatialService.backend != 'grid':
+                return
+            if offer.status == 'active' and (offer.quantity or 0) > 0 and rest and rest.lat is not None and rest.lng is not None:
+                SpatialService.grid.upsert(offer.id, rest.lat, rest.lng)
+            else:
+                SpatialService.grid.remove(offer.id)
+        except Exception as e:
+            print(f"⚠️ Spatial index sync failed for offer {getattr(offer, 'id', None)}: {e}")
+
+    # --- STUDENT LOCATIONS & NOTIFICATION AUDIENCES ---
+    @staticmethod
+    def update_student_location(user_id, lat, lng, source='gps'):
+        """
+        Stores a student's last-known position (or home area). Moves shorter than
+        STUDENT_LOCATION_MIN_MOVE_KM are ignored so a feed refresh does not turn into a
+        write. Does not commit. Returns True when the row was written.
+        """
+        location = db.session.get(StudentLocation, user_id)
+        if location is None:
+            location = StudentLocation(user_id=user_id)
+            db.session.add(location)
+        elif location.source == source and \
+                haversine_km(location.lat, location.lng, lat, lng) < SpatialService.student_location_min_move_km:
+            return False
+
+        location.lat, location.lng, location.source = lat, lng, source
+        location.cell = cell_id(lat, lng, SpatialService.student_cell_deg)
+        return True
+
+    @staticmethod
+    def student_audience(lat, lng, radius_km):
+        """
+        SELECT of the user ids whose stored location lies within radius_km of (lat, lng),
+        meant to be embedded in a larger statement (IN / INSERT ... SELECT).
+
+        PostGIS: ST_DWithin on the geography cast, served by ix_student_locations_geog.
+        Otherwise: one `cell BETWEEN` range per grid row of the bounding box (the cell
+        index), then an equirectangular distance check on the few candidate rows.
+        """
+        if SpatialService.backend == 'postgis':
+            geog = cast(StudentLocation.geom, Geography(geometry_type='POINT', srid=4326))
+            centre = cast(
+                func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326),
+                Geography(geometry_type='POINT', srid=4326)
+            )
+            return select(StudentLocation.user_id).where(func.ST_DWithin(geog, centre, radius_km * 1000.0))
+
+        ranges = cell_id_ranges(lat, lng, radius_km, SpatialService.student_cell_deg)
+        km_per_deg_lng = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        d_north = (StudentLocation.lat - lat) * KM_PER_DEGREE_LAT
+        d_east = (StudentLocation.lng - lng) * km_per_deg_lng
+        return select(StudentLocation.user_id).where(
+            or_(*[StudentLocation.cell.between(low, high) for low, high in ranges]),
+            d_north * d_north + d_east * d_east <= radius_km * radius_km
+        )
@@ -0,0 +1,192 @@
+import threading
+import time
+from sqlalchemy import func
+from app.models import User
+from app.extensions import db
+from app.utils.ranking import RankIndex
+from app.services.ledger_service import LedgerService
+
+XP_BUCKET_WIDTH = 25  # XP is awarded in steps of 25/50, so a bucket rarely mixes scores
+
+
+def _university_key(university):
+    return (university or '').strip().casefold() or None
+
+
+class StudentRankService:
+    """
+    Global and per-university XP rankings for students.
+
+    One RankIndex ranks every student, plus one per university. XP awards from claim
+    verification are applied after their commit, so rank lookups and top lists are
+    O(log n) in-process reads. A background thread builds everything from the DB at boot and
+    then every STUDENT_RANK_REFRESH_SECONDS (off the lock, then swapped in) to pick up other
+    workers. Until that first build lands, ready() is False and the routes answer 503.
+    """
+
+    _global = RankIndex(bucket_width=XP_BUCKET_WIDTH)
+    _universities = {}
+    _profiles = {}  # user_id -> (name, university display name, university key)
+    _lock = threading.RLock()
+    _refresher = None
+    _built = False
+
+    @staticmethod
+    def init_app(app):
+        interval = app.config.get('STUDENT_RANK_REFRESH_SECONDS', 300)
+        if interval <= 0:
+            # No refresher (tests, one-off scripts): build in the foreground
+            try:
+                StudentRankService.rebuild()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Student rank index build failed: {e}")
+        elif StudentRankService._refresher is None:
+            StudentRankService._refresher = threading.Thread(
+                target=StudentRankService._refresh_forever, args=(app, interval), daemon=True, name='student-rank-refresher'
+            )
+            StudentRankService._refresher.start()
+
+    # --- BUILD ---
+    @staticmethod
+    def rebuild():
+        """Loads every student's XP (plus uncompacted ledger XP) in one streamed query and swaps in fresh indexes."""
+        rows = db.session.query(User.id, User.name, User.university, func.coalesce(User.xp, 0) + LedgerService.pending_xp(User.id))\
+            .filter(User.role == 'student')\
+            .execution_options(yield_per=10000)
+
+        profiles, everyone, per_university = {}, [], {}
+        for user_id, name, university, xp in rows:
+            key = _university_key(university)
+            profiles[user_id] = (name, university, key)
+            everyone.append((user_id, xp))
+            if key:
+                per_university.setdefault(key, []).append((user_id, xp))
+
+        global_index = RankIndex(bucket_width=XP_BUCKET_WIDTH)
+        global_index.load(everyone)
+        universities = {}
+        for key, items in per_university.items():
+            universities[key] = RankIndex(bucket_width=XP_BUCKET_WIDTH)
+            universities[key].load(items)
+
+        with StudentRankService._lock:
+            StudentRankService._global = global_index
+            StudentRankService._universities = universities
+            StudentRankService._profiles = profiles
+            StudentRankService._built = True
+
+    @staticmethod
+    def ready():
+        """False until the first build has been swapped in."""
+        return StudentRankService._built
+
+    @staticmethod
+    def _refresh_forever(app, interval):
+        # Builds right away, so no worker spends its boot scanning every student
+        while True:
+            with app.app_context():
+                try:
+                    StudentRankService.rebuild()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Student rank refresh error: {e}")
+                finally:
+                    db.session.remove()
+            # A failed first build is retried soon rather than after a full interval
+            time.sleep(interval if StudentRankService._built else min(interval, 5))
+
+    # --- INCREMENTAL UPDATES ---
+    @staticmethod
+    def _track(user_id, name, university):
+        key = _university_key(university)
+        StudentRankService._profiles[user_id] = (name, university, key)
+        return key
+
+    @staticmethod
+    def set_xp(user_id, xp, name=None, university=None, role=None):
+        """
+        Records a student's new XP total (the single-scan path knows it exactly). Users not
+        ranked yet are only added when `role` says they are a student, like rebuild().
+        Before the first build there is nothing to update: the build reads the committed XP.
+        """
+        if not StudentRankService._built:
+            return
+        with StudentRankService._lock:
+            profile = StudentRankService._profiles.get(user_id)
+            if profile is None and role != 'student':
+                return
+            key = profile[2] if profile else StudentRankService._track(user_id, name, university)
+            StudentRankService._global.set(user_id, xp)
+            if key:
+                StudentRankService._universities.setdefault(key, RankIndex(bucket_width=XP_BUCKET_WIDTH)).set(user_id, xp)
+
+    @staticmethod
+    def add_xp(gains):
+        """Applies relative XP gains {user_id: xp}; unranked students are loaded in one query, non-students skipped."""
+        if not StudentRankService._built:
+            return
+        missing = [uid for uid in gains if uid not in StudentRankService._profiles]
+        known = {}
+        if missing:
+            known = {row.id: row for row in db.session.query(
+                User.id, User.name, User.university,
+                (func.coalesce(User.xp, 0) + LedgerService.pending_xp(User.id)).label('xp')
+            ).filter(User.id.in_(missing), User.role == 'student')}
+
+        with StudentRankService._lock:
+            for user_id, gain in gains.items():
+                if user_id in known:
+                    # Loaded after the commit, so xp + pending ledger XP already includes this gain
+                    row = known[user_id]
+                    StudentRankService.set_xp(user_id, row.xp or 0, row.name, row.university, role='student')
+                elif user_id in StudentRankService._profiles:
+                    StudentRankService.set_xp(user_id, (StudentRankService._global.score(user_id) or 0) + gain)
+
+    # --- READS ---
+    @staticmethod
+    def rank_of(user_id):
+        """Global and university standing of a student, or None if they are not ranked."""
+        with StudentRankService._lock:
+            rank = StudentRankService._global.rank(user_id)
+            if rank is None:
+                return None
+            xp = StudentRankService._global.score(user_id)
+            _, university, key = StudentRankService._profiles.get(user_id, (None, None, None))
+            uni_index = StudentRankService._universities.get(key)
+            return {
+                'user_id': user_id,
+                'xp': xp,
+                'level': xp // 100 + 1,
+                'global_rank': rank,
+                'global_total': len(StudentRankService._global),
+                'university': university,
+                'university_rank': uni_index.rank(user_id) if uni_index else None,
+                'university_total': len(uni_index) if uni_index else None
+            }
+
+    @staticmethod
+    def top(k=10, university=None):
+        """Best k students globally, or within one university (matched case-insensitively)."""
+        with StudentRankService._lock:
+            if university:
+                index = StudentRankService._universities.get(_university_key(university))
+                if index is None:
+                    return []
+            else:
+                index = StudentRankService._global
+
+            out, rank, previous = [], 0, None
+            for position, (user_id, xp) in enumerate(index.top(k), start=1):
+                if xp != previous:
+                    rank, previous = position, xp
+                name, uni, _ = StudentRankService._profiles.get(user_id, (None, None, None))
+                out.append({
+                    'user_id': user_id,
+                    'name': name,
+                    'university': uni,
+                    'xp': xp,
+                    'level': xp // 100 + 1,
+                    'rank': rank
+                })
+            return out
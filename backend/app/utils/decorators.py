@@ -1,16 +1,17 @@
 import jwt
 from functools import wraps
-from flask import request, jsonify, current_app, g
+from flask import request, jsonify, current_app, g, make_response
 
 def role_required(allowed_roles):
     """
     Validates the JWT token from the Authorization header and checks RBAC permissions.
-    Assigns the verified user object to flask.g.user for downstream route usage.
+    Assigns the verified principal (id, role, verification_status) to flask.g.user for
+    downstream route usage; it comes from the per-process principal cache, not a user row load.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            from app.models.user import User
+            from app.services.principal_service import PrincipalService
             
             token = None
             
@@ -51,8 +52,8 @@ def role_required(allowed_roles):
                     "message": "Authentication failed. The token is invalid."
                 }), 401
 
-            # 3. Fetch user securely using the ID embedded in the trusted token
-            user = User.query.get(current_user_id)
+            # 3. Resolve the principal for the ID embedded in the trusted token (cached per process)
+            user = PrincipalService.get(current_user_id)
             if not user:
                 return jsonify({
                     "error": "Not Found",
@@ -73,7 +74,7 @@ def role_required(allowed_roles):
                     "message": "Your restaurant account has not been approved by an administrator yet."
                 }), 403
 
-            # 6. Attach the verified user to the global context
+            # 6. Attach the verified principal to the global context
             g.user = user
 
             return f(*args, **kwargs)
@@ -93,4 +94,60 @@ def student_required(f):
     
 def token_required(f):
     """Requires a valid token but allows any valid role."""
-    return role_required(['admin', 'restaurant', 'student', 'user'])(f)
\ No newline at end of file
+    return role_required(['admin', 'restaurant', 'student', 'user'])(f)
+
+# --- IDEMPOTENCY ---
+
+def idempotent(scope):
+    """
+    Honours an optional 'Idempotency-Key' request header on mutating endpoints.
+    A retry carrying the same key replays the stored response (marked with an
+    'Idempotent-Replayed: true' header) instead of executing the action again.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from app.services.idempotency_service import IdempotencyService
+
+            key = request.headers.get('Idempotency-Key', '').strip()
+            if not key:
+                return f(*args, **kwargs)
+
+            if len(key) > 128:
+                return jsonify({
+                    "error": "Invalid Idempotency-Key",
+                    "message": "Idempotency-Key must be at most 128 characters."
+                }), 400
+
+            outcome, record = IdempotencyService.begin(scope, key, IdempotencyService.fingerprint(request.get_data()))
+
+            if outcome == 'replay':
+                response = current_app.response_class(record.response_body, status=record.status_code, mimetype='application/json')
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if outcome == 'in_progress':
+                return jsonify({
+                    "error": "Conflict",
+                    "message": "A request with this Idempotency-Key is still being processed. Retry shortly."
+                }), 409
+            if outcome == 'mismatch':
+                return jsonify({
+                    "error": "Unprocessable Entity",
+                    "message": "This Idempotency-Key was already used with a different request body."
+                }), 422
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                IdempotencyService.abandon(scope, key)
+                raise
+
+            # Server errors are not final: release the key so the retry really runs
+            if response.status_code >= 500:
+                IdempotencyService.abandon(scope, key)
+            else:
+                IdempotencyService.complete(scope, key, response.status_code, response.get_data(as_text=True))
+            return response
+        return decorated_function
+    return decorator
+
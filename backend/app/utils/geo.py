@@ -0,0 +1,120 @@
+import math
+import threading
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km. Accepts scalars or numpy arrays (vectorized)."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Column count multiplier for packed cell ids; must exceed 360 / smallest cell size used
+CELL_ID_STRIDE = 10 ** 7
+
+
+def cell_id(lat, lng, cell_deg):
+    """Packs the grid cell containing (lat, lng) into one sortable integer (row-major)."""
+    return math.floor((lat + 90.0) / cell_deg) * CELL_ID_STRIDE + math.floor((lng + 180.0) / cell_deg)
+
+
+def cell_id_ranges(lat, lng, radius_km, cell_deg):
+    """
+    Inclusive (low, high) cell id ranges covering the bounding box of a circle: one
+    contiguous range per grid row, so each maps to a single index range scan.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    col_lo = math.floor((max(lng - dlng, -180.0) + 180.0) / cell_deg)
+    col_hi = math.floor((min(lng + dlng, 180.0) + 180.0) / cell_deg)
+    row_lo = math.floor((max(lat - dlat, -90.0) + 90.0) / cell_deg)
+    row_hi = math.floor((min(lat + dlat, 90.0) + 90.0) / cell_deg)
+    return [(row * CELL_ID_STRIDE + col_lo, row * CELL_ID_STRIDE + col_hi) for row in range(row_lo, row_hi + 1)]
+
+
+class GridIndex:
+    """
+    Thread-safe uniform lat/lng grid of points keyed by an integer id.
+    Queries only visit the cells overlapping the search circle's bounding box and then
+    run one vectorized haversine pass over those candidates.
+    """
+
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self._points = {}   # key -> (lat, lng, cell)
+        self._cells = {}    # cell -> set(keys)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    # --- MUTATIONS ---
+    def upsert(self, key, lat, lng):
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self._discard(key)
+            self._points[key] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._points.pop(key, None)
+        if entry:
+            members = self._cells.get(entry[2])
+            members.discard(key)
+            if not members:
+                del self._cells[entry[2]]
+
+    def rebuild(self, items):
+        """Atomically replaces the whole index with (key, lat, lng) items."""
+        points, cells = {}, {}
+        for key, lat, lng in items:
+            cell = self._cell(lat, lng)
+            points[key] = (lat, lng, cell)
+            cells.setdefault(cell, set()).add(key)
+        with self._lock:
+            self._points, self._cells = points, cells
+
+    # --- QUERIES ---
+    def within(self, lat, lng, radius_km):
+        """Returns [(distance_km, key)] for every point within radius_km, nearest first."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        min_row, min_col = self._cell(lat - lat_span, lng - lng_span)
+        max_row, max_col = self._cell(lat + lat_span, lng + lng_span)
+
+        keys, lats, lngs = [], [], []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    for key in self._cells.get((row, col), ()):
+                        p_lat, p_lng, _ = self._points[key]
+                        keys.append(key)
+                        lats.append(p_lat)
+                        lngs.append(p_lng)
+
+        if not keys:
+            return []
+
+        distances = haversine_km(lat, lng, np.array(lats), np.array(lngs))
+        inside = np.nonzero(distances <= radius_km)[0]
+        return sorted((float(distances[i]), keys[i]) for i in inside)
+
+    def nearest(self, lat, lng, k, max_radius_km=50.0):
+        """Returns the k nearest [(distance_km, key)], widening the search ring until k are found."""
+        radius_km = max(self.cell_deg * KM_PER_DEGREE_LAT, 0.5)
+        while True:
+            found = self.within(lat, lng, radius_km)
+            if len(found) >= k or radius_km >= max_radius_km:
+                return found[:k]
+            radius_km = min(radius_km * 2, max_radius_km)
@@ -0,0 +1,157 @@
+import heapq
+import threading
+from collections import Counter
+
+
+class RankIndex:
+    """
+    Order-statistic index over non-negative integer scores.
+
+    Scores are grouped into buckets of `bucket_width` and a Fenwick tree counts members per
+    bucket, so "how many keys score higher than me" is O(log B) and the bucket holding the
+    n-th best key is found with one O(log B) descent. Inside a bucket a score histogram
+    settles exact ranks in O(bucket_width), so crowded buckets (e.g. thousands of students
+    on 0 XP) stay cheap.
+    """
+
+    def __init__(self, bucket_width=1, capacity=1024):
+        self.bucket_width = max(1, int(bucket_width))
+        self._size = 1
+        while self._size < capacity:
+            self._size *= 2
+        self._tree = [0] * (self._size + 1)
+        self._buckets = {}
+        self._histograms = {}
+        self._scores = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, key):
+        return key in self._scores
+
+    # --- FENWICK TREE ---
+    def _add(self, bucket, delta):
+        i = bucket + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket):
+        """Number of keys in buckets [0, bucket]."""
+        total, i = 0, min(bucket + 1, self._size)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _bucket_with_prefix(self, n):
+        """Lowest bucket whose prefix count reaches n (1-based)."""
+        pos, step = 0, self._size
+        while step:
+            nxt = pos + step
+            if nxt <= self._size and self._tree[nxt] < n:
+                pos = nxt
+                n -= self._tree[nxt]
+            step //= 2
+        return pos
+
+    def _grow(self, bucket):
+        """Resizes to fit `bucket` and rebuilds the tree from the bucket counts in O(B)."""
+        while bucket >= self._size:
+            self._size *= 2
+        tree = [0] * (self._size + 1)
+        for b, members in self._buckets.items():
+            tree[b + 1] += len(members)
+        for i in range(1, self._size + 1):
+            parent = i + (i & -i)
+            if parent <= self._size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    # --- UPDATES ---
+    def set(self, key, score):
+        score = max(0, int(score))
+        with self._lock:
+            self._discard(key)
+            bucket = score // self.bucket_width
+            if bucket >= self._size:
+                self._grow(bucket)
+            self._buckets.setdefault(bucket, {})[key] = score
+            self._histograms.setdefault(bucket, Counter())[score] += 1
+            self._scores[key] = score
+            self._add(bucket, 1)
+
+    def add(self, key, delta):
+        with self._lock:
+            self.set(key, self._scores.get(key, 0) + delta)
+            return self._scores[key]
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        old = self._scores.pop(key, None)
+        if old is None:
+            return
+        bucket = old // self.bucket_width
+        members = self._buckets[bucket]
+        del members[key]
+        histogram = self._histograms[bucket]
+        histogram[old] -= 1
+        if not histogram[old]:
+            del histogram[old]
+        if not members:
+            del self._buckets[bucket]
+            del self._histograms[bucket]
+        self._add(bucket, -1)
+
+    def load(self, items):
+        """Replaces the contents with (key, score) pairs; the tree is built once, in O(n + B)."""
+        buckets, histograms, scores = {}, {}, {}
+        for key, score in items:
+            score = max(0, int(score or 0))
+            bucket = score // self.bucket_width
+            buckets.setdefault(bucket, {})[key] = score
+            histograms.setdefault(bucket, Counter())[score] += 1
+            scores[key] = score
+        with self._lock:
+            self._buckets, self._histograms, self._scores = buckets, histograms, scores
+            self._grow(max(buckets, default=0))
+
+    def clear(self):
+        with self._lock:
+            self._tree = [0] * (self._size + 1)
+            self._buckets = {}
+            self._histograms = {}
+            self._scores = {}
+
+    # --- READS ---
+    def score(self, key):
+        return self._scores.get(key)
+
+    def rank(self, key):
+        """1-based competition rank (ties share a rank), or None for unknown keys."""
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                return None
+            bucket = score // self.bucket_width
+            higher = len(self._scores) - self._prefix(bucket)
+            higher += sum(count for s, count in self._histograms[bucket].items() if s > score)
+            return higher + 1
+
+    def top(self, k):
+        """The k best (key, score) pairs, highest score first, ties by key."""
+        with self._lock:
+            total = len(self._scores)
+            out = []
+            n = 1
+            while n <= total and len(out) < k:
+                bucket = self._bucket_with_prefix(total - n + 1)
+                members = self._buckets[bucket]
+                out.extend(heapq.nsmallest(k - len(out), members.items(), key=lambda kv: (-kv[1], kv[0])))
+                n += len(members)
+            return out
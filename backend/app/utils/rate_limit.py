@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets kept in process memory: each key may spend `capacity` tokens
+    in a burst, refilled continuously at `refill_per_second`. Buckets that have refilled
+    completely carry no information, so they are dropped when the table grows past max_keys.
+    """
+
+    def __init__(self, capacity, refill_per_second, max_keys=200000):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _take(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.capacity, now]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return True
+        self.throttled += 1
+        return False
+
+    def allow(self, key, now=None):
+        """Spends one token for key. Returns False when the key is over its rate."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            allowed = self._take(key, now)
+            self._prune(now)
+            return allowed
+
+    def allow_many(self, keys, now=None):
+        """Bulk allow(): returns the subset of keys that got a token, in input order."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            granted = [key for key in keys if self._take(key, now)]
+            self._prune(now)
+            return granted
+
+    def _prune(self, now):
+        if len(self._buckets) <= self.max_keys:
+            return
+        full_after = self.capacity / self.refill_per_second if self.refill_per_second else float('inf')
+        for key in [k for k, (_, updated_at) in self._buckets.items() if now - updated_at >= full_after]:
+            del self._buckets[key]
+
+    def stats(self):
+        return {'keys': len(self._buckets), 'allowed': self.allowed, 'throttled': self.throttled}
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import namedtuple
+
+# Signed claim codes look like  FS1.<payload>.<signature>
+#   payload   = base64url(JSON [claim_id, offer_id, user_id, restaurant_id, expires_at_epoch])
+#   signature = base64url(first 16 bytes of HMAC-SHA256(restaurant_key, "FS1." + payload))
+# Every restaurant gets its own key derived from the server secret, so a scanner app only
+# ever holds the key for its own restaurant and can validate codes without a network call.
+SIGNED_PREFIX = 'FS1'
+SIGNATURE_BYTES = 16
+
+SignedClaim = namedtuple('SignedClaim', ['claim_id', 'offer_id', 'user_id', 'restaurant_id', 'expires_at'])
+
+
+class InvalidQRCode(ValueError):
+    """The code is malformed or its signature does not match."""
+
+
+class ExpiredQRCode(InvalidQRCode):
+    """The signature is valid but the code is past its expiry."""
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def restaurant_key(secret, restaurant_id):
+    """Derives the per-restaurant signing key that is handed to that restaurant's scanners."""
+    return hmac.new(secret.encode('utf-8'), f'restaurant:{int(restaurant_id)}'.encode('ascii'), hashlib.sha256).digest()
+
+
+def is_signed_code(code):
+    return isinstance(code, str) and code.startswith(SIGNED_PREFIX + '.')
+
+
+def sign_claim_code(secret, claim_id, offer_id, user_id, restaurant_id, expires_at):
+    """Builds the QR payload for a claim. expires_at is a UTC epoch in seconds."""
+    body = json.dumps([claim_id, offer_id, user_id, restaurant_id, int(expires_at)], separators=(',', ':'))
+    signing_input = f'{SIGNED_PREFIX}.{_b64encode(body.encode("ascii"))}'
+    key = restaurant_key(secret, restaurant_id)
+    signature = hmac.new(key, signing_input.encode('ascii'), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return f'{signing_input}.{_b64encode(signature)}'
+
+
+def read_claim_code(code, secret=None, key=None, now=None):
+    """
+    Verifies a signed claim code and returns its SignedClaim.
+    Pass the server `secret` (key is derived from the embedded restaurant id) or a
+    restaurant `key` (what an offline scanner holds). `now` defaults to the current time.
+    Raises InvalidQRCode / ExpiredQRCode.
+    """
+    if not is_signed_code(code):
+        raise InvalidQRCode('Not a signed claim code.')
+    try:
+        prefix, payload, signature = code.split('.')
+        claim = SignedClaim(*(int(v) for v in json.loads(_b64decode(payload))))
+        given = _b64decode(signature)
+    except (ValueError, TypeError):
+        raise InvalidQRCode('Malformed claim code.')
+
+    if key is None:
+        key = restaurant_key(secret, claim.restaurant_id)
+    expected = hmac.new(key, f'{prefix}.{payload}'.encode('ascii'), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    if not hmac.compare_digest(expected, given):
+        raise InvalidQRCode('Claim code signature does not match.')
+
+    if claim.expires_at < (time.time() if now is None else now):
+        raise ExpiredQRCode('This code is expired.')
+    return claim
@@ -0,0 +1,91 @@
+"""
+New-offer fan-out benchmark: set-based inbox insert + FCM multicast vs. the old per-student loop.
+
+Usage:
+    python bench_notifications.py [--students 100000] [--fcm-latency-ms 40] [--legacy-students 2000]
+
+Runs against BENCH_DATABASE_URL (e.g. a scratch PostgreSQL DB) or a temporary SQLite file.
+FCM is replaced by the in-memory RecordingTransport sleeping --fcm-latency-ms per HTTP
+request, so the numbers show round-trip counts rather than Google's throughput. The legacy
+loop is timed on a smaller sample and extrapolated, because at 100k students it takes hours.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import insert, text
+
+from config import TestingConfig
+
+
+def seed_students(db, User, count):
+    rows = [{'name': f'Student {i}', 'email': f'bench-student-{i}@test.hu', 'role': 'student',
+             'password_hash': 'x', 'fcm_token': f'bench-token-{i}'} for i in range(count)]
+    for start in range(0, count, 10000):
+        db.session.execute(insert(User), rows[start:start + 10000])
+    db.session.commit()
+
+
+def legacy_fanout(db, User, NotificationService, title, body):
+    """The pre-bulk implementation: ORM load, one send and one INSERT per student."""
+    sent = 0
+    for student in User.query.filter_by(role='student').all():
+        if student.fcm_token and NotificationService.send_push_notification(student.fcm_token, title, body, {'type': 'new_offer'}):
+            sent += 1
+        db.session.execute(text(
+            "INSERT INTO notifications (user_id, title, message, is_read, created_at) "
+            "VALUES (:uid, :title, :msg, false, CURRENT_TIMESTAMP)"
+        ), {'uid': student.id, 'title': title, 'msg': body})
+    db.session.commit()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--fcm-latency-ms', type=float, default=40)
+    parser.add_argument('--legacy-students', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_url = os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    TestingConfig.SQLALCHEMY_DATABASE_URI = db_url
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Notification
+    from app.services.notification_service import NotificationService
+    from app.services.push_transport import RecordingTransport
+
+    app = create_app('testing')
+    stub = RecordingTransport(latency_seconds=args.fcm_latency_ms / 1000)
+    NotificationService.messaging = stub
+    offer = {'title': 'Bench Menu', 'restaurant_name': 'Bench Bistro'}
+
+    with app.app_context():
+        print(f"DB: {db_url.split('@')[-1]} | fcm latency {args.fcm_latency_ms:.0f} ms/request")
+
+        seed_students(db, User, args.legacy_students)
+        started = time.perf_counter()
+        legacy_fanout(db, User, NotificationService, 'Bench', 'Bench')
+        per_student = (time.perf_counter() - started) / args.legacy_students
+        print(f"legacy loop   {args.legacy_students:>7} students  {per_student * 1000:8.2f} ms/student"
+              f"  -> ~{per_student * args.students:9.1f} s for {args.students}")
+
+        db.session.execute(Notification.__table__.delete())
+        db.session.execute(User.__table__.delete())
+        db.session.commit()
+
+        seed_students(db, User, args.students)
+        stub.reset()
+        started = time.perf_counter()
+        sent = NotificationService.notify_students_new_offer(offer)
+        elapsed = time.perf_counter() - started
+        print(f"bulk fan-out  {args.students:>7} students  {elapsed:8.2f} s total"
+              f"  ({sent} pushed in {stub.requests} FCM requests, {args.students / elapsed:,.0f} students/s)")
+
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Login hashing benchmark: password verification on the request thread vs. the hashing process pool.
+
+Usage:
+    python bench_passwords.py [--seconds 5] [--threads 8] [--workers N] [--method scrypt]
+
+Simulates a threaded server: --threads request threads verify the same stored hash in a
+loop for --seconds. "inline" is the old User.check_password path, "pool" routes through
+PasswordService with --workers processes (default: one per core). Besides logins/sec
+(total and per core), it reports how much CPU each login costs the request thread itself,
+which is what blocks other requests in that worker.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.services.password_service import PasswordService
+
+
+def run(verify, stored_hash, threads, seconds):
+    deadline = time.perf_counter() + seconds
+    counts, cpu = [0] * threads, [0.0] * threads
+
+    def request_loop(slot):
+        started_cpu = time.thread_time()
+        while time.perf_counter() < deadline:
+            assert verify(stored_hash, 'correct horse battery staple')
+            counts[slot] += 1
+        cpu[slot] = time.thread_time() - started_cpu
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(request_loop, range(threads)))
+    elapsed = time.perf_counter() - started
+    logins = sum(counts)
+    return logins / elapsed, sum(cpu) / max(logins, 1) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--method', default='scrypt')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    stored_hash = generate_password_hash('correct horse battery staple', args.method)
+    print(f"{args.method} | {cores} core(s) | {args.threads} request threads | {args.seconds:.0f}s per mode")
+
+    rate, thread_ms = run(check_password_hash, stored_hash, args.threads, args.seconds)
+    print(f"inline  {rate:8.1f} logins/s  {rate / cores:8.1f} /core  {thread_ms:7.2f} ms request-thread CPU per login")
+
+    PasswordService._workers = args.workers
+    PasswordService._executor().submit(int).result()
+    try:
+        rate, thread_ms = run(PasswordService.verify_password, stored_hash, args.threads, args.seconds)
+    finally:
+        PasswordService.shutdown()
+    print(f"pool    {rate:8.1f} logins/s  {rate / cores:8.1f} /core  {thread_ms:7.2f} ms request-thread CPU per login"
+          f"  ({args.workers} worker process(es))")
+
+
+if __name__ == '__main__':
+    main()
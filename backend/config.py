@@ -16,7 +16,66 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secure-jwt-offline-key-2026-production'
     JWT_EXPIRATION_HOURS = 24
 
+    # --- AUDIT LOG WRITER (batched in the background; flush interval 0 = no writer thread) ---
+    AUDIT_FLUSH_INTERVAL_MS = int(os.environ.get('AUDIT_FLUSH_INTERVAL_MS', 200))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    # How long a request may wait for queue space before the event is dropped
+    AUDIT_ENQUEUE_TIMEOUT_MS = int(os.environ.get('AUDIT_ENQUEUE_TIMEOUT_MS', 5))
+
+    # --- PASSWORD HASHING (werkzeug method string, e.g. 'scrypt' or 'pbkdf2:sha256:600000') ---
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    # Hashing process pool size per server worker, capped at the core count. 0 = hash on the
+    # request thread, which is right for sync gunicorn workers; use a pool with threaded/gevent workers.
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    # How long a request waits for the pool before hashing inline instead
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', 10))
+
+    # --- GOOGLE SIGN-IN (signing certs are cached for Google's Cache-Control max-age) ---
+    GOOGLE_CERTS_URL = os.environ.get('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+    GOOGLE_CERTS_TIMEOUT_SECONDS = int(os.environ.get('GOOGLE_CERTS_TIMEOUT_SECONDS', 5))
+    GOOGLE_CERTS_DEFAULT_MAX_AGE = int(os.environ.get('GOOGLE_CERTS_DEFAULT_MAX_AGE', 300))
+    # Floor between refreshes triggered by an unknown key id (Google key rotation)
+    GOOGLE_CERTS_MIN_REFRESH_SECONDS = int(os.environ.get('GOOGLE_CERTS_MIN_REFRESH_SECONDS', 30))
+
+    # --- PRINCIPAL CACHE (role_required; set TTL to 0 to load the user on every request) ---
+    PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', 60))
+    PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', 50000))
+    # How often each worker polls principal_invalidations for role/status changes made by other workers
+    PRINCIPAL_INVALIDATION_POLL_SECONDS = float(os.environ.get('PRINCIPAL_INVALIDATION_POLL_SECONDS', 2))
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # --- SPATIAL ENGINE ---
+    # 'auto' uses PostGIS when the extension is installed, otherwise the in-process grid index.
+    SPATIAL_BACKEND = os.environ.get('SPATIAL_BACKEND', 'auto')
+    SPATIAL_GRID_CELL_DEG = float(os.environ.get('SPATIAL_GRID_CELL_DEG', 0.01))
+    SPATIAL_GRID_REFRESH_SECONDS = int(os.environ.get('SPATIAL_GRID_REFRESH_SECONDS', 30))
+
+    # --- OFFERS FEED CACHE (per quantized location cell + radius, set TTL to 0 to disable) ---
+    OFFER_FEED_CACHE_TTL_SECONDS = int(os.environ.get('OFFER_FEED_CACHE_TTL_SECONDS', 30))
+    OFFER_FEED_CACHE_CELL_DEG = float(os.environ.get('OFFER_FEED_CACHE_CELL_DEG', 0.005))
+    OFFER_FEED_CACHE_MAX_ENTRIES = int(os.environ.get('OFFER_FEED_CACHE_MAX_ENTRIES', 2048))
+
+    # --- NEW-OFFER NOTIFICATION AUDIENCE (radius around the restaurant, 0 = every student) ---
+    OFFER_NOTIFY_RADIUS_KM = float(os.environ.get('OFFER_NOTIFY_RADIUS_KM', 5))
+    STUDENT_LOCATION_CELL_DEG = float(os.environ.get('STUDENT_LOCATION_CELL_DEG', 0.05))
+    STUDENT_LOCATION_MIN_MOVE_KM = float(os.environ.get('STUDENT_LOCATION_MIN_MOVE_KM', 0.2))
+
+    # --- PUSH TRANSPORT ('firebase', or 'memory' to record pushes in-process for tests / load tests) ---
+    PUSH_TRANSPORT = os.environ.get('PUSH_TRANSPORT', 'firebase')
+    FIREBASE_CREDENTIALS_PATH = os.environ.get('FIREBASE_CREDENTIALS_PATH', os.path.join(basedir, 'firebase-service-account.json'))
+    FCM_HTTP_TIMEOUT_SECONDS = int(os.environ.get('FCM_HTTP_TIMEOUT_SECONDS', 10))
+
+    # --- NEW-OFFER DIGESTS (merge offers per user inside the window, 0 = one row/push per offer) ---
+    NOTIFY_COALESCE_MINUTES = int(os.environ.get('NOTIFY_COALESCE_MINUTES', 10))
+    # Push token bucket per student: burst size, then this many pushes per hour.
+    # The bucket is per process: every process running job workers (JOB_WORKERS > 0) keeps its
+    # own, so the effective cap is these values times that process count. With several such
+    # processes, divide the intended cap by their number (or run JOB_WORKERS > 0 in just one).
+    NOTIFY_PUSH_BURST = int(os.environ.get('NOTIFY_PUSH_BURST', 3))
+    NOTIFY_PUSHES_PER_HOUR = float(os.environ.get('NOTIFY_PUSHES_PER_HOUR', 6))
     
     @staticmethod
     def init_app(app):
@@ -27,16 +86,81 @@ class Config:
     AWS_REGION = os.environ.get('AWS_REGION')
     AWS_BUCKET_NAME = os.environ.get('AWS_BUCKET_NAME')    
 
+    # --- FLASH-DROP RESERVATION MODE (claims served from per-worker leased batches) ---
+    CLAIM_RESERVATION_MODE = os.environ.get('CLAIM_RESERVATION_MODE', 'false').lower() == 'true'
+    CLAIM_RESERVATION_LEASE_SIZE = int(os.environ.get('CLAIM_RESERVATION_LEASE_SIZE', 5))
+    CLAIM_RESERVATION_IDLE_SECONDS = int(os.environ.get('CLAIM_RESERVATION_IDLE_SECONDS', 10))
+    # A lease not used for this long counts as abandoned (its worker died) and the claim sweeper
+    # returns its meals to the offer. Keep it well above CLAIM_RESERVATION_IDLE_SECONDS.
+    CLAIM_RESERVATION_LEASE_TTL_SECONDS = int(os.environ.get('CLAIM_RESERVATION_LEASE_TTL_SECONDS', 120))
+
+    # --- IDEMPOTENCY KEYS (retry-safe claim & verify) ---
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    IDEMPOTENCY_PRUNE_INTERVAL_SECONDS = int(os.environ.get('IDEMPOTENCY_PRUNE_INTERVAL_SECONDS', 600))
+    # An attempt still unfinished after this long is presumed dead (gunicorn's default worker timeout is 30s)
+    IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS', 30))
+
+    # --- STALE CLAIM SWEEPER ---
+    # Pending claims hold a meal for the offer's pickup window (or CLAIM_HOLD_MINUTES without one).
+    CLAIM_SWEEP_INTERVAL_SECONDS = int(os.environ.get('CLAIM_SWEEP_INTERVAL_SECONDS', 300))
+    CLAIM_HOLD_MINUTES = int(os.environ.get('CLAIM_HOLD_MINUTES', 120))
+    CLAIM_MIN_HOLD_MINUTES = int(os.environ.get('CLAIM_MIN_HOLD_MINUTES', 15))
+
+    # --- LEADERBOARD ---
+    # Reads come from an in-memory index; a background thread rebuilds it from the DB this often
+    # to pick up other workers (0 = no periodic rebuild).
+    LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 60))
+    STUDENT_RANK_REFRESH_SECONDS = int(os.environ.get('STUDENT_RANK_REFRESH_SECONDS', 300))
+
+    # --- GAMIFICATION LEDGER ---
+    # Awards are appended to a ledger; a background compactor folds them into users.xp / leaderboard.
+    LEDGER_COMPACT_INTERVAL_SECONDS = int(os.environ.get('LEDGER_COMPACT_INTERVAL_SECONDS', 5))
+    LEDGER_COMPACT_BATCH_SIZE = int(os.environ.get('LEDGER_COMPACT_BATCH_SIZE', 5000))
+
+    # --- BACKGROUND JOB QUEUE ---
+    # Durable DB-backed queue (background_jobs table) used for offer fan-out; workers are threads per process.
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1))
+    JOB_RETRY_BASE_SECONDS = int(os.environ.get('JOB_RETRY_BASE_SECONDS', 10))
+    JOB_RETRY_MAX_SECONDS = int(os.environ.get('JOB_RETRY_MAX_SECONDS', 900))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 600))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+    # --- SIGNED QR CODES ---
+    # New claims get HMAC-signed codes that scanners can validate offline; legacy OFF-... codes stay valid.
+    SIGNED_QR_CODES = os.environ.get('SIGNED_QR_CODES', 'true').lower() == 'true'
+    QR_SIGNING_SECRET = os.environ.get('QR_SIGNING_SECRET') or SECRET_KEY
+    # Offline scans older than this are not reconciled, so a backdated scan time can't revive expired claims
+    QR_OFFLINE_SYNC_WINDOW_MINUTES = int(os.environ.get('QR_OFFLINE_SYNC_WINDOW_MINUTES', 360))
+    # Scanner clock error tolerated when comparing a scan time with the claim's creation
+    QR_SCAN_CLOCK_SKEW_SECONDS = int(os.environ.get('QR_SCAN_CLOCK_SKEW_SECONDS', 300))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     # Fetch database URL securely from the environment
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL')
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    # Self-contained test runs: no PostGIS, no cross-request response caching
+    SPATIAL_BACKEND = 'grid'
+    OFFER_FEED_CACHE_TTL_SECONDS = 0
+    CLAIM_SWEEP_INTERVAL_SECONDS = 0
+    STUDENT_RANK_REFRESH_SECONDS = 0
+    LEADERBOARD_REFRESH_SECONDS = 0
+    LEDGER_COMPACT_INTERVAL_SECONDS = 0
+    JOB_WORKERS = 0
+    PUSH_TRANSPORT = 'memory'
+    AUDIT_FLUSH_INTERVAL_MS = 0
+    PASSWORD_HASH_WORKERS = 0
+
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
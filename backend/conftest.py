@@ -0,0 +1,55 @@
+import pytest
+from config import TestingConfig
+from app import create_app
+from app.extensions import db
+from app.models import User, RestaurantProfile, Offer
+
+# --- SHARED FIXTURES FOR THE IN-PROCESS TEST SUITE ---
+# (test_api.py is separate: it drives a live server over HTTP.)
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh application bound to a file-backed SQLite DB, so worker threads share one database."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_ENGINE_OPTIONS', {'connect_args': {'timeout': 30}}, raising=False)
+
+    app = create_app('testing')
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seed(app):
+    """Factory helpers that insert a verified restaurant with one offer, and students."""
+
+    class Seed:
+        @staticmethod
+        def offer(quantity=1, offer_type='free', lat=47.4979, lng=19.0402):
+            with app.app_context():
+                owner = User(name='Test Bistro', email=f'bistro{User.query.count()}@test.hu',
+                             role='restaurant', verification_status='verified', password_hash='x')
+                db.session.add(owner)
+                db.session.flush()
+                restaurant = RestaurantProfile(owner_user_id=owner.id, name='Test Bistro', lat=lat, lng=lng)
+                db.session.add(restaurant)
+                db.session.flush()
+                offer = Offer(restaurant_id=restaurant.id, title='Lunch Box', description='Daily menu',
+                              type=offer_type, original_quantity=quantity, quantity=quantity, status='active')
+                db.session.add(offer)
+                db.session.commit()
+                return offer.id
+
+        @staticmethod
+        def students(count):
+            with app.app_context():
+                start = User.query.count()
+                users = [User(name=f'Student {start + i}', email=f'student{start + i}@test.hu',
+                              role='student', password_hash='x') for i in range(count)]
+                db.session.add_all(users)
+                db.session.commit()
+                return [u.id for u in users]
+
+    return Seed
@@ -0,0 +1,56 @@
+import queue
+from app.extensions import db
+from app.models import User
+from app.models.user import AuditLog
+from app.services.audit_service import AuditService
+from app.services.auth_service import AuthService
+
+
+# --- TEST 1: AUDITING NEVER COMMITS THE CALLER'S SESSION; EVENTS LAND IN MULTI-ROW BATCHES ---
+def test_audit_events_are_queued_and_written_in_batches(app, monkeypatch):
+    monkeypatch.setattr(AuditService, '_queue', queue.Queue(maxsize=5000))
+    monkeypatch.setattr(AuditService, 'counters', dict.fromkeys(AuditService.counters, 0))
+
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        # Half-finished work in the request's session must not be committed by the audit call
+        db.session.add(User(name='Draft', email='draft@test.hu', role='student', password_hash='x'))
+        AuthService.log_audit(None, 'LOGIN_FAILED', 'Failed attempt for email: draft@test.hu')
+        db.session.rollback()
+        assert User.query.filter_by(email='draft@test.hu').first() is None
+        assert AuditLog.query.count() == 0  # queued, not yet written
+
+        for i in range(1199):
+            AuthService.log_audit(i, 'TOKEN_REFRESHED', 'New access token issued.')
+
+        assert AuditService.flush() == 1200
+        assert AuditService.counters['batches'] == 3  # 500 + 500 + 200 rows, three commits instead of 1200
+        first = AuditLog.query.order_by(AuditLog.id).first()
+        assert (first.action, first.ip_address) == ('LOGIN_FAILED', '10.0.0.7')
+        assert first.timestamp is not None
+
+
+# --- TEST 2: A FULL QUEUE DROPS EVENTS INSTEAD OF STALLING THE REQUEST ---
+def test_full_audit_queue_applies_backpressure_and_counts_drops(app, monkeypatch):
+    monkeypatch.setattr(AuditService, '_queue', queue.Queue(maxsize=2))
+    monkeypatch.setattr(AuditService, '_enqueue_timeout', 0.01)
+    monkeypatch.setattr(AuditService, 'counters', dict.fromkeys(AuditService.counters, 0))
+
+    with app.app_context():
+        assert [AuditService.record(1, 'LOGIN_SUCCESS') for _ in range(4)] == [True, True, False, False]
+        assert AuditService.stats()['dropped_full'] == 2
+        assert AuditService.stats()['queued'] == 2
+        assert AuditService.flush() == 2
+        assert AuditLog.query.count() == 2
+
+
+# --- TEST 3: ONE POISON EVENT IS DROPPED ALONE, THE REST OF ITS BATCH STILL LANDS ---
+def test_poison_event_does_not_drop_its_batch(app, monkeypatch):
+    monkeypatch.setattr(AuditService, '_queue', queue.Queue(maxsize=100))
+    monkeypatch.setattr(AuditService, 'counters', dict.fromkeys(AuditService.counters, 0))
+
+    with app.app_context():
+        for i in range(10):
+            AuditService.record(i, None if i == 4 else 'LOGIN_SUCCESS')  # action is NOT NULL
+        assert AuditService.flush() == 9
+        assert AuditLog.query.count() == 9
+        assert AuditService.stats()['dropped_failed'] == 1
@@ -0,0 +1,177 @@
+import threading
+from app.extensions import db
+from app.models import Offer, Claim
+from app.services.qr_service import QRService
+
+# --- TEST 1: NO OVERSELL UNDER CONTENTION ---
+def test_claim_offer_never_oversells_with_200_parallel_claimers(app, seed):
+    """
+    Fires 200 simultaneous claims at an offer with 20 meals left.
+    Exactly 20 must succeed, the stock must land on 0 (never negative) and be marked sold out.
+    """
+    offer_id = seed.offer(quantity=20)
+    student_ids = seed.students(200)
+
+    results = []
+    start_line = threading.Barrier(len(student_ids))
+
+    def claimer(user_id):
+        with app.app_context():
+            start_line.wait()
+            results.append(QRService.claim_offer(user_id, offer_id))
+            db.session.remove()
+
+    threads = [threading.Thread(target=claimer, args=(uid,)) for uid in student_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    successes = [r for r in results if r['success']]
+    failures = [r for r in results if not r['success']]
+
+    # --- ASSERTIONS ---
+    assert len(results) == 200
+    assert len(successes) == 20
+    assert all(r['status'] == 400 for r in failures)
+
+    with app.app_context():
+        offer = db.session.get(Offer, offer_id)
+        assert offer.quantity == 0
+        assert offer.status == 'sold_out'
+        assert Claim.query.filter_by(offer_id=offer_id).count() == 20
+
+# --- TEST 2: EDGE CASES ---
+def test_claim_offer_reports_missing_and_sold_out_offers(app, seed):
+    offer_id = seed.offer(quantity=1)
+    student_a, student_b = seed.students(2)
+
+    with app.app_context():
+        assert QRService.claim_offer(student_a, offer_id)['status'] == 201
+        assert QRService.claim_offer(student_b, offer_id)['status'] == 400
+        assert QRService.claim_offer(student_b, 999999)['status'] == 404
+
+# --- TEST 3: FLASH-DROP RESERVATION MODE ---
+def test_reservation_mode_never_oversells_and_returns_unused_leases(app, seed, monkeypatch):
+    """
+    Same contention as test 1, but claims are served from leased batches.
+    Unused leased meals must flow back to the offer row on reconciliation.
+    """
+    from app.services.reservation_service import ReservationService
+    monkeypatch.setattr(ReservationService, 'enabled', True)
+    monkeypatch.setattr(ReservationService, 'lease_size', 3)
+    monkeypatch.setattr(ReservationService, '_leases', {})
+
+    offer_id = seed.offer(quantity=20)
+    student_ids = seed.students(200)
+
+    results = []
+    start_line = threading.Barrier(len(student_ids))
+
+    def claimer(user_id):
+        with app.app_context():
+            start_line.wait()
+            results.append(QRService.claim_offer(user_id, offer_id))
+            db.session.remove()
+
+    threads = [threading.Thread(target=claimer, args=(uid,)) for uid in student_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len([r for r in results if r['success']]) == 20
+
+    with app.app_context():
+        assert Claim.query.filter_by(offer_id=offer_id).count() == 20
+        assert db.session.get(Offer, offer_id).quantity == 0
+
+        # A partially used lease goes back to the row and reopens the offer
+        second_offer = seed.offer(quantity=10)
+        assert QRService.claim_offer(student_ids[0], second_offer)['success']
+        assert db.session.get(Offer, second_offer).quantity == 7
+
+        assert ReservationService.return_idle_leases(max_idle_seconds=0) == 2
+        db.session.expire_all()
+        restocked = db.session.get(Offer, second_offer)
+        assert restocked.quantity == 9
+        assert restocked.status == 'active'
+
+
+# --- TEST 3B: LEASES OF A KILLED WORKER ARE RECLAIMED BY THE SWEEPER ---
+def test_sweeper_reclaims_expired_leases_of_a_dead_worker(app, seed, monkeypatch):
+    """Leases are recorded durably, so meals held by a worker that died still return to stock."""
+    from datetime import datetime, timedelta
+    from app.models import ReservationLease
+    from app.services.reservation_service import ReservationService
+    monkeypatch.setattr(ReservationService, 'enabled', True)
+    monkeypatch.setattr(ReservationService, 'lease_size', 3)
+    monkeypatch.setattr(ReservationService, '_leases', {})
+
+    offer_id = seed.offer(quantity=3)
+    first, second, third = seed.students(3)
+
+    with app.app_context():
+        assert QRService.claim_offer(first, offer_id)['success']
+        lease = ReservationLease.query.one()
+        assert (lease.offer_id, lease.tokens) == (offer_id, 2)
+        assert db.session.get(Offer, offer_id).status == 'sold_out'
+
+        # Live leases are left alone
+        assert ReservationService.reclaim_expired_leases() == 0
+
+        # The worker is SIGKILLed: its memory is gone, only the row is left, and it expires
+        ReservationService._leases.clear()
+        later = datetime.utcnow() + timedelta(seconds=ReservationService.lease_ttl_seconds + 1)
+        assert ReservationService.reclaim_expired_leases(now=later) == 2
+        assert ReservationLease.query.count() == 0
+
+        db.session.expire_all()
+        offer = db.session.get(Offer, offer_id)
+        assert (offer.quantity, offer.status) == (2, 'active')
+
+        # A lease reclaimed under a live (stalled) worker is dropped, not served from
+        monkeypatch.setattr(ReservationService, 'lease_size', 2)
+        assert QRService.claim_offer(second, offer_id)['success']
+        assert ReservationService.reclaim_expired_leases(now=later + timedelta(seconds=ReservationService.lease_ttl_seconds)) == 1
+        assert QRService.claim_offer(third, offer_id)['success']
+
+        db.session.expire_all()
+        assert Claim.query.filter_by(offer_id=offer_id).count() == 3
+        assert db.session.get(Offer, offer_id).quantity == 0
+        assert ReservationLease.query.one().tokens == 0
+
+# --- TEST 4: STALE PENDING CLAIMS ARE EXPIRED AND RESTOCKED ---
+def test_sweeper_expires_stale_claims_and_reopens_sold_out_offer(app, seed):
+    """Claims older than the pickup window are expired in bulk and their meals return to stock."""
+    from datetime import datetime, timedelta
+    from app.services.claim_expiry_service import ClaimExpiryService
+
+    offer_id = seed.offer(quantity=3)
+    student_ids = seed.students(3)
+
+    with app.app_context():
+        offer = db.session.get(Offer, offer_id)
+        offer.pickup_start, offer.pickup_end = '12:00', '14:00'
+        db.session.commit()
+
+        for uid in student_ids:
+            assert QRService.claim_offer(uid, offer_id)['success']
+        assert db.session.get(Offer, offer_id).status == 'sold_out'
+
+        # Two claims are older than the 2-hour window, one is fresh
+        stale_ids = [c.id for c in Claim.query.filter_by(offer_id=offer_id).limit(2)]
+        Claim.query.filter(Claim.id.in_(stale_ids)).update(
+            {'created_at': datetime.utcnow() - timedelta(hours=3)}, synchronize_session=False
+        )
+        db.session.commit()
+
+        assert ClaimExpiryService.sweep() == {'expired_claims': 2, 'restocked_offers': 1}
+        assert ClaimExpiryService.sweep() == {'expired_claims': 0, 'restocked_offers': 0}
+
+        db.session.expire_all()
+        offer = db.session.get(Offer, offer_id)
+        assert offer.quantity == 2
+        assert offer.status == 'active'
+        assert Claim.query.filter_by(offer_id=offer_id, status='expired').count() == 2
+        assert Claim.query.filter_by(offer_id=offer_id, status='pending').count() == 1
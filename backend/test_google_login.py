@@ -0,0 +1,113 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt as google_jwt
+from app.models import User
+from app.services.auth_service import AuthService
+from app.services.google_cert_service import GoogleCertService
+
+CLIENT_ID = 'foodshare-web.apps.googleusercontent.com'
+
+
+def make_key(kid):
+    """A local stand-in for one of Google's signing keys: (signer, PEM certificate)."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=1)).sign(key, hashes.SHA256()))
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return crypt.RSASigner.from_string(pem, key_id=kid), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def id_token(signer, email='anna@gmail.com', audience=CLIENT_ID):
+    now = int(time.time())
+    payload = {'iss': 'https://accounts.google.com', 'aud': audience, 'sub': '1234', 'email': email,
+               'name': 'Anna', 'iat': now, 'exp': now + 3600}
+    return google_jwt.encode(signer, payload).decode()
+
+
+class FakeCertEndpoint:
+    """Stands in for the pooled session: serves `certs` and counts every network call."""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs, self.max_age, self.calls = certs, max_age, 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        endpoint = self
+
+        class Response:
+            status_code = 200
+            headers = {'Cache-Control': f'public, max-age={endpoint.max_age}, must-revalidate, no-transform'}
+
+            @staticmethod
+            def json():
+                return dict(endpoint.certs)
+
+        return Response()
+
+
+def use_endpoint(monkeypatch, endpoint):
+    monkeypatch.setattr(GoogleCertService, 'session', endpoint)
+    monkeypatch.setattr(GoogleCertService, '_certs', {})
+    monkeypatch.setattr(GoogleCertService, '_expires_at', 0.0)
+    monkeypatch.setattr(GoogleCertService, '_fetched_at', None)
+    monkeypatch.setenv('GOOGLE_WEB_CLIENT_ID', CLIENT_ID)
+
+
+# --- TEST 1: ONE CERT FETCH, THEN GOOGLE LOGINS VERIFY WITHOUT ANY NETWORK CALL ---
+def test_google_login_verifies_locally_with_cached_certs(app, monkeypatch):
+    signer, cert = make_key('kid-1')
+    endpoint = FakeCertEndpoint({'kid-1': cert})
+    use_endpoint(monkeypatch, endpoint)
+
+    with app.test_request_context():
+        first = AuthService.google_login({'token': id_token(signer)})
+        assert first['status'] == 200 and endpoint.calls == 1
+        assert User.query.filter_by(email='anna@gmail.com').count() == 1
+
+        # Warm path: every further login is verified against the cached cert set
+        for _ in range(5):
+            assert AuthService.google_login({'token': id_token(signer)})['status'] == 200
+        assert endpoint.calls == 1
+
+        # Wrong audience and tampered signature are rejected as invalid tokens, still offline
+        assert AuthService.google_login({'token': id_token(signer, audience='someone-else')})['status'] == 401
+        assert AuthService.google_login({'token': id_token(signer)[:-4] + 'AAAA'})['status'] == 401
+        assert endpoint.calls == 1
+
+
+# --- TEST 2: EXPIRY AND KEY ROTATION REFRESH THE CACHE, FORGED KIDS DO NOT HAMMER GOOGLE ---
+def test_cert_cache_refreshes_on_expiry_and_unknown_kid(app, monkeypatch):
+    old_signer, old_cert = make_key('kid-1')
+    new_signer, new_cert = make_key('kid-2')
+    endpoint = FakeCertEndpoint({'kid-1': old_cert})
+    use_endpoint(monkeypatch, endpoint)
+    monkeypatch.setattr(GoogleCertService, 'min_refresh_seconds', 0)
+
+    assert GoogleCertService.verify_id_token(id_token(old_signer), CLIENT_ID)['email'] == 'anna@gmail.com'
+    assert endpoint.calls == 1
+
+    # Google rotates in a new key: the unknown kid forces one early refresh
+    endpoint.certs['kid-2'] = new_cert
+    assert GoogleCertService.verify_id_token(id_token(new_signer), CLIENT_ID)['sub'] == '1234'
+    assert endpoint.calls == 2
+
+    # max-age elapsed: the next verification refetches
+    monkeypatch.setattr(GoogleCertService, '_expires_at', time.monotonic() - 1)
+    GoogleCertService.verify_id_token(id_token(old_signer), CLIENT_ID)
+    assert endpoint.calls == 3
+
+    # Unknown kids refetch at most once per min_refresh_seconds
+    monkeypatch.setattr(GoogleCertService, 'min_refresh_seconds', 60)
+    forged_signer, _ = make_key('kid-forged')
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            GoogleCertService.verify_id_token(id_token(forged_signer), CLIENT_ID)
+    assert endpoint.calls == 3
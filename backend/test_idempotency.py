@@ -0,0 +1,67 @@
+from app.extensions import db
+from app.models import Offer, Claim
+
+# --- TEST 1: RETRIED CLAIM IS REPLAYED, NOT RE-EXECUTED ---
+def test_claim_retry_with_same_idempotency_key_is_replayed(app, seed):
+    """
+    A flaky client sends the same claim three times with one Idempotency-Key.
+    Only one meal may be taken, and every retry must get the original QR code back.
+    """
+    offer_id = seed.offer(quantity=5)
+    (student_id,) = seed.students(1)
+    client = app.test_client()
+    payload = {'user_id': student_id, 'offer_id': offer_id}
+    headers = {'Idempotency-Key': 'claim-retry-0001'}
+
+    first = client.post('/api/offers/claim', json=payload, headers=headers)
+    retries = [client.post('/api/offers/claim', json=payload, headers=headers) for _ in range(2)]
+
+    assert first.status_code == 201
+    for retry in retries:
+        assert retry.status_code == 201
+        assert retry.headers.get('Idempotent-Replayed') == 'true'
+        assert retry.json['qr_code'] == first.json['qr_code']
+
+    with app.app_context():
+        assert db.session.get(Offer, offer_id).quantity == 4
+        assert Claim.query.filter_by(offer_id=offer_id).count() == 1
+
+# --- TEST 2: KEY REUSE WITH A DIFFERENT BODY IS REJECTED ---
+def test_idempotency_key_reuse_with_different_body_is_rejected(app, seed):
+    offer_id = seed.offer(quantity=5)
+    student_a, student_b = seed.students(2)
+    client = app.test_client()
+    headers = {'Idempotency-Key': 'claim-retry-0002'}
+
+    assert client.post('/api/offers/claim', json={'user_id': student_a, 'offer_id': offer_id}, headers=headers).status_code == 201
+    assert client.post('/api/offers/claim', json={'user_id': student_b, 'offer_id': offer_id}, headers=headers).status_code == 422
+
+# --- TEST 3: A KEY LEFT IN FLIGHT BY A CRASHED WORKER IS TAKEN OVER AFTER THE LEASE TIMEOUT ---
+def test_crashed_in_flight_key_is_taken_over_after_lease_timeout(app, seed):
+    import json
+    from datetime import datetime, timedelta
+    from app.models import IdempotencyRecord
+    from app.services.idempotency_service import IdempotencyService
+
+    offer_id = seed.offer(quantity=5)
+    (student_id,) = seed.students(1)
+    client = app.test_client()
+    body = json.dumps({'user_id': student_id, 'offer_id': offer_id})
+    headers = {'Idempotency-Key': 'claim-crashed-0003', 'Content-Type': 'application/json'}
+
+    # The first attempt reserved the key, then its process was killed before storing a response
+    with app.app_context():
+        db.session.add(IdempotencyRecord(scope='claim', key='claim-crashed-0003',
+                                         request_hash=IdempotencyService.fingerprint(body.encode())))
+        db.session.commit()
+
+    assert client.post('/api/offers/claim', data=body, headers=headers).status_code == 409  # lease still fresh
+
+    with app.app_context():
+        IdempotencyRecord.query.update({'started_at': datetime.utcnow() - timedelta(minutes=5)})
+        db.session.commit()
+
+    retry = client.post('/api/offers/claim', data=body, headers=headers)
+    assert retry.status_code == 201 and retry.headers.get('Idempotent-Replayed') is None
+    replay = client.post('/api/offers/claim', data=body, headers=headers)
+    assert replay.headers.get('Idempotent-Replayed') == 'true' and replay.json['qr_code'] == retry.json['qr_code']
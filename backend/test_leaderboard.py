@@ -0,0 +1,108 @@
+import random
+from app.extensions import db
+from app.models import Offer
+from app.services.qr_service import QRService
+from app.services.leaderboard_service import LeaderboardService
+from app.utils.ranking import RankIndex
+
+# --- TEST 1: RANK INDEX AGREES WITH A FULL SORT ---
+def test_rank_index_matches_sorted_order():
+    rng = random.Random(7)
+    index = RankIndex(bucket_width=25, capacity=4)
+    scores = {}
+    for _ in range(3000):
+        key = rng.randrange(400)
+        if rng.random() < 0.1:
+            index.remove(key)
+            scores.pop(key, None)
+        else:
+            scores[key] = index.add(key, rng.randrange(0, 300))
+
+    expected = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    assert index.top(50) == expected[:50]
+    for key, score in scores.items():
+        assert index.rank(key) == 1 + sum(1 for s in scores.values() if s > score)
+    assert index.rank(10_000) is None
+
+# --- TEST 2: VERIFICATIONS UPDATE EVERY WINDOW WITHOUT A DB READ ---
+def test_leaderboard_is_updated_incrementally_and_rebuilds_identically(app, seed):
+    busy = seed.offer(quantity=5, offer_type='free')
+    quiet = seed.offer(quantity=5, offer_type='discount')
+    students = seed.students(4)
+
+    with app.app_context():
+        for uid in students[:3]:
+            QRService.verify_claim_qr(QRService.claim_offer(uid, busy)['qr_code'])
+        QRService.verify_claim_qr(QRService.claim_offer(students[3], quiet)['qr_code'])
+        busy_rid = db.session.get(Offer, busy).restaurant_id
+        quiet_rid = db.session.get(Offer, quiet).restaurant_id
+
+        top = LeaderboardService.top('daily', 10)
+        assert [(e['restaurant_id'], e['points'], e['meals'], e['rank']) for e in top] == \
+            [(busy_rid, 60, 3, 1), (quiet_rid, 10, 1, 2)]
+        assert LeaderboardService.rank_of(quiet_rid, 'weekly')['rank'] == 2
+
+        incremental = {w: LeaderboardService.top(w, 10) for w in ('daily', 'weekly', 'all')}
+        LeaderboardService.rebuild()
+        assert {w: LeaderboardService.top(w, 10) for w in ('daily', 'weekly', 'all')} == incremental
+
+    response = app.test_client().get('/api/leaderboard?window=weekly')
+    assert response.status_code == 200 and response.json[0]['points'] == 60
+    assert app.test_client().get('/api/leaderboard?window=monthly').status_code == 400
+
+# --- TEST 3: STUDENT XP RANKS, GLOBAL AND PER UNIVERSITY ---
+def test_student_rank_follows_xp_awards(app, seed):
+    from app.models import User
+    from app.services.student_rank_service import StudentRankService
+
+    offer_id = seed.offer(quantity=10, offer_type='free')
+    alice, bob, carol = seed.students(3)
+
+    with app.app_context():
+        for uid, uni in ((alice, 'ELTE'), (bob, 'BME'), (carol, ' elte ')):
+            db.session.get(User, uid).university = uni
+        db.session.commit()
+        StudentRankService.rebuild()
+
+        for uid in (alice, alice, carol):  # single-scan path
+            QRService.verify_claim_qr(QRService.claim_offer(uid, offer_id)['qr_code'])
+        QRService.verify_claims_batch([(QRService.claim_offer(bob, offer_id)['qr_code'], None)])  # batch path
+
+    client = app.test_client()
+    alice_rank = client.get(f'/api/students/rank/{alice}').json
+    assert (alice_rank['xp'], alice_rank['level'], alice_rank['global_rank']) == (100, 2, 1)
+    assert (alice_rank['university_rank'], alice_rank['university_total']) == (1, 2)
+
+    bob_rank = client.get(f'/api/students/rank/{bob}').json
+    assert (bob_rank['global_rank'], bob_rank['university_rank']) == (2, 1)  # tied with carol
+
+    elte = client.get('/api/students/top?university=Elte').json
+    assert [s['user_id'] for s in elte] == [alice, carol]
+    assert client.get('/api/students/rank/999999').status_code == 404
+
+    # Like rebuild(), the incremental path only ranks students
+    with app.app_context():
+        admin = User(name='Admin', email='admin@test.hu', role='admin', password_hash='x')
+        db.session.add(admin)
+        db.session.commit()
+        StudentRankService.add_xp({admin.id: 50})
+        StudentRankService.set_xp(admin.id, 50, 'Admin', None, role='admin')
+        assert StudentRankService.rank_of(admin.id) is None
+        assert StudentRankService.rank_of(alice)['global_total'] == 3
+
+
+# --- TEST 4: STUDENT RANKS ANSWER 503 UNTIL THE BACKGROUND BUILD LANDS ---
+def test_student_rank_routes_wait_for_the_first_build(app, seed, monkeypatch):
+    from app.services.student_rank_service import StudentRankService
+
+    (alice,) = seed.students(1)
+    monkeypatch.setattr(StudentRankService, '_built', False)
+
+    client = app.test_client()
+    assert client.get(f'/api/students/rank/{alice}').status_code == 503
+    assert client.get('/api/students/top').status_code == 503
+
+    with app.app_context():
+        StudentRankService.rebuild()
+    assert StudentRankService.ready()
+    assert client.get(f'/api/students/rank/{alice}').json['global_rank'] == 1
@@ -0,0 +1,321 @@
+from types import SimpleNamespace
+from app.extensions import db
+from app.models import User, Notification
+from app.services.notification_service import NotificationService
+from app.services.push_transport import RecordingTransport
+
+
+# --- TEST 1: ONE INSERT ... SELECT, PUSH IN CHUNKS OF 500 ---
+def test_new_offer_fanout_uses_set_insert_and_500_token_multicasts(app, seed, monkeypatch):
+    fake = RecordingTransport()
+    monkeypatch.setattr(NotificationService, 'messaging', fake)
+    student_ids = seed.students(1203)
+
+    with app.app_context():
+        # 1201 students have a device token; two share one, which must be pushed once
+        tokens = {uid: f'token-{i}' for i, uid in enumerate(student_ids[:1201])}
+        tokens[student_ids[1200]] = 'token-0'
+        db.session.execute(
+            User.__table__.update().where(User.id == db.bindparam('uid')).values(fcm_token=db.bindparam('tok')),
+            [{'uid': uid, 'tok': tok} for uid, tok in tokens.items()]
+        )
+        db.session.commit()
+
+        sent = NotificationService.notify_students_new_offer({'title': 'Lunch Box', 'restaurant_name': 'Test Bistro'})
+
+        assert sent == 1200
+        assert [len(m.tokens) for m in fake.multicasts] == [500, 500, 200]
+        assert fake.multicasts[0].data == {'type': 'new_offer'}
+        assert Notification.query.count() == 1203
+        assert Notification.query.first().title == '📣 New Offer from Test Bistro!'
+
+# --- TEST 2: OFFER CREATION ENQUEUES ONE DEDUPLICATED FAN-OUT JOB THAT RESUMES AFTER A PUSH FAILURE ---
+def test_create_offer_enqueues_fanout_that_retries_with_backoff(app, seed, monkeypatch):
+    import json
+    from datetime import datetime, timedelta
+    from app.models import Offer, BackgroundJob
+    from app.services.job_queue_service import JobQueueService
+    from app.services.qr_service import QRService
+
+    import app.services.notification_service as notification_module
+
+    fake = RecordingTransport()
+    calls = {'n': 0}
+    real_send = fake.send_each_for_multicast
+
+    def flaky_send(message):
+        calls['n'] += 1
+        if calls['n'] == 2:
+            raise ConnectionError('FCM unreachable')
+        return real_send(message)
+
+    fake.send_each_for_multicast = flaky_send
+    monkeypatch.setattr(NotificationService, 'messaging', fake)
+    monkeypatch.setattr(notification_module, 'FCM_MULTICAST_LIMIT', 1)  # one request per device
+
+    existing_offer = seed.offer()
+    student_ids = seed.students(3)
+    with app.app_context():
+        for n, uid in enumerate(student_ids):
+            db.session.get(User, uid).fcm_token = f'device-{n}'
+        owner_id = db.session.get(Offer, existing_offer).restaurant.owner_user_id
+        db.session.commit()
+    for uid in student_ids:
+        app.test_client().post('/api/students/location', json={'user_id': uid, 'lat': 47.50, 'lng': 19.05})
+
+    response = app.test_client().post('/api/offers/create', json={
+        'user_id': owner_id, 'title': 'Soup', 'description': 'Goulash', 'type': 'Free', 'quantity': 4
+    })
+    assert response.status_code == 201
+    assert fake.multicasts == []  # nothing sent on the request path
+
+    with app.app_context():
+        offer_id = response.json['offer_id']
+        assert NotificationService.enqueue_new_offer_fanout(offer_id, 'Soup', 'Dup') is None
+        db.session.commit()
+        assert BackgroundJob.query.count() == 1
+
+        # First attempt: rows committed with the push plan, chunk 0 sent, chunk 1 hits the outage
+        assert JobQueueService.run_pending() == 1
+        job = BackgroundJob.query.one()
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert job.run_at > datetime.utcnow() + timedelta(seconds=5)
+        assert Notification.query.count() == 3
+        assert JobQueueService.stats()['retrying'] == 1
+        # The chunk list is stored once; the per-chunk checkpoint only holds the counters
+        assert len(json.loads(job.plan)) == 3
+        assert json.loads(job.progress) == {'sent': 1, 'delivered': 1}
+
+        # The retry resumes at the failed chunk: nobody is pushed twice, no rows are duplicated
+        assert JobQueueService.run_pending(now=job.run_at + timedelta(seconds=1)) == 1
+        db.session.expire_all()
+        assert BackgroundJob.query.one().status == 'done'
+        assert Notification.query.count() == 3
+        assert sorted(m.tokens[0] for m in fake.multicasts) == ['device-0', 'device-1', 'device-2']
+
+# --- TEST 3: ONLY STUDENTS NEAR THE RESTAURANT ARE NOTIFIED ---
+def test_new_offer_fanout_targets_students_within_radius(app, seed, monkeypatch):
+    from app.models import StudentLocation
+
+    fake = RecordingTransport()
+    monkeypatch.setattr(NotificationService, 'messaging', fake)
+    monkeypatch.setattr(NotificationService, 'coalesce_minutes', 0)
+    offer_id = seed.offer(lat=47.4979, lng=19.0402)  # Budapest
+    near, across_town, far, unknown = seed.students(4)
+    client = app.test_client()
+
+    assert client.post('/api/students/location', json={'user_id': near, 'lat': 47.51, 'lng': 19.06}).json['updated']
+    client.post('/api/students/location', json={'user_id': across_town, 'lat': 47.56, 'lng': 19.10, 'source': 'home'})
+    client.post('/api/students/location', json={'user_id': far, 'lat': 46.25, 'lng': 20.15})  # Szeged
+    # A few metres of GPS jitter is not worth a write
+    assert not client.post('/api/students/location', json={'user_id': near, 'lat': 47.5101, 'lng': 19.0601}).json['updated']
+    assert client.post('/api/students/location', json={'user_id': near, 'lat': 95, 'lng': 19}).status_code == 400
+
+    with app.app_context():
+        User.query.filter(User.id.in_([near, across_town, far, unknown]))\
+            .update({'fcm_token': User.email}, synchronize_session=False)
+        db.session.commit()
+        assert StudentLocation.query.count() == 3
+
+        app.config['OFFER_NOTIFY_RADIUS_KM'] = 5
+        assert NotificationService.notify_students_new_offer(
+            {'offer_id': offer_id, 'title': 'Lunch Box', 'restaurant_name': 'Test Bistro'}) == 2
+        # The student who never reported a location is still notified
+        assert sorted(n.user_id for n in Notification.query.all()) == sorted([near, unknown])
+
+        # A wider radius reaches the home-area student 8 km away, still not Szeged
+        app.config['OFFER_NOTIFY_RADIUS_KM'] = 12
+        assert NotificationService.notify_students_new_offer(
+            {'offer_id': offer_id, 'title': 'Lunch Box', 'restaurant_name': 'Test Bistro'}) == 3
+        assert sorted(fake.multicasts[-1].tokens) == ['student1@test.hu', 'student2@test.hu', 'student4@test.hu']
+
+# --- TEST 4: DINNER RUSH COALESCES INTO ONE ROW, ONE DIGEST PUSH AND A RATE CAP ---
+def test_offers_within_window_coalesce_into_digest(app, seed, monkeypatch):
+    from datetime import datetime, timedelta
+    from app.models import BackgroundJob
+    from app.services.job_queue_service import JobQueueService
+    from app.utils.rate_limit import TokenBucketLimiter
+
+    fake = RecordingTransport()
+    monkeypatch.setattr(NotificationService, 'messaging', fake)
+    monkeypatch.setattr(NotificationService, 'coalesce_minutes', 10)
+    monkeypatch.setattr(NotificationService, 'push_limiter', TokenBucketLimiter(2, 1 / 3600))
+    student_ids = seed.students(3)
+
+    with app.app_context():
+        User.query.filter(User.id.in_(student_ids)).update({'fcm_token': User.email}, synchronize_session=False)
+        db.session.commit()
+
+        for i in range(12):
+            NotificationService.notify_students_new_offer({'title': f'Menu {i}', 'restaurant_name': f'Bistro {i}'})
+
+        # 12 offers x 3 students: three inbox rows and one immediate multicast instead of 36 of each
+        rows = Notification.query.all()
+        assert len(rows) == 3
+        assert {(n.item_count, n.pushed_count) for n in rows} == {(12, 1)}
+        assert rows[0].title == '📣 12 New Offers Near You!'
+        assert rows[0].message == 'Latest: Menu 11 from Bistro 11.'
+        assert len(fake.multicasts) == 1
+
+        # The window's single digest job summarizes the other 11 offers
+        job = BackgroundJob.query.one()
+        assert job.kind == 'offer_digest'
+        assert JobQueueService.run_pending(now=job.run_at) == 1
+        assert len(fake.multicasts[1].tokens) == 3
+        assert fake.multicasts[1].notification.title == '📣 11 more offers near you!'
+        db.session.expire_all()
+        assert {n.pushed_count for n in Notification.query.all()} == {12}
+
+        # Reading the digest closes it; the burst of 2 pushes per student is now spent
+        Notification.query.update({'is_read': True})
+        db.session.commit()
+        assert NotificationService.notify_students_new_offer({'title': 'Late', 'restaurant_name': 'Bistro'}) == 0
+        assert Notification.query.count() == 6
+        assert NotificationService.push_limiter.stats()['throttled'] == 3
+
+# --- TEST 5: INBOX KEYSET PAGES, BULK MARK-READ AND THE MAINTAINED UNREAD COUNTER ---
+def test_inbox_pagination_and_unread_counter(app, seed, monkeypatch):
+    import jwt
+    from app.models import NotificationCounter
+
+    monkeypatch.setattr(NotificationService, 'messaging', RecordingTransport())
+    monkeypatch.setattr(NotificationService, 'coalesce_minutes', 0)
+    student_id, other_id = seed.students(2)
+
+    with app.app_context():
+        # Two unread rows that predate counters: the first fan-out seeds the counter from them
+        db.session.add_all([Notification(user_id=student_id, title='Old', message=f'Legacy {i}') for i in range(2)])
+        db.session.commit()
+        for i in range(23):
+            NotificationService.notify_students_new_offer({'title': f'Menu {i}', 'restaurant_name': 'Bistro'})
+        assert db.session.get(NotificationCounter, student_id).unread == 25
+        token = jwt.encode({'user_id': student_id, 'type': 'access'}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/notifications').status_code == 401
+
+    seen, cursor = [], None
+    while True:
+        page = client.get('/api/notifications', query_string={'limit': 10, **({'cursor': cursor} if cursor else {})},
+                          headers=headers).json
+        seen += [n['id'] for n in page['notifications']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == 25 and seen == sorted(seen, reverse=True)
+    assert client.get('/api/notifications', query_string={'cursor': 'garbage'}, headers=headers).status_code == 400
+
+    marked = client.post('/api/notifications/read', json={'ids': seen[:5] + seen[:2]}, headers=headers).json
+    assert (marked['marked'], marked['unread']) == (5, 20)
+    # Marking the same rows again, or another user's rows, changes nothing
+    with app.app_context():
+        foreign = Notification.query.filter_by(user_id=other_id).first().id
+    again = client.post('/api/notifications/read', json={'ids': seen[:5] + [foreign]}, headers=headers).json
+    assert (again['marked'], again['unread']) == (0, 20)
+
+    unread_page = client.get('/api/notifications', query_string={'unread_only': 'true', 'limit': 100}, headers=headers).json
+    assert len(unread_page['notifications']) == 20 and unread_page['unread'] == 20
+
+    assert client.post('/api/notifications/read', json={'all': True}, headers=headers).json['marked'] == 20
+    assert client.get('/api/notifications/unread-count', headers=headers).json['unread'] == 0
+    with app.app_context():
+        assert db.session.get(NotificationCounter, other_id).unread == 23
+
+# --- TEST 6: DEAD TOKENS ARE CLASSIFIED AND PRUNED IN ONE BATCH ---
+def test_dead_fcm_tokens_are_pruned_after_fanout(app, seed, monkeypatch):
+    from firebase_admin import exceptions as firebase_errors, messaging
+
+    failures = {
+        'uninstalled': messaging.UnregisteredError('Requested entity was not found.'),
+        'other-project': messaging.SenderIdMismatchError('SenderId mismatch'),
+        'garbage': firebase_errors.InvalidArgumentError('The registration token is not a valid FCM registration token'),
+        'busy': firebase_errors.UnavailableError('Service unavailable'),
+    }
+
+    fake = RecordingTransport(failures=failures)
+    monkeypatch.setattr(NotificationService, 'messaging', fake)
+    monkeypatch.setattr(NotificationService, 'coalesce_minutes', 0)
+    monkeypatch.setattr(NotificationService, 'counters', dict.fromkeys(NotificationService.counters, 0))
+    tokens = ['uninstalled', 'other-project', 'garbage', 'busy', 'healthy', 'uninstalled']
+    student_ids = seed.students(len(tokens))
+
+    with app.app_context():
+        for uid, token in zip(student_ids, tokens):
+            db.session.get(User, uid).fcm_token = token
+        db.session.commit()
+
+        assert NotificationService.notify_students_new_offer({'title': 'Soup', 'restaurant_name': 'Bistro'}) == 1
+        remaining = dict(db.session.query(User.id, User.fcm_token).filter(User.id.in_(student_ids)).all())
+        # Both holders of the unregistered token lose it; the overloaded one is kept for next time
+        assert sorted(t for t in remaining.values() if t) == ['busy', 'healthy']
+        assert NotificationService.counters['pruned_tokens'] == 4
+        assert NotificationService.counters['transient_failures'] == 1
+
+        # The next fan-out no longer wastes requests on them
+        NotificationService.notify_students_new_offer({'title': 'Soup', 'restaurant_name': 'Bistro'})
+        assert sorted(fake.multicasts[-1].tokens) == ['busy', 'healthy']
+
+        # Single sends prune too
+        owner = db.session.get(User, student_ids[4])
+        owner.fcm_token = 'uninstalled'
+        db.session.commit()
+        assert NotificationService.notify_restaurant_claim_verified(owner, 'Anna') is False
+        assert db.session.get(User, owner.id).fcm_token is None
+
+# --- TEST 7: FIREBASE IS INITIALIZED ON FIRST SEND, ONCE PER PROCESS ---
+def test_firebase_transport_initializes_lazily_per_process(app, monkeypatch):
+    import firebase_admin
+    from app.services import push_transport
+    from app.services.push_transport import FirebaseTransport
+
+    created = []
+
+    def fake_initialize_app(credential, options, name):
+        created.append((credential, options, name))
+        return SimpleNamespace(name=name)
+
+    def no_such_app(name):
+        raise ValueError(name)
+
+    monkeypatch.setattr(firebase_admin, 'initialize_app', fake_initialize_app)
+    monkeypatch.setattr(firebase_admin, 'get_app', no_such_app)
+    monkeypatch.setattr(push_transport.credentials, 'Certificate', lambda path: f'cert:{path}')
+    monkeypatch.setattr(push_transport.messaging, 'send', lambda message, app: app.name)
+
+    # The test app records pushes in memory and never touches Firebase
+    assert isinstance(NotificationService.messaging, RecordingTransport)
+
+    transport = FirebaseTransport('/secrets/fcm.json', http_timeout=5)
+    assert created == []  # constructing the transport does no I/O
+    message = transport.Message(token='device')
+    pid = push_transport.os.getpid()
+    assert transport.send(message) == transport.send(message) == f'foodshare-{pid}'
+    assert created == [('cert:/secrets/fcm.json', {'httpTimeout': 5}, f'foodshare-{pid}')]
+
+    # A forked worker gets its own Firebase app instead of the parent's HTTP session
+    monkeypatch.setattr(push_transport.os, 'getpid', lambda: pid + 1)
+    assert transport.send(message) == f'foodshare-{pid + 1}'
+    assert len(created) == 2
+
+
+# --- TEST 8: UPGRADE-SCHEMA ADDS THE DIGEST COLUMNS AND INDEX TO AN EXISTING TABLE ---
+def test_upgrade_schema_adds_digest_columns_to_existing_notifications(app):
+    from sqlalchemy import inspect, text
+
+    with app.app_context():
+        # The notifications table as deployed before digest coalescing
+        db.session.execute(text("DROP INDEX ix_notifications_digest"))
+        for column in ('kind', 'item_count', 'pushed_count', 'updated_at'):
+            db.session.execute(text(f"ALTER TABLE notifications DROP COLUMN {column}"))
+        db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['upgrade-schema'])
+        assert result.exit_code == 0, result.output
+        assert runner.invoke(args=['upgrade-schema']).exit_code == 0
+
+        inspector = inspect(db.engine)
+        columns = {column['name'] for column in inspector.get_columns('notifications')}
+        assert {'kind', 'item_count', 'pushed_count', 'updated_at'} <= columns
+        assert 'ix_notifications_digest' in {index['name'] for index in inspector.get_indexes('notifications')}
@@ -0,0 +1,77 @@
+from app.extensions import db
+from app.models import User
+from app.services.auth_service import AuthService
+from app.services.password_service import PasswordService
+
+
+# --- TEST 1: HASHING RUNS IN THE PROCESS POOL AND LOGIN UPGRADES OUTDATED HASHES ---
+def test_login_rehashes_outdated_hash_in_process_pool(app, monkeypatch):
+    monkeypatch.setattr(PasswordService, 'method', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(PasswordService, '_prefix', None)
+
+    with app.test_request_context():
+        user = User(name='Anna', email='anna@test.hu', role='student',
+                    password_hash=PasswordService.hash_password('correct horse'))
+        db.session.add(user)
+        db.session.commit()
+        old_hash = user.password_hash
+        assert old_hash.startswith('pbkdf2:sha256:1000$')
+        assert not PasswordService.needs_rehash(old_hash)
+
+        # Production raises the cost; the next successful login re-hashes with the new parameters
+        monkeypatch.setattr(PasswordService, 'method', 'pbkdf2:sha256:2000')
+        monkeypatch.setattr(PasswordService, '_prefix', None)
+        monkeypatch.setattr(PasswordService, '_workers', 1)
+        try:
+            assert AuthService.login_user({'email': 'anna@test.hu', 'password': 'wrong'})['status'] == 401
+            assert AuthService.login_user({'email': 'anna@test.hu', 'password': 'correct horse'})['status'] == 200
+            assert PasswordService._pool is not None  # verified and re-hashed in the worker process
+        finally:
+            PasswordService.shutdown()
+
+        db.session.expire_all()
+        new_hash = db.session.get(User, user.id).password_hash
+        assert new_hash.startswith('pbkdf2:sha256:2000$') and new_hash != old_hash
+        assert db.session.get(User, user.id).check_password('correct horse')
+        assert PasswordService.needs_rehash('x')
+
+
+# --- TEST 2: A POOL THAT DOES NOT ANSWER IN TIME FALLS BACK TO HASHING INLINE ---
+def test_pool_timeout_falls_back_inline(app, monkeypatch):
+    stored = PasswordService.hash_password('correct horse')
+    monkeypatch.setattr(PasswordService, '_workers', 1)
+    monkeypatch.setattr(PasswordService, 'timeout_seconds', 1e-6)
+    try:
+        assert PasswordService.verify_password(stored, 'correct horse')
+        assert not PasswordService.verify_password(stored, 'wrong')
+    finally:
+        PasswordService.shutdown()
+
+
+# --- TEST 3: A TIMED-OUT HASH IS ONLY REDONE INLINE WHEN IT NEVER STARTED ---
+def test_pool_timeout_never_hashes_twice(monkeypatch):
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+
+    class SlowFuture:
+        def __init__(self, started):
+            self.started = started
+
+        def result(self, timeout=None):
+            if timeout is not None:
+                raise FutureTimeoutError()
+            return 'pooled'
+
+        def cancel(self):
+            return not self.started
+
+    inline_calls = []
+
+    def hash_inline():
+        inline_calls.append(1)
+        return 'inline'
+
+    for started, expected in ((True, 'pooled'), (False, 'inline')):
+        pool = type('Pool', (), {'submit': lambda self, fn, *args, started=started: SlowFuture(started)})()
+        monkeypatch.setattr(PasswordService, '_executor', staticmethod(lambda pool=pool: pool))
+        assert PasswordService._run(hash_inline) == expected
+    assert len(inline_calls) == 1
@@ -0,0 +1,77 @@
+import jwt
+from sqlalchemy import event
+from app.extensions import db
+from app.models import User, PrincipalInvalidation
+from app.services.principal_service import PrincipalService
+
+
+def _token(app, user_id):
+    return jwt.encode({'user_id': user_id, 'type': 'access'}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+
+def _count_user_selects(app):
+    seen = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: seen.append(statement)
+                     if statement.lstrip().startswith('SELECT') and 'FROM users' in statement else None)
+    return seen
+
+
+# --- TEST 1: CACHED PRINCIPALS SKIP THE USER LOOKUP AND ADMIN CHANGES APPLY AT ONCE ---
+def test_role_required_uses_principal_cache_and_sees_admin_changes(app, seed):
+    from app.models import Offer
+
+    offer_id = seed.offer()
+    with app.app_context():
+        owner_id = db.session.get(Offer, offer_id).restaurant.owner_user_id
+        admin = User(name='Admin', email='admin@test.hu', role='admin', verification_status='verified', password_hash='x')
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+
+    client = app.test_client()
+    owner = {'Authorization': f'Bearer {_token(app, owner_id)}'}
+    admin_headers = {'Authorization': f'Bearer {_token(app, admin_id)}'}
+    user_selects = _count_user_selects(app)
+
+    for _ in range(5):
+        assert client.get('/api/notifications/unread-count', headers=owner).status_code == 200
+    # One principal load for five requests
+    assert len(user_selects) == 1
+
+    # Suspension takes effect on the very next request, without waiting for the TTL
+    assert client.post('/api/admin/suspend', json={'user_id': owner_id}, headers=admin_headers).status_code == 200
+    assert client.get('/api/notifications/unread-count', headers=owner).status_code == 403
+    assert client.post('/api/admin/approve', json={'user_id': owner_id}, headers=admin_headers).status_code == 200
+    assert client.get('/api/notifications/unread-count', headers=owner).status_code == 200
+
+
+# --- TEST 2: CHANGES FROM OTHER WORKERS ARE EVICTED, EVEN WHEN THEY COMMIT OUT OF ID ORDER ---
+def test_invalidations_from_other_workers_evict_including_late_commits(app, seed, monkeypatch):
+    student_id, bystander_id, other_id = seed.students(3)
+    monkeypatch.setattr(PrincipalService, '_poll_seconds', 0)
+
+    with app.app_context():
+        for user_id in (student_id, bystander_id, other_id):
+            assert PrincipalService.get(user_id).role == 'student'
+        user = db.session.get(User, student_id)
+        user.role = 'admin'
+        db.session.commit()  # logs an invalidation in the same transaction (and evicts locally)
+        assert PrincipalInvalidation.query.filter_by(user_id=student_id).count() == 1
+        assert PrincipalService.get(student_id).role == 'admin'
+
+        # Another worker demotes `other`, but its row (lower id) commits after a later one for `bystander`
+        seen = PrincipalService._seen_id
+        stale = PrincipalService._load(other_id)._replace(role='admin')
+        PrincipalService.cache.set(other_id, stale)
+        db.session.add(PrincipalInvalidation(id=seen + 2, user_id=bystander_id))
+        db.session.commit()
+        PrincipalService.get(bystander_id)
+        assert PrincipalService._gaps.keys() == {seen + 1}
+        assert PrincipalService.cache.get(other_id) == stale  # not visible yet
+
+        db.session.add(PrincipalInvalidation(id=seen + 1, user_id=other_id))
+        db.session.commit()
+        assert PrincipalService.get(other_id).role == 'student'
+        assert not PrincipalService._gaps
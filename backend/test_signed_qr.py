@@ -0,0 +1,77 @@
+import time
+import jwt
+from app.extensions import db
+from app.models import Offer, Claim
+from app.services.qr_service import QRService
+from app.utils.signed_qr import ExpiredQRCode, InvalidQRCode, read_claim_code
+
+
+def _restaurant_token(app, offer_id):
+    with app.app_context():
+        owner_id = db.session.get(Offer, offer_id).restaurant.owner_user_id
+        return jwt.encode({'user_id': owner_id, 'type': 'access'}, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+# --- TEST 1: SCANNER KEY VALIDATES OFFLINE, TAMPERING IS CAUGHT ---
+def test_signed_code_validates_with_scanner_key_and_rejects_tampering(app, seed):
+    offer_id = seed.offer(quantity=2)
+    (student_id,) = seed.students(1)
+
+    with app.app_context():
+        qr_code = QRService.claim_offer(student_id, offer_id)['qr_code']
+        claim = Claim.query.filter_by(qr_code=qr_code).one()
+        restaurant_id = db.session.get(Offer, offer_id).restaurant_id
+        key = QRService.scanner_key(restaurant_id)
+
+    signed = read_claim_code(qr_code, key=key)
+    assert (signed.claim_id, signed.offer_id, signed.user_id, signed.restaurant_id) == \
+        (claim.id, offer_id, student_id, restaurant_id)
+
+    prefix, payload, signature = qr_code.split('.')
+    forged = f"{prefix}.{payload}.{'A' * len(signature)}"
+    for bad in (forged, qr_code + 'x', 'FS1.garbage'):
+        try:
+            read_claim_code(bad, key=key)
+            assert False, bad
+        except InvalidQRCode:
+            pass
+
+    try:
+        read_claim_code(qr_code, key=key, now=signed.expires_at + 1)
+        assert False
+    except ExpiredQRCode:
+        pass
+
+# --- TEST 2: OFFLINE REDEMPTIONS ARE RECONCILED, LEGACY CODES STILL WORK ---
+def test_reconcile_redeems_offline_scans_once_and_legacy_codes_still_verify(app, seed):
+    offer_id = seed.offer(quantity=3)
+    student_a, student_b, student_c = seed.students(3)
+    client = app.test_client()
+
+    with app.app_context():
+        code_a = QRService.claim_offer(student_a, offer_id)['qr_code']
+        code_b = QRService.claim_offer(student_b, offer_id)['qr_code']
+        app.config['SIGNED_QR_CODES'] = False
+        legacy = QRService.claim_offer(student_c, offer_id)['qr_code']
+        app.config['SIGNED_QR_CODES'] = True
+    assert legacy.startswith('OFF-')
+
+    offline = client.post('/api/claims/verify-offline', json={'qr_code': code_a})
+    assert offline.status_code == 200 and offline.json['claim']['user_id'] == student_a
+
+    headers = {'Authorization': f'Bearer {_restaurant_token(app, offer_id)}'}
+    scanned = time.time()
+    upload = client.post('/api/claims/reconcile', headers=headers, json={'redemptions': [
+        {'qr_code': code_a, 'scanned_at': scanned},    # scanned before upload -> expiry judged at scan time
+        {'qr_code': code_a},                           # duplicate scan
+        {'qr_code': code_b, 'scanned_at': 0},          # backdated past the sync window
+        {'qr_code': code_b, 'scanned_at': scanned - 3600},  # before the claim existed
+        {'qr_code': code_b},
+    ]})
+    assert upload.status_code == 200
+    assert [r['status'] for r in upload.json['results']] == [200, 400, 400, 400, 200]
+    assert upload.json['verified'] == 2
+
+    assert client.post('/api/claims/verify', json={'qr_code': legacy}).status_code == 200
+
+    with app.app_context():
+        assert Claim.query.filter_by(offer_id=offer_id, status='validated').count() == 3
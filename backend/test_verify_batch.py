@@ -0,0 +1,80 @@
+import jwt
+from app.extensions import db
+from app.models import User, Offer, Claim, Leaderboard
+from app.services.qr_service import QRService
+from app.services.ledger_service import LedgerService
+
+# --- TEST 1: QUEUED SCANS ARE VERIFIED IN ONE REQUEST ---
+def test_verify_batch_aggregates_rewards_and_reports_per_code(app, seed):
+    """
+    Six codes for one restaurant plus a duplicate, an unknown code and a foreign code.
+    Points/XP must equal what six single verifications would have awarded.
+    """
+    offer_id = seed.offer(quantity=10, offer_type='free')
+    other_offer = seed.offer(quantity=1)
+    students = seed.students(3)
+
+    with app.app_context():
+        codes = [QRService.claim_offer(students[i % 3], offer_id)['qr_code'] for i in range(6)]
+        foreign = QRService.claim_offer(students[0], other_offer)['qr_code']
+        offer = db.session.get(Offer, offer_id)
+        restaurant_id = offer.restaurant_id
+        token = jwt.encode({'user_id': offer.restaurant.owner_user_id, 'type': 'access'},
+                           app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+    batch = codes + [codes[0], 'OFF-0-USR-0-NOPE', foreign]
+    response = app.test_client().post('/api/claims/verify-batch', json={'qr_codes': batch},
+                                      headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert [r['qr_code'] for r in response.json['results']] == batch
+    assert [r['status'] for r in response.json['results']] == [200] * 6 + [400, 404, 403]
+    assert response.json['verified'] == 6
+    # Each student got two meals: 100 XP -> level 2 on their second scan
+    assert response.json['results'][3]['message'] == 'Success! Student Leveled Up to 2!'
+
+    with app.app_context():
+        assert LedgerService.compact_all() == 6
+        lb = Leaderboard.query.filter_by(restaurant_id=restaurant_id).one()
+        assert (lb.points, lb.meals_shared) == (120, 6)
+        for uid in students:
+            student = db.session.get(User, uid)
+            assert (student.xp, student.level) == (100, 2)
+        assert Claim.query.filter_by(offer_id=offer_id, status='validated').count() == 6
+        assert Claim.query.filter_by(offer_id=other_offer, status='pending').count() == 1
+
+# --- TEST 2: SINGLE SCAN USES A CONSTANT NUMBER OF QUERIES ---
+def test_verify_claim_qr_query_count_is_constant(app, seed):
+    """One joined SELECT plus the writes; no lazy loads for offer, restaurant, owner or student."""
+    from sqlalchemy import event
+
+    offer_id = seed.offer(quantity=5)
+    students = seed.students(3)
+
+    with app.app_context():
+        codes = [QRService.claim_offer(uid, offer_id)['qr_code'] for uid in students]
+        signed = app.config['SIGNED_QR_CODES']
+        app.config['SIGNED_QR_CODES'] = False
+        codes.append(QRService.claim_offer(students[0], offer_id)['qr_code'])
+        app.config['SIGNED_QR_CODES'] = signed
+        db.session.remove()
+
+        statements = []
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            counts = []
+            for code in codes:  # first scan inserts the leaderboard row, later ones update it
+                statements.clear()
+                assert QRService.verify_claim_qr(code)['status'] == 200
+                counts.append(len(statements))
+                db.session.remove()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        assert len(set(counts)) == 1
+        assert counts[0] <= 3  # joined SELECT + claim UPDATE + ledger INSERT
+        LedgerService.compact_all()
+        assert Leaderboard.query.one().meals_shared == 4